@@ -0,0 +1,99 @@
+import numpy as np
+
+DIRECTIONS = np.array([(-1, -1), (-1, 1), (1, -1), (1, 1)])
+_spaces = {}
+
+
+def action_space(board_size):
+    """Shared ActionSpace of a board size"""
+    if board_size not in _spaces:
+        _spaces[board_size] = ActionSpace(board_size)
+    return _spaces[board_size]
+
+
+def masked_argmax(values, mask):
+    """Index of the best legal value along the last axis, -1 where nothing is legal.
+
+    values and mask are (num_actions,) or (N, num_actions), so the greedy actions of many
+    states come from one call.
+    """
+    best = np.where(mask, values, -np.inf).argmax(axis=-1)
+    return np.where(mask.any(axis=-1), best, -1)
+
+
+class ActionSpace:
+    """Fixed numbering of every move shape a piece can make on the board.
+
+    An action is a (from-square, direction, distance) triple whose from-square is a dark
+    square and whose landing square is on the board; actions are numbered in the order of
+    the dense grid ``(row, col, direction, distance - 1)`` with shape
+    ``(size, size, 4, size - 1)`` that VecCheckersEnv builds its move planes in (``cells``
+    maps an action to its grid cell). Every legal move of any position is one action, so
+    Q-rows can be fixed-width arrays indexed by action.
+
+    ``flipped`` maps each action to the same move seen from the other side (see
+    checkers_env.flip_move); encoding with flipped=True gives the canonical action of a
+    player 2 move, matching the canonical keys the Q-tables use.
+    """
+
+    def __init__(self, board_size):
+        n = board_size
+        self.board_size = n
+        self.num_cells = n * n * 4 * (n - 1)
+        cells = np.arange(self.num_cells)
+        square, rest = np.divmod(cells, 4 * (n - 1))
+        direction, distance = np.divmod(rest, n - 1)
+        distance += 1
+        start_row, start_col = np.divmod(square, n)
+        end_row = start_row + DIRECTIONS[direction, 0] * distance
+        end_col = start_col + DIRECTIONS[direction, 1] * distance
+        valid = (((start_row + start_col) % 2 == 0) & (end_row >= 0) & (end_row < n)
+                 & (end_col >= 0) & (end_col < n))
+
+        self.cells = cells[valid]
+        self.num_actions = len(self.cells)
+        self.directions = direction[valid]
+        self.distances = distance[valid]
+        self.start_rows, self.start_cols = start_row[valid], start_col[valid]
+        self.end_rows, self.end_cols = end_row[valid], end_col[valid]
+        self.moves = np.stack([self.start_rows, self.start_cols, self.end_rows, self.end_cols], axis=1)
+
+        # (start square, end square) -> action, for encoding
+        self._codes = np.full((n * n, n * n), -1, dtype=np.int64)
+        self._codes[self.start_rows * n + self.start_cols, self.end_rows * n + self.end_cols] = np.arange(self.num_actions)
+        last = n * n - 1
+        self.flipped = self._codes[last - (self.start_rows * n + self.start_cols), last - (self.end_rows * n + self.end_cols)]
+        self._move_lists = self.moves.tolist()
+
+    def encode(self, move, flipped=False):
+        """Action of [start_row, start_col, end_row, end_col]; raises ValueError for an impossible move"""
+        n = self.board_size
+        start, end = move[0] * n + move[1], move[2] * n + move[3]
+        if flipped:
+            start, end = n * n - 1 - start, n * n - 1 - end
+        action = int(self._codes[start, end]) if 0 <= start < n * n and 0 <= end < n * n else -1
+        if action < 0:
+            raise ValueError(f"{list(move)} is not a move on a {n}x{n} board.")
+        return action
+
+    def encode_many(self, moves, flipped=False):
+        """Actions of a list of moves (as an int64 array)"""
+        if len(moves) == 0:
+            return np.zeros(0, dtype=np.int64)
+        moves = np.asarray(moves)
+        actions = self._codes[moves[:, 0] * self.board_size + moves[:, 1], moves[:, 2] * self.board_size + moves[:, 3]]
+        return self.flipped[actions] if flipped else actions
+
+    def decode(self, action, flipped=False):
+        """Move of an action as a list, in the frame it was encoded in"""
+        return list(self._move_lists[self.flipped[action] if flipped else action])
+
+    def mask(self, actions):
+        """Boolean (num_actions,) mask with the given actions set"""
+        mask = np.zeros(self.num_actions, dtype=bool)
+        mask[actions] = True
+        return mask
+
+    def from_cells(self, cells):
+        """Action masks of (N, ...) arrays laid out like the dense grid, e.g. move planes"""
+        return cells.reshape(len(cells), self.num_cells)[:, self.cells]
@@ -0,0 +1,221 @@
+import time
+import numpy as np
+from Tablebase import TB_WIN
+
+WIN = 100000  # score of a won position, minus the plies needed to reach it
+MATE = WIN - 1000  # scores at least this far from 0 are wins or losses at a known distance
+MAN = 100
+KING = 160
+ADVANCE = 4  # per row a man has moved towards promotion
+
+EXACT, LOWER, UPPER = 0, 1, 2
+CHECK_EVERY = 32  # nodes between clock reads (a power of two); a node costs tens of microseconds
+MUST_JUMP_KEY = 0x6A09E667F3BCC909  # xored into the position key while env.must_jump is set
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class AlphaBetaSearch:
+    """Iterative-deepening negamax alpha-beta search running directly on a CheckersEnv.
+
+    Moves are played with env.make_move/unmake_move, so the env is left exactly as it was
+    (including the sticky has_moved flag), and turns pass the way env.step passes them: a
+    jump that can continue and a plain move made while must_jump is set both leave the
+    same player to move. Positions are cached in a transposition table keyed on
+    env.zobrist_key and must_jump. Moves are ordered by the table's best move, then by a
+    history heuristic. At the depth limit a forced jump list is searched further
+    (quiescence) so a line never stops in the middle of an exchange. Win and loss scores
+    are stored in the table relative to the node, so a cached mate keeps its distance at
+    any ply. With a Tablebase, positions it covers are scored exactly from the table
+    instead of being searched.
+    """
+
+    def __init__(self, env, time_limit=0.1, max_depth=64, max_quiescence_ply=32, tt_size=1 << 20, tablebase=None):
+        self.env = env
+        self.tablebase = tablebase
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.max_quiescence_ply = max_quiescence_ply
+        self.tt_size = tt_size
+        self.tt = {}
+        self.history = {}
+        self.nodes = 0
+        self.depth = 0  # depth of the last completed iteration
+        self.score = 0
+        self.completed = []
+        self._deadline = float("inf")
+        self._undo_stack = []
+        self._path = set()
+
+    # --- evaluation ------------------------------------------------------------------
+
+    def evaluate(self, player):
+        """Static score of the position for player: material plus advancement of men"""
+        env = self.env
+        counts = env.piece_counts
+        score = MAN * (counts[1] - counts[2]) + KING * (counts[3] - counts[4])
+        board = env.board
+        rows = np.arange(env.board_size)
+        advance = ((board == 1).sum(axis=1) @ (env.board_size - 1 - rows)) - ((board == 2).sum(axis=1) @ rows)
+        score += ADVANCE * int(advance)
+        return score if player == 1 else -score
+
+    # --- search ----------------------------------------------------------------------
+
+    def search(self, player, time_limit=None, max_depth=None, moves=None, shared_alpha=None):
+        """Best move for player in the env's position, or None if player cannot move.
+
+        Deepens one ply at a time until time_limit seconds have passed, starting no new
+        iteration once half of it is gone, and returns the best move of the deepest
+        completed iteration; (depth, score, move) of every completed iteration is kept in
+        self.completed. moves restricts the root to some of the legal moves, and
+        shared_alpha (get(depth)/offer(depth, value)) shares root bounds with searches of
+        the other root moves running elsewhere (see ParallelSearch); a move is only
+        reported when it beat the shared bound.
+        """
+        env = self.env
+        moves = env.valid_moves(player) if moves is None else moves
+        self.completed = []
+        if not moves:
+            return None
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = max_depth or self.max_depth
+        start = time.perf_counter()
+        self._deadline = start + time_limit
+        self.nodes = 0
+        self.depth = 0
+        saved_player, saved_has_moved = env.player, env.has_moved
+        env.player = player
+        moves = list(moves)
+        best_move = moves[0]
+        try:
+            for depth in range(1, max_depth + 1):
+                if depth > 1 and time.perf_counter() - start > time_limit / 2:
+                    break  # the next iteration would not finish in the time left
+                score, move = self._search_root(moves, depth, player, shared_alpha)
+                self.completed.append((depth, score, move))
+                self.score, self.depth = score, depth
+                if move is not None:
+                    best_move = move
+                    moves.remove(move)
+                    moves.insert(0, move)
+                if abs(score) >= MATE or (len(moves) == 1 and shared_alpha is None):
+                    break
+        except SearchTimeout:
+            while self._undo_stack:
+                env.unmake_move(self._undo_stack.pop())
+        finally:
+            self._path.clear()
+            env.player = saved_player
+            env.has_moved = saved_has_moved
+        if len(self.tt) > self.tt_size:
+            self.tt.clear()
+        return best_move
+
+    def _search_root(self, moves, depth, player, shared_alpha=None):
+        alpha, beta = -WIN - 1, WIN + 1
+        best_move = None
+        for move in moves:
+            if shared_alpha is not None:
+                alpha = max(alpha, shared_alpha.get(depth))
+            value = self._child_value(move, depth, alpha, beta, player, 0)
+            if value > alpha:
+                alpha, best_move = value, move
+                if shared_alpha is not None:
+                    shared_alpha.offer(depth, value)
+        return alpha, best_move
+
+    def _child_value(self, move, depth, alpha, beta, player, ply):
+        """Play move, search the position after it and take it back; value is for player"""
+        env = self.env
+        undo = env.make_move(move, player)
+        self._undo_stack.append(undo)
+        if abs(move[2] - move[0]) == 2:
+            if env.must_jump:  # the jump continues: same player, same depth
+                value = self._negamax(depth, alpha, beta, player, ply + 1, False)
+            else:
+                env.player = 3 - player
+                value = -self._negamax(depth - 1, -beta, -alpha, 3 - player, ply + 1, True)
+        elif undo[5]:  # plain move while a jump was required: step keeps the same player
+            value = self._negamax(depth - 1, alpha, beta, player, ply + 1, False)
+        else:
+            env.player = 3 - player
+            value = -self._negamax(depth - 1, -beta, -alpha, 3 - player, ply + 1, True)
+        env.unmake_move(self._undo_stack.pop())
+        return value
+
+    def _negamax(self, depth, alpha, beta, player, ply, check_end):
+        """Value for player, whose turn it is; check_end is set when the turn has just passed,
+        the only time env.step looks for a winner"""
+        self.nodes += 1
+        if not self.nodes & (CHECK_EVERY - 1) and time.perf_counter() > self._deadline:
+            raise SearchTimeout()
+        env = self.env
+        if check_end:
+            winner = env.game_winner()  # the game also ends when the side not to move is stuck
+            if winner is not None:
+                return 0 if winner == 0 else (WIN - ply if winner == player else ply - WIN)
+        if self.tablebase is not None and self.tablebase.covers(env):
+            score = self.tablebase.probe(env, player)  # TB_WIN - plies to win, or minus that for a loss
+            return 0 if score == 0 else (WIN - ply - (TB_WIN - score) if score > 0 else ply - WIN + (TB_WIN + score))
+        moves = env.valid_moves(player)
+        if not moves:
+            return ply - WIN
+
+        if depth <= 0:  # quiescence: only forced jumps are searched past the horizon
+            if not env.jumps_forced(player) or ply >= self.max_quiescence_ply:
+                return self.evaluate(player)
+
+        key = env.zobrist_key ^ MUST_JUMP_KEY if env.must_jump else env.zobrist_key
+        if key in self._path:
+            return 0  # repeated position on this line
+        entry = self.tt.get(key)
+        tt_move = None
+        if entry is not None:
+            entry_depth, entry_value, flag, tt_move = entry
+            if entry_value >= MATE:  # stored as plies from this node, see below
+                entry_value -= ply
+            elif entry_value <= -MATE:
+                entry_value += ply
+            if entry_depth >= depth:
+                if flag == EXACT:
+                    return entry_value
+                if flag == LOWER and entry_value >= beta:
+                    return entry_value
+                if flag == UPPER and entry_value <= alpha:
+                    return entry_value
+
+        size = env.board_size
+        history = self.history
+        ordered = sorted(moves, key=lambda move: history.get(
+            ((move[0] * size + move[1]) * size + move[2]) * size + move[3], 0), reverse=True)
+        if tt_move is not None and tt_move in ordered:
+            ordered.remove(tt_move)
+            ordered.insert(0, tt_move)
+
+        original_alpha = alpha
+        best_value, best_move = -WIN - 1, ordered[0]
+        self._path.add(key)
+        for move in ordered:
+            value = self._child_value(move, depth, alpha, beta, player, ply)
+            if value > best_value:
+                best_value, best_move = value, move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        move_key = ((move[0] * size + move[1]) * size + move[2]) * size + move[3]
+                        history[move_key] = history.get(move_key, 0) + depth * depth
+                        break
+        self._path.discard(key)
+
+        if best_value <= original_alpha:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        stored = best_value + ply if best_value >= MATE else best_value - ply if best_value <= -MATE else best_value
+        self.tt[key] = (depth, stored, flag, best_move)
+        return best_value
@@ -1,16 +1,27 @@
+import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import messagebox
 import numpy as np
-from checkers_env import CheckersEnv
+from checkers_env import make_env
+from GameRecord import GameRecordWriter, describe_agent, game_record_path
+from Instrumentation import metrics
 from LearningAgent import QLearningAgent
 
+SEARCH_TIMES = {'medium': 0.03, 'hard': 0.1}  # seconds of alpha-beta search per AI move
+SEARCH_WORKERS = {'hard': max(1, (os.cpu_count() or 1) - 1)}  # processes searching each hard move
+POLL_MS = 15  # how often the Tk loop collects results from the AI thread
+
 class CheckerGUI:
-    def __init__(self, root, difficulty='easy'):
+    def __init__(self, root, difficulty='easy', engine='array', record_games=False):
         self.root = root
         self.root.title("Checkers")
         self.difficulty = difficulty
+        self.engine = engine
         self.board_size = 6 if difficulty == 'easy' else 8
-        self.env = CheckersEnv(board_size=self.board_size)
+        self.env = make_env(board_size=self.board_size, engine=self.engine)
+        self.ai_env = make_env(board_size=self.board_size, engine=self.engine)  # only the AI thread touches it
         self.canvas_size = 500
         self.cell_size = self.canvas_size // self.board_size
         self.current_player = 1
@@ -18,13 +29,52 @@ class CheckerGUI:
         self.valid_destinations = []
         self.history = []
         self.agent = self.create_agent()
-
+        # with record_games, finished and abandoned games are appended to games_<n>x<n>.cgr
+        self.record_games = record_games
+        self.recorder = None
+        self.game_moves = []  # (move, player) of the current game, kept in step with history
+        self.game_must_jump = False
+        self._open_recorder()
+
+        # AI thinking runs on a worker thread. Jobs carry a generation number; undo, reset and
+        # difficulty changes bump it, so results of cancelled jobs are dropped when they arrive.
+        self.ai_generation = 0
+        self.ai_thinking = False
+        self.ponder_cache = {}  # position key after a human move -> the AI's reply
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._poll_id = None
+        threading.Thread(target=self._ai_worker, daemon=True).start()
 
         self.setup_ui()
         self.render_board()
+        self._start_pondering()
+
+    def _open_recorder(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.record_games:
+            config = {"source": "gui", "engine": self.engine,
+                      "agents": [{"class": "human", "player": 1}, describe_agent(self.agent)]}
+            self.recorder = GameRecordWriter(game_record_path(self.board_size), self.board_size, config)
+
+    def _record_move(self, action, player):
+        if not self.game_moves:
+            self.game_must_jump = self.env.last_undo[5]  # reset keeps must_jump, so a game can start with it
+        self.game_moves.append((action, player))
+
+    def _finish_record(self, winner=None):
+        """Write the current game, if any moves were played, and start a new one"""
+        if self.recorder is not None and self.game_moves:
+            self.recorder.write_game(self.game_moves, winner, must_jump=self.game_must_jump)
+            self.recorder.flush()
+        self.game_moves = []
 
     def create_agent(self):
-        return QLearningAgent(self.env, player=2, difficulty=self.difficulty)
+        return QLearningAgent(self.ai_env, player=2, difficulty=self.difficulty,
+                              search_time=SEARCH_TIMES.get(self.difficulty),
+                              search_workers=SEARCH_WORKERS.get(self.difficulty, 1))
 
     def setup_ui(self):
 
@@ -50,6 +100,8 @@ class CheckerGUI:
 
     def on_piece_press(self, event):
         """处理棋子按下事件，并高亮合法移动位置"""
+        if self.ai_thinking:
+            return
         col, row = event.x // self.cell_size, event.y // self.cell_size
         piece = self.env.board[row, col]
 
@@ -69,12 +121,15 @@ class CheckerGUI:
             else:
                 self.valid_destinations = [move[2:4] for move in all_valid_moves if move[:2] == [row, col]]
 
-            print(f"Valid moves for player {self.current_player} from ({row}, {col}): {self.valid_destinations}")
+            metrics.trace("gui.select", player=self.current_player, square=(row, col),
+                          destinations=self.valid_destinations)
 
             self.render_board()
 
     def on_piece_release(self, event):
         """Handle piece release event and execute the move"""
+        if self.ai_thinking:
+            return
 
         if self.selected_piece:
             start_row, start_col = self.selected_piece
@@ -84,8 +139,9 @@ class CheckerGUI:
             valid_moves = self.env.valid_moves(self.current_player)
 
             if action in valid_moves:
-                self.history.append((self.env.board.copy(), self.current_player))
                 self.env.step(action, self.current_player)
+                self.history.append((self.env.last_undo, self.current_player))
+                self._record_move(action, self.current_player)
 
                 # Check if the move was a capture
                 if abs(end_row - start_row) == 2:
@@ -98,7 +154,7 @@ class CheckerGUI:
                     if additional_jumps:
                         self.selected_piece = (end_row, end_col)  # Keep the current piece selected
                         self.valid_destinations = [move[2:4] for move in additional_jumps]
-                        print(f"Forced multi-jump available: {self.valid_destinations}")
+                        metrics.trace("gui.multi_jump", destinations=self.valid_destinations)
                     else:
                         self.current_player = 2 if self.current_player == 1 else 1  # Switch player
                         self.selected_piece = None  # Deselect piece
@@ -117,89 +173,246 @@ class CheckerGUI:
 
     def regret_move(self):
         if self.history:
-            last_state, last_player = self.history.pop()
-            self.env.board = last_state
+            self._cancel_ai()
+            last_undo, last_player = self.history.pop()
+            if self.game_moves:  # empty once a finished game has been written out
+                self.game_moves.pop()
+            self.env.unmake_move(last_undo)
             self.current_player = last_player
             self.render_board()
+            self._start_pondering()
         else:
             messagebox.showinfo("Undo Move", "No moves to undo.")
 
     def set_difficulty(self, difficulty):
 
+        self._finish_record()
         self.difficulty = difficulty
         self.board_size = 6 if difficulty == 'easy' else 8
         self.cell_size = self.canvas_size // self.board_size
-        self.env = CheckersEnv(board_size=self.board_size)
+        self._cancel_ai()
+        self._jobs.join()  # the AI thread may still be searching with the old agent's pool
+        self.agent.close()  # a hard agent owns a process pool; don't leave it for the garbage collector
+        self.env = make_env(board_size=self.board_size, engine=self.engine)
+        self.ai_env = make_env(board_size=self.board_size, engine=self.engine)
         self.agent = self.create_agent()
+        self._open_recorder()
         self.reset_game()
 
-    def render_board(self):
+    def _build_board_items(self):
+        """Create one rectangle and one (hidden) oval per square for the current board size"""
         self.canvas.delete("all")
-
+        self._square_items = {}
+        self._piece_items = {}
         for row in range(self.board_size):
             for col in range(self.board_size):
                 x0, y0 = col * self.cell_size, row * self.cell_size
-                x1, y1 = x0 + self.cell_size, y0 + self.cell_size
-                color = "#D0E4C8" if (row + col) % 2 == 0 else "#F0F5F1"
-                if (row, col) in self.valid_destinations:
-                    color = "#B0E57C"
-
-                if self.selected_piece == (row, col):
-                    color = "#FFD700"
-
-                self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline="black")
-
-                piece = self.env.board[row, col]
-                if piece == 1:
-                    self.canvas.create_oval(x0 + 8, y0 + 8, x1 - 8, y1 - 8, fill="black")
-                elif piece == 2:
-                    self.canvas.create_oval(x0 + 8, y0 + 8, x1 - 8, y1 - 8, fill="red")
-                elif piece == 3:
-                    self.canvas.create_oval(x0 + 5, y0 + 5, x1 - 5, y1 - 5, fill="black", outline="gold", width=5)
-                elif piece == 4:
-                    self.canvas.create_oval(x0 + 5, y0 + 5, x1 - 5, y1 - 5, fill="red", outline="gold", width=5)
+                self._square_items[row, col] = self.canvas.create_rectangle(
+                    x0, y0, x0 + self.cell_size, y0 + self.cell_size, fill=self._square_color(row, col), outline="black")
+        for row in range(self.board_size):
+            for col in range(self.board_size):
+                self._piece_items[row, col] = self.canvas.create_oval(0, 0, 0, 0, state="hidden")
+        self._items_layout = (self.board_size, self.cell_size)
+        self._drawn_board = np.zeros((self.board_size, self.board_size), dtype=int)
+        self._drawn_highlights = {}
+
+    @staticmethod
+    def _square_color(row, col):
+        return "#D0E4C8" if (row + col) % 2 == 0 else "#F0F5F1"
+
+    def _draw_piece(self, row, col, piece):
+        item = self._piece_items[row, col]
+        if piece == 0:
+            self.canvas.itemconfigure(item, state="hidden")
+            return
+        x0, y0 = col * self.cell_size, row * self.cell_size
+        x1, y1 = x0 + self.cell_size, y0 + self.cell_size
+        inset = 8 if piece in (1, 2) else 5
+        self.canvas.coords(item, x0 + inset, y0 + inset, x1 - inset, y1 - inset)
+        fill = "black" if piece in (1, 3) else "red"
+        if piece in (3, 4):
+            self.canvas.itemconfigure(item, state="normal", fill=fill, outline="gold", width=5)
+        else:
+            self.canvas.itemconfigure(item, state="normal", fill=fill, outline="black", width=1)
 
-    def reset_game(self):
+    @metrics.timed("gui.render_board")
+    def render_board(self):
+        """Bring the canvas up to date, touching only squares whose piece or highlight changed"""
+        if getattr(self, "_items_layout", None) != (self.board_size, self.cell_size):
+            self._build_board_items()
+
+        highlights = {tuple(square): "#B0E57C" for square in self.valid_destinations}
+        if self.selected_piece is not None:
+            highlights[tuple(self.selected_piece)] = "#FFD700"
+        for square in highlights.keys() | self._drawn_highlights.keys():
+            color = highlights.get(square)
+            if color != self._drawn_highlights.get(square):
+                self.canvas.itemconfigure(self._square_items[square], fill=color or self._square_color(*square))
+        self._drawn_highlights = highlights
+
+        board = self.env.board
+        for row, col in np.argwhere(board != self._drawn_board).tolist():
+            self._draw_piece(row, col, board[row, col])
+        self._drawn_board = board.copy()
 
+    def reset_game(self):
+        self._cancel_ai()
+        self._finish_record()
         self.history.clear()
         self.env.reset()
         self.current_player = 1
         self.selected_piece = None
         self.valid_destinations = []
         self.render_board()
+        self._start_pondering()
 
     def check_winner(self):
         winner = self.env.game_winner()
         if winner is not None:
+            self._finish_record(winner)
             messagebox.showinfo("Game Over", f"Player {winner} Wins!")
             self.root.quit()
 
-    def ai_move(self):
-        while self.current_player == 2:  # **AI 需要连跳**
-            action = self.agent.choose_action(self.env.board)
-            if action is not None:
-                self.history.append((self.env.board.copy(), self.current_player))
-                self.env.step(action, self.current_player)
-                self.render_board()
-                self.check_winner()
-                if self.env.has_moved:
-                    print(f"⚠️ AI Player {self.current_player} has already moved. Skipping turn.")
-                    self.current_player = 1
-                    return
-
+    # --- AI thread ---------------------------------------------------------------------
+
+    @staticmethod
+    def _position_key(env):
+        """Everything the AI's turn depends on: board and side to move, must_jump and has_moved"""
+        return env.zobrist_key, env.must_jump, env.has_moved
+
+    @staticmethod
+    def _snapshot(env):
+        return env.board.copy(), env.player, env.must_jump, env.has_moved
+
+    @staticmethod
+    def _restore(env, snapshot):
+        board, player, must_jump, has_moved = snapshot
+        env.board = board.copy()
+        env.player = player
+        env.must_jump = must_jump
+        env.has_moved = has_moved
+
+    @staticmethod
+    def _ai_turn(agent):
+        """The moves the AI makes in its turn from agent.env's position, played on that env"""
+        env = agent.env
+        actions = []
+        while True:  # **AI 需要连跳**
+            action = agent.choose_action(env.board)
+            if action is None:
+                break
+            env.step(action, 2)
+            actions.append(action)
+            if env.game_winner() is not None or env.has_moved:
+                break
+            if not [move for move in env.valid_moves(2)
+                    if move[:2] == action[2:4] and abs(move[2] - move[0]) == 2]:
+                break
+        return actions
+
+    def _ai_worker(self):
+        """Thread body: runs think and ponder jobs one at a time and posts their results"""
+        while True:
+            kind, generation, agent, snapshot = self._jobs.get()
+            try:
+                if kind == "think":
+                    self._restore(agent.env, snapshot)
+                    self._results.put(("move", generation, None, self._ai_turn(agent)))
+                else:
+                    self._ponder(generation, agent, snapshot)
+            except Exception as e:
+                self._results.put(("error", generation, None, e))
+            finally:
+                self._jobs.task_done()
+
+    def _ponder(self, generation, agent, snapshot, piece=None):
+        """Work out the AI's reply to every human move from snapshot, stopping as soon as a
+        real request is queued or the job is cancelled; piece is the square a human
+        multi-jump continues from"""
+        env = agent.env
+        self._restore(env, snapshot)
+        moves = [move for move in env.valid_moves(1)
+                 if piece is None or (move[:2] == piece and abs(move[2] - move[0]) == 2)]
+        for move in moves:
+            if generation != self.ai_generation or not self._jobs.empty():
+                return
+            self._restore(env, snapshot)
+            env.step(move, 1)
+            if env.game_winner() is not None:
+                continue
+            if abs(move[2] - move[0]) == 2 and [jump for jump in env.valid_moves(1)
+                                                if jump[:2] == move[2:4] and abs(jump[2] - jump[0]) == 2]:
+                self._ponder(generation, agent, self._snapshot(env), move[2:4])  # the human jumps on
+                continue
+            self._results.put(("ponder", generation, self._position_key(env), self._ai_turn(agent)))
+
+    def _submit(self, kind):
+        agent = self.agent.ponder_copy() if kind == "ponder" else self.agent  # pondering must not train the agent
+        self._jobs.put((kind, self.ai_generation, agent, self._snapshot(self.env)))
+        if self._poll_id is None:
+            self._poll_id = self.root.after(POLL_MS, self._poll_ai)
+
+    def _poll_ai(self):
+        """Tk-side half of the AI thread: applies replies and stores pondered ones"""
+        self._poll_id = None
+        busy = self.ai_thinking or self._jobs.unfinished_tasks  # read first: results are posted before task_done
+        while True:
+            try:
+                kind, generation, key, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.ai_generation:
+                continue  # cancelled by undo, reset or a difficulty change
+            if kind == "ponder":
+                self.ponder_cache[key] = result
+            elif kind == "move":
+                self.ai_thinking = False
+                self._apply_ai_turn(result)
+            else:
+                self.ai_thinking = False
+                print(f"❌ Error: {result}")
+        if (busy or self.ai_thinking) and self._poll_id is None:
+            self._poll_id = self.root.after(POLL_MS, self._poll_ai)
 
-                additional_jumps = [
-                    move for move in self.env.valid_moves(self.current_player)
-                    if move[:2] == action[2:4] and abs(move[2] - move[0]) == 2
-                ]
+    def _cancel_ai(self):
+        self.ai_generation += 1
+        self.ai_thinking = False
+        self.ponder_cache = {}
 
-                if not additional_jumps:
-                    self.current_player = 1
-            else:
+    def _start_pondering(self):
+        if self.current_player == 1 and self.env.game_winner() is None:
+            self._submit("ponder")
 
-                winner = self.env.game_winner()
-                if winner is not None:
-                    messagebox.showinfo("Game Over", f"Player {winner} Wins!")
-                    self.root.quit()
+    def ai_move(self):
+        """Play the AI's turn: at once if it was pondered, otherwise once the AI thread replies"""
+        metrics.maybe_emit()
+        actions = self.ponder_cache.get(self._position_key(self.env))
+        self.ponder_cache = {}
+        if actions is not None:
+            metrics.count("gui.ponder_hits")
+            self._apply_ai_turn(actions)
+            return
+        metrics.count("gui.ponder_misses")
+        self.ai_thinking = True
+        self._submit("think")
+
+    def _apply_ai_turn(self, actions):
+        if not actions:
+            winner = self.env.game_winner()
+            if winner is not None:
+                self._finish_record(winner)
+                messagebox.showinfo("Game Over", f"Player {winner} Wins!")
+                self.root.quit()
+        for action in actions:
+            self.env.step(action, self.current_player)
+            self.history.append((self.env.last_undo, self.current_player))
+            self._record_move(action, self.current_player)
+            self.render_board()
+            self.check_winner()
+            if self.env.has_moved:
+                metrics.count("gui.ai_turns_ended_by_has_moved")
+                break
+        self.current_player = 1
+        self._start_pondering()
 
 
@@ -0,0 +1,301 @@
+import json
+import os
+import struct
+import sys
+from array import array
+import numpy as np
+from ActionSpace import action_space
+from vec_checkers_env import VecCheckersEnv
+
+# .cgr file: header, then records that each start with a kind byte.
+#   b"S" session: a JSON config of the board, engine and agents that played the games after it
+#   b"G" game: ply count, winner, flags and reward, then one uint16 per ply holding the
+#        ActionSpace action (in the board's own frame) with the mover in the top bit
+RECORD_MAGIC = b"CGR1"
+RECORD_HEADER = struct.Struct("<4sII")  # magic, version, board_size
+RECORD_VERSION = 1
+SESSION = struct.Struct("<cI")  # kind, length of the JSON that follows
+GAME = struct.Struct("<cIbBf")  # kind, plies, winner (-1 unfinished), flags, reward
+MUST_JUMP_FLAG = 1  # must_jump was already set at the start (env.reset keeps it)
+PLAYER_BIT = 15
+AGENT_SETTINGS = ("player", "difficulty", "learning_rate", "discount_factor", "exploration_rate", "search_time",
+                  "think_time")
+
+
+def game_record_path(board_size):
+    return f"games_{board_size}x{board_size}.cgr"
+
+
+def describe_agent(agent):
+    """JSON-ready settings of an agent for a session config"""
+    config = {"class": type(agent).__name__}
+    for name in AGENT_SETTINGS:
+        value = getattr(agent, name, None)
+        if value is not None:
+            config[name] = value
+    return config
+
+
+class GameRecord:
+    """One recorded game: uint16 ply codes plus the result"""
+    __slots__ = ("codes", "winner", "reward", "must_jump", "config")
+
+    def __init__(self, codes, winner, reward, must_jump, config):
+        self.codes = codes
+        self.winner = winner  # as env.game_winner(), None for a game that did not finish
+        self.reward = reward
+        self.must_jump = must_jump
+        self.config = config  # session config the game was played under
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def actions(self):
+        return (self.codes & ((1 << PLAYER_BIT) - 1)).astype(np.int64)
+
+    @property
+    def players(self):
+        return (self.codes >> PLAYER_BIT).astype(np.int8) + 1
+
+    def moves(self, board_size):
+        """[(move, player)] of the game"""
+        space = action_space(board_size)
+        return [(space.decode(action), player) for action, player in zip(self.actions.tolist(), self.players.tolist())]
+
+
+class GameRecordWriter:
+    """Appends games to a .cgr file through a buffered file object.
+
+    Opening an existing file checks its header and appends after its last complete record,
+    cutting off a record left half-written by a crash; config, when given, is written as a
+    new session that applies to the games written after it. A game is either built ply by
+    ply (begin_game, record_move, end_game) or written whole with write_game. Games reach
+    the disk when the buffer fills, on flush and on close.
+    """
+
+    def __init__(self, path, board_size, config=None, buffer_size=1 << 16):
+        self.path = path
+        self.board_size = board_size
+        self.action_space = action_space(board_size)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            _read_header(path, board_size)
+            end = _complete_length(path)
+            if end < os.path.getsize(path):
+                print(f"⚠️ {path} ends in a half-written record, truncating it to the last complete one.")
+                os.truncate(path, end)
+        self.file = open(path, "ab", buffering=buffer_size)
+        if not exists:
+            self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, board_size))
+        self.games = 0
+        self._codes = array("H")
+        self._must_jump = False
+        if config is not None:
+            self.write_session(config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def write_session(self, config):
+        data = json.dumps(config).encode("utf-8")
+        self.file.write(SESSION.pack(b"S", len(data)))
+        self.file.write(data)
+
+    def begin_game(self, must_jump=False):
+        del self._codes[:]
+        self._must_jump = must_jump
+
+    def record_move(self, move, player):
+        self._codes.append(self.action_space.encode(move) | (player - 1) << PLAYER_BIT)
+
+    def end_game(self, winner, reward=0.0):
+        self.file.write(GAME.pack(b"G", len(self._codes), -1 if winner is None else winner,
+                                  MUST_JUMP_FLAG if self._must_jump else 0, reward))
+        self.file.write(self._codes.tobytes())
+        del self._codes[:]
+        self.games += 1
+
+    def write_game(self, moves, winner, reward=0.0, must_jump=False):
+        """Write a whole game given as [(move, player)]"""
+        self.begin_game(must_jump)
+        for move, player in moves:
+            self.record_move(move, player)
+        self.end_game(winner, reward)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def _read_header(path, board_size=None):
+    with open(path, "rb") as f:
+        magic, version, size = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError(f"{path} is not a version {RECORD_VERSION} game record file.")
+    if board_size is not None and size != board_size:
+        raise ValueError(f"{path} holds {size}x{size} games, not {board_size}x{board_size}.")
+    return size
+
+
+def _scan_records(data):
+    """Yield (kind, offset, size) of every complete record in the mapped file data, in order"""
+    position, end = RECORD_HEADER.size, len(data)
+    while position < end:
+        kind = data[position:position + 1].tobytes()
+        if kind == b"S" and position + SESSION.size <= end:
+            size = SESSION.size + SESSION.unpack_from(data, position)[1]
+        elif kind == b"G" and position + GAME.size <= end:
+            size = GAME.size + 2 * GAME.unpack_from(data, position)[1]
+        else:
+            return
+        if position + size > end:
+            return
+        yield kind, position, size
+        position += size
+
+
+def _complete_length(path):
+    """Length of the file up to the end of its last complete record"""
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    length = RECORD_HEADER.size
+    for _, position, size in _scan_records(data):
+        length = position + size
+    del data
+    return length
+
+
+class GameRecordReader:
+    """Reads the games of a .cgr file written by GameRecordWriter.
+
+    Iterating streams the games in file order with buffered reads, so a file of any size
+    (or one still being written; a half-written last game is skipped) is scanned in
+    constant memory. len() and indexing memory-map the file and build an index of game
+    offsets on first use.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.board_size = _read_header(path)
+        self.action_space = action_space(self.board_size)
+        self._offsets = None  # file offset of every game, filled in by _index
+
+    def __iter__(self):
+        config = None
+        with open(self.path, "rb", buffering=self.buffer_size) as f:
+            f.seek(RECORD_HEADER.size)
+            while True:
+                kind = f.read(1)
+                if kind == b"S":
+                    header = f.read(SESSION.size - 1)
+                    if len(header) < SESSION.size - 1:
+                        return
+                    (length,) = struct.unpack("<I", header)
+                    data = f.read(length)
+                    if len(data) < length:
+                        return
+                    config = json.loads(data)
+                elif kind == b"G":
+                    header = f.read(GAME.size - 1)
+                    if len(header) < GAME.size - 1:
+                        return
+                    plies, winner, flags, reward = struct.unpack("<IbBf", header)
+                    data = f.read(2 * plies)
+                    if len(data) < 2 * plies:
+                        return
+                    yield self._record(np.frombuffer(data, dtype="<u2"), winner, flags, reward, config)
+                else:
+                    return
+
+    @staticmethod
+    def _record(codes, winner, flags, reward, config):
+        return GameRecord(codes, None if winner < 0 else winner, reward, bool(flags & MUST_JUMP_FLAG), config)
+
+    def _index(self):
+        if self._offsets is not None:
+            return
+        self._data = data = np.memmap(self.path, dtype=np.uint8, mode="r")
+        offsets, config_ids, configs = [], [], [None]
+        for kind, position, size in _scan_records(data):
+            if kind == b"S":
+                configs.append(json.loads(data[position + SESSION.size:position + size].tobytes()))
+            else:
+                offsets.append(position)
+                config_ids.append(len(configs) - 1)
+        self._offsets = np.array(offsets, dtype=np.int64)
+        self._config_ids = np.array(config_ids, dtype=np.int32)
+        self._configs = configs
+
+    def __len__(self):
+        self._index()
+        return len(self._offsets)
+
+    def __getitem__(self, index):
+        self._index()
+        position = int(self._offsets[index])
+        _, plies, winner, flags, reward = GAME.unpack_from(self._data, position)
+        codes = np.frombuffer(self._data, dtype="<u2", count=plies, offset=position + GAME.size)
+        return self._record(codes, winner, flags, reward, self._configs[self._config_ids[index]])
+
+
+def replay(record, env):
+    """Play a record through a CheckersEnv from the start, yielding (move, player, reward, done) per ply"""
+    env.reset()
+    env.must_jump = record.must_jump
+    space = env.action_space
+    for action, player in zip(record.actions.tolist(), record.players.tolist()):
+        move = space.decode(action)
+        env.player = player  # the recorded mover, whatever turn rule the players followed
+        _, reward, done = env.step(move, player)
+        yield move, player, reward, done
+
+
+def replay_batch(records, board_size):
+    """Replay many records side by side in one VecCheckersEnv.
+
+    Yields (games, boards, rewards, dones) after each ply: the indices of the records that
+    made that ply and the boards, step rewards and game-over flags of all records. A
+    record's board stays at its final position once its plies run out.
+    """
+    records = list(records)
+    lengths = np.array([len(record) for record in records], dtype=np.int64)
+    codes = np.zeros((len(records), lengths.max(initial=0)), dtype=np.uint16)
+    for i, record in enumerate(records):
+        codes[i, :len(record)] = record.codes
+    actions = (codes & ((1 << PLAYER_BIT) - 1)).astype(np.int64)
+    players = (codes >> PLAYER_BIT).astype(np.int8) + 1
+
+    vec = VecCheckersEnv(len(records), board_size, auto_reset=False)
+    vec.must_jump[:] = [record.must_jump for record in records]
+    for ply in range(codes.shape[1]):
+        games = np.flatnonzero(lengths > ply)
+        vec.player[games] = players[games, ply]
+        step_actions = np.full(len(records), -1, dtype=np.int64)
+        step_actions[games] = actions[games, ply]
+        boards, rewards, dones = vec.step(step_actions)
+        yield games, boards, rewards, dones
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python GameRecord.py games_8x8.cgr")
+        sys.exit(1)
+    reader = GameRecordReader(sys.argv[1])
+    results = {}
+    plies = 0
+    for record in reader:
+        results[record.winner] = results.get(record.winner, 0) + 1
+        plies += len(record)
+    games = sum(results.values())
+    print(f"✅ {games} games on {reader.board_size}x{reader.board_size}, {plies} plies")
+    for winner, count in sorted(results.items(), key=lambda item: -1 if item[0] is None else item[0]):
+        label = "unfinished" if winner is None else "draws" if winner == 0 else f"player {winner} wins"
+        print(f"  {label}: {count}")
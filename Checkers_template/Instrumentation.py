@@ -0,0 +1,169 @@
+import functools
+import os
+import random
+import time
+from collections import deque
+
+BUCKETS = 40  # timing histograms use power-of-two buckets of microseconds
+
+
+class Histogram:
+    """Timing distribution in power-of-two microsecond buckets: bucket b holds [2**(b-1), 2**b) us"""
+
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = min(int(seconds * 1e6).bit_length(), BUCKETS - 1)
+        self.buckets[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percentile):
+        """Upper edge in seconds of the bucket holding the percentile"""
+        rank = percentile / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return (1 << bucket) / 1e6
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count, "total_s": self.total, "mean_s": self.total / self.count if self.count else 0.0,
+                "p50_s": self.percentile(50), "p99_s": self.percentile(99), "max_s": self.max}
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """Named counters, timing histograms, sampled event traces and a periodic summary.
+
+    Everything is a no-op while enabled is False; hot call sites check metrics.enabled
+    before doing any work of their own. trace_rate is the fraction of trace() events
+    kept (in a ring buffer of trace_buffer events, also passed to trace_sink if set).
+    maybe_emit() sends summary() to emit once every summary_interval seconds.
+    """
+
+    def __init__(self, enabled=False, trace_rate=0.0, trace_buffer=1000, trace_sink=None, summary_interval=60.0,
+                 emit=print):
+        self.enabled = enabled
+        self.trace_rate = trace_rate
+        self.trace_sink = trace_sink
+        self.summary_interval = summary_interval
+        self.emit = emit
+        self.traces = deque(maxlen=trace_buffer)
+        self._random = random.Random()  # sampling must not disturb the seeded global random
+        self.reset()
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if not hasattr(self, name):
+                raise ValueError(f"Invalid instrumentation option {name!r}.")
+            setattr(self, name, value)
+        return self
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.traces.clear()
+        self._started = self._last_emit = time.perf_counter()
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def timer(self, name):
+        """Context manager adding the time spent in its block to histogram name"""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name):
+        """Decorator timing every call of a function into histogram name"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def trace(self, event, **fields):
+        """Record a sampled event; fields should be cheap to pass (no formatting at the call site)"""
+        if self.enabled and self.trace_rate and self._random.random() < self.trace_rate:
+            record = (time.time(), event, fields)
+            self.traces.append(record)
+            if self.trace_sink is not None:
+                self.trace_sink(record)
+
+    def snapshot(self):
+        return {"elapsed_s": time.perf_counter() - self._started, "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}}
+
+    def summary(self):
+        snapshot = self.snapshot()
+        lines = [f"📊 Metrics after {snapshot['elapsed_s']:.1f}s"]
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"  {name}: {value}")
+        for name, stats in sorted(snapshot["histograms"].items()):
+            lines.append(f"  {name}: {stats['count']} calls, mean {stats['mean_s'] * 1e6:.1f}us, "
+                         f"p50 <{stats['p50_s'] * 1e6:.0f}us, p99 <{stats['p99_s'] * 1e6:.0f}us, "
+                         f"max {stats['max_s'] * 1e6:.0f}us")
+        return "\n".join(lines)
+
+    def maybe_emit(self, force=False):
+        """Emit the summary if summary_interval seconds have passed since the last one"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if force or (self.summary_interval is not None and now - self._last_emit >= self.summary_interval):
+            self._last_emit = now
+            self.emit(self.summary())
+
+
+# Shared instance used by the env, agents, training loop and GUI; CHECKERS_METRICS=1 turns it on
+metrics = Instrumentation(enabled=os.environ.get("CHECKERS_METRICS") == "1",
+                          trace_rate=float(os.environ.get("CHECKERS_TRACE_RATE", "0")))
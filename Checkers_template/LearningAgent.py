@@ -1,22 +1,80 @@
+import copy
 import numpy as np
 import random
 from collections import defaultdict
+from AlphaBetaSearch import AlphaBetaSearch
+from Instrumentation import metrics
+from OpeningBook import load_opening_book
+from ParallelSearch import ParallelSearch
+from ActionSpace import masked_argmax
+from QTable import ActionQTable, load_json
+from ReplayBuffer import ReplayBuffer, td_update
+from Tablebase import load_tablebase
 from TaskSimilarity import TaskSimilarity
+from checkers_env import canonical_hash
 import json
 import os
 
+def ucb(mean_values, visits, total_visits, exploration=2.0):
+    """UCB1 score of each action: mean value plus an exploration bonus for rarely tried actions"""
+    return mean_values + exploration * np.sqrt(np.log(total_visits) / visits)
+
+
 class QLearningAgent:
-    def __init__(self, env, player, board_size=6, difficulty='easy'):
+    def __init__(self, env, player, board_size=6, difficulty='easy', search_time=None, search_workers=1,
+                 persistent=True):
         self.env = env
+        self.persistent = persistent  # False: no Q-table file, opening book or tablebase is read or written
         self.player = player
         self.board_size = board_size
         self.difficulty = difficulty
         self.task_similarity = TaskSimilarity()
-        self.q_table = defaultdict(lambda: np.zeros(len(self.env.valid_moves(self.player) or [0])))
+        self.action_space = env.action_space  # Q-rows hold one value per action, indexed in the canonical frame
+        self.q_table = self._new_q_table()
         self.exploration_log = []
         self.visits = defaultdict(int)
+        self.total_visits = 0  # running sum of visits
+        self.action_visits = self._new_q_table()  # per (state, action) counts of select_ucb_action
+        self.replay = None  # ReplayBuffer once enable_replay is called
+        self.search_time = search_time  # seconds of alpha-beta search per move, None to play from the Q-table
+        self.opening_book = None  # instant opening replies, if OpeningBook.py has been run
+        self.tablebase = None  # exact endgame play, if Tablebase.py has been run
+        if persistent:
+            self.opening_book = load_opening_book(env.board_size)
+            self.tablebase = load_tablebase(env.board_size)
+        # search_workers > 1 splits the root moves over a process pool, unless there is one CPU to run it on
+        if search_workers > 1 and (os.cpu_count() or 1) > 1:
+            self.searcher = ParallelSearch(env, search_workers, tablebase=self.tablebase)
+        else:
+            self.searcher = AlphaBetaSearch(env, tablebase=self.tablebase)
         self.set_difficulty(self.difficulty)
 
+    def close(self):
+        """Shut down the searcher's worker processes, if it has any"""
+        if isinstance(self.searcher, ParallelSearch):
+            self.searcher.close()
+
+    def ponder_copy(self):
+        """Copy of this agent to think ahead with (e.g. on the human's time in the GUI).
+
+        choose_action on the copy leaves this agent untouched: visit counts and search
+        state are the copy's own, while the Q-table, opening book and tablebase are shared
+        read-only. A ParallelSearch keeps its process pool, so the copy must not search
+        at the same time as this agent.
+        """
+        agent = copy.copy(self)
+        agent.visits = defaultdict(int)
+        agent.action_visits = self._new_q_table()
+        agent.exploration_log = []
+        if isinstance(self.searcher, ParallelSearch):
+            agent.searcher = copy.copy(self.searcher)  # rebinds its statistics on every search
+        else:
+            agent.searcher = AlphaBetaSearch(self.env, tablebase=self.tablebase)
+        return agent
+
+    def _new_q_table(self):
+        return ActionQTable(self.action_space.num_actions)
+
     def set_difficulty(self, difficulty):
         difficulty = difficulty.lower()
         if difficulty == "easy":
@@ -44,28 +102,51 @@ class QLearningAgent:
 
         self.min_exploration_rate = 0.1
 
-        self.q_table_file = f"q_table_{difficulty}.json"
-
+        # Q-rows are as wide as the board's action space, so every board size keeps its own table
+        self.q_table_file = f"q_table_{difficulty}_{self.env.board_size}x{self.env.board_size}.qtb"
 
-        self.load_q_table(self.q_table_file)
+        if self.persistent:
+            self.load_q_table(self.q_table_file)
+        else:
+            self.q_table = self._new_q_table()
 
 
 
+    @metrics.timed("agent.choose_action")
     def choose_action(self, state, use_ucb=False):
         valid_moves = self.env.valid_moves(self.player)
 
         if not valid_moves:
             return None
 
-        state_hash = self.task_similarity.find_similar_state(state)
-        if state_hash is not None:
-            best_action = self.task_similarity.get_best_action(state_hash, valid_moves)
+        if self.opening_book is not None:
+            book_move = self.opening_book.best_move(self.env, self.player)
+            if book_move is not None:
+                metrics.count("agent.book_moves")
+                return book_move
+
+        if self.tablebase is not None and self.tablebase.covers(self.env):
+            metrics.count("agent.tablebase_moves")
+            return self.tablebase.best_move(self.env, self.player)
+
+        if self.search_time:
+            metrics.count("agent.search_moves")
+            return self.searcher.search(self.player, self.search_time)
+
+        state_hash = self.state_to_hash(state)
+        flipped = self.env.player == 2
+        similar_hash = self.task_similarity.find_similar_state(state, state_hash, flipped)
+        if similar_hash is not None:
+            best_action = self.task_similarity.get_best_action(similar_hash, valid_moves, flipped)
             if best_action:
+                metrics.count("agent.similar_moves")
                 return best_action
 
-        state_hash = self.state_to_hash(state)
         self.visits[state_hash] += 1
-
+        self.total_visits += 1
+        if use_ucb:
+            metrics.count("agent.ucb_moves")
+            return self.select_ucb_action(state, valid_moves)
 
         jump_moves = [move for move in valid_moves if abs(move[2] - move[0]) == 2]
         normal_moves = [move for move in valid_moves if abs(move[2] - move[0]) == 1]
@@ -73,107 +154,197 @@ class QLearningAgent:
         action = None
 
         if jump_moves:
-            print(f"⚠️ AI Player {self.player} must jump: {jump_moves}")
+            metrics.count("agent.jump_moves")
+            metrics.trace("agent.jump", player=self.player, moves=jump_moves)
             action = random.choice(jump_moves)
 
         else:
             if normal_moves:
-                print(f"✅ AI Player {self.player} performs normal move: {normal_moves}")
+                metrics.count("agent.normal_moves")
+                metrics.trace("agent.normal_move", player=self.player, moves=normal_moves)
                 action = random.choice(normal_moves)
 
             else:
                 return None
 
         if action not in valid_moves:
-            print(f"⚠️ AI picked an invalid move {action}, forcing a random valid move!")
+            metrics.count("agent.invalid_moves")
+            metrics.trace("agent.invalid_move", player=self.player, action=action)
             action = random.choice(valid_moves)
 
         return action
 
-    def learn(self, state, action, reward, next_state):
+    @metrics.timed("agent.learn")
+    def learn(self, state, action, reward, next_state, state_hash=None, next_state_hash=None):
+        """Q-update for one transition; pass the env's canonical_key before/after the move as the hashes.
+
+        learn runs after the move, when env.player is already the next side to move, so the
+        action is put in this agent's frame, the one state_hash was taken in.
+        """
         valid_moves = self.env.valid_moves(self.player)
         if not valid_moves or action not in valid_moves:
             return
-        state_hash = self.state_to_hash(state)
-        next_state_hash = self.state_to_hash(next_state)
-
-        if state_hash not in self.q_table:
-            self.q_table[state_hash] = np.full(len(valid_moves), -1.0)
-
-        if next_state_hash not in self.q_table:
-            self.q_table[next_state_hash] = np.zeros(len(valid_moves))
-
-        try:
-            action_index = valid_moves.index(action)
-        except ValueError:
-            print(f"⚠️ Action {action} not found in valid_moves: {valid_moves}")
-            return
-
-        if len(self.q_table[next_state_hash]) > 0:
-            best_next_action = np.argmax(self.q_table[next_state_hash])
-        else:
-            best_next_action = 0
-
-
-        td_target = reward + self.discount_factor * self.q_table[next_state_hash][best_next_action]
-        td_error = td_target - self.q_table[state_hash][action_index]
-        self.q_table[state_hash][action_index] += self.learning_rate * td_error  # **更新 Q 值**
-
-        print(
-            f"Updated Q-table: {state_hash} | Action {action} | New Q-value: {self.q_table[state_hash][action_index]}")
+        if state_hash is None:
+            state_hash = canonical_hash(state, self.player)
+        if next_state_hash is None:
+            next_state_hash = self.state_to_hash(next_state)
+
+        self.q_table.create(state_hash, fill=-1.0)
+        self.q_table.create(next_state_hash, fill=0.0)
+        action_index = self.action_space.encode(action, self.player == 2)
+
+        # only the next side's legal actions count, not slots still at the row's fill
+        next_mask = self.action_space.mask(self.env.legal_actions(self.env.player))
+        td_target = reward + self.discount_factor * self.q_table.max(next_state_hash, mask=next_mask)
+        q_value = self.q_table.value(state_hash, action_index)
+        q_value += self.learning_rate * (td_target - q_value)
+        self.q_table.update_value(state_hash, action_index, q_value)  # **更新 Q 值**
+        metrics.count("agent.q_updates")
+        metrics.trace("agent.q_update", state=state_hash, action=action, q_value=q_value)
 
         try:
-            self.task_similarity.store_state(state, action)
+            self.task_similarity.store_state(state, action, state_hash, self.player == 2)
         except Exception as e:
             print(f"⚠️ Error storing state in task_similarity: {e}")
 
+    def enable_replay(self, capacity=100000, batch_size=256, updates_per_episode=4, prioritized=False):
+        """Learn in vectorized batches from a replay buffer (remember + learn_from_replay) instead of learn"""
+        self.replay = ReplayBuffer(capacity)
+        self.replay_batch_size = batch_size
+        self.replay_updates = updates_per_episode
+        self.prioritized_replay = prioritized
+
+    def action_index(self, action):
+        """(canonical action of action, Q-row width) for the replay buffer"""
+        return self.action_space.encode(action, self.player == 2), self.action_space.num_actions
+
+    def remember(self, state_hash, action_index, num_actions, reward, next_state_hash, done):
+        """Buffer a transition for learn_from_replay; call it after the move, like learn"""
+        next_mask = self.action_space.mask(self.env.legal_actions(self.env.player))
+        self.replay.add(state_hash, action_index, num_actions, reward, next_state_hash, done, next_mask)
+
+    def learn_from_replay(self, updates=None):
+        """Apply batched TD updates sampled from the replay buffer; returns the last batch's TD errors"""
+        if self.replay is None or len(self.replay) == 0:
+            return None
+        td_errors = None
+        for _ in range(updates or self.replay_updates):
+            indices, weights = self.replay.sample(self.replay_batch_size, self.prioritized_replay)
+            td_errors = td_update(self.q_table, self.replay, indices, self.learning_rate, self.discount_factor,
+                                  weights if self.prioritized_replay else None)
+            if self.prioritized_replay:
+                self.replay.update_priorities(indices, td_errors)
+            metrics.count("agent.q_updates", len(indices))
+        return td_errors
+
+    def end_episode(self, reward=None):
+        """Called by train_agent after every episode; reward is the final reward of the agent
+        that did not make the last move, when a move ended the game"""
+        if self.replay is not None:
+            self.learn_from_replay()
+
     def state_to_hash(self, state):
-        return hash(tuple(state.flatten())) if state is not None else 0
+        """Canonical 64-bit key of state for the side to move, so a position and its flip share
+        Q-values; O(1) when state is the env's live board. Q-rows are indexed by canonical action."""
+        if state is None:
+            return 0
+        if state is self.env.board:
+            return self.env.canonical_key
+        return canonical_hash(state, self.env.player)
 
     def update_exploration_rate(self):
         self.exploration_rate = max(self.min_exploration_rate, self.exploration_rate * self.exploration_decay)
 
     def select_ucb_action(self, state, valid_moves):
         state_hash = self.state_to_hash(state)
-        total_visits = sum(self.visits.values()) + 1
-        ucb_values = []
-
-        for action_index in range(len(valid_moves)):
-            q_value = self.q_table[state_hash][action_index]
-            visit_count = self.visits[state_hash] + 1
-            ucb_value = q_value + 2 * np.sqrt(np.log(total_visits) / visit_count)
-            ucb_values.append(ucb_value)
-
-        return valid_moves[np.argmax(ucb_values)]
+        actions = self.env.legal_actions(self.player)  # aligned with valid_moves
+        self.q_table.create(state_hash)
+        self.action_visits.create(state_hash)
+        scores = ucb(self.q_table.get(state_hash), self.action_visits.get(state_hash) + 1, self.total_visits + 1)
+        action = masked_argmax(scores, self.action_space.mask(actions))
+        self.action_visits.update_value(state_hash, action, self.action_visits.value(state_hash, action) + 1)
+        return valid_moves[int(np.flatnonzero(actions == action)[0])]
+
+    def q_table_delta(self, baseline):
+        """QTable of the rows that are new or changed compared with a copy of the table"""
+        delta = self._new_q_table()
+        for state, q_values in self.q_table.items(include_base=False):
+            base = baseline.get(state)
+            if base is None or not np.array_equal(base, q_values):
+                delta[state] = q_values
+        return delta
+
+    def merge_q_tables(self, deltas):
+        """Merge (q_table delta, visits delta) pairs from parallel workers into this agent.
+
+        Each row becomes the visit-weighted average of the current row and the workers'
+        copies, where a worker that changed a row weighs at least 1 even if it never
+        visited it through choose_action. Rows whose length disagrees with the current
+        row are dropped; visit counts are summed.
+        """
+        states = set()
+        for q_delta, _ in deltas:
+            states.update(q_delta)
+
+        for state in states:
+            candidates = [(q_delta[state], max(visits.get(state, 0), 1))
+                          for q_delta, visits in deltas if state in q_delta]
+            base = self.q_table.get(state)
+            base_weight = self.visits.get(state, 0)
+            if base is None:
+                base = max(candidates, key=lambda candidate: candidate[1])[0]
+                base_weight = 0
+
+            total = base_weight * base
+            weight = base_weight
+            for q_values, visits in candidates:
+                if len(q_values) == len(base):
+                    total = total + visits * q_values
+                    weight += visits
+            self.q_table[state] = total / weight
+
+        for _, visits in deltas:
+            for state, count in visits.items():
+                self.visits[state] += count
+                self.total_visits += count
 
     def save_q_table(self, filepath):
-        """使用 JSON 存储 Q-table"""
-        q_table_dict = {str(state): q_values.tolist() for state, q_values in self.q_table.items()}  # 转换 JSON 格式
+        """存储 Q-table: .json 为可读的 JSON 格式, 其他为二进制 .qtb"""
+        if filepath.endswith(".json"):
+            q_table_dict = {str(state): q_values.tolist() for state, q_values in self.q_table.items()}  # 转换 JSON 格式
 
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(q_table_dict, f, indent=4)
+            with open(filepath, "w", encoding="utf-8") as f:
+                json.dump(q_table_dict, f, indent=4)
+        else:
+            self.q_table.save(filepath)
         print(f"✅ Q-table saved to {filepath}")
 
     def load_q_table(self, filepath):
+        """Load a .qtb table lazily (memory-mapped) or a .json table written by save_q_table.
+
+        Tables saved before the canonical keys and action space (q_table_<difficulty>.json)
+        are keyed and laid out differently and are not read; the agent starts a new table.
+        """
         if not os.path.exists(filepath):
             print(f"⚠️ Q-table file not found ({filepath}), creating a new empty Q-table.")
-            self.q_table = defaultdict(lambda: np.zeros(len(self.env.valid_moves(self.player) or [0])))
+            self.q_table = self._new_q_table()
             self.save_q_table(filepath)
             return
 
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                loaded_q_table = json.load(f)
-
             # 还原 Q-table
-            self.q_table = defaultdict(
-                lambda: np.zeros(len(self.env.valid_moves(self.player) or [0])),
-                {int(state): np.array(q_values) for state, q_values in loaded_q_table.items()},
-            )
+            width = self.action_space.num_actions
+            if filepath.endswith(".json"):
+                self.q_table = load_json(filepath, width)
+            else:
+                self.q_table = ActionQTable.load(filepath, width)
             print(f"✅ Q-table loaded from {filepath}")
         except json.JSONDecodeError:
             print("❌ Error: Invalid JSON format! Please check the Q-table file.")
-            self.q_table = defaultdict(lambda: np.zeros(len(self.env.valid_moves(self.player) or [0])))
+            self.q_table = self._new_q_table()
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            self.q_table = self._new_q_table()
 
     def update_exploration_rate(self):
         self.exploration_rate = max(self.min_exploration_rate, self.exploration_rate * self.exploration_decay)
@@ -0,0 +1,248 @@
+import random
+import time
+import numpy as np
+from LearningAgent import QLearningAgent, ucb
+
+MUST_JUMP_KEY = 0x6A09E667F3BCC909  # same salt as AlphaBetaSearch: positions differ while must_jump is set
+ROLLOUT_POLICIES = ("random", "q")
+
+
+class MCTSAgent(QLearningAgent):
+    """QLearningAgent that chooses moves by Monte Carlo Tree Search.
+
+    The tree lives in flat arrays: nodes (position key, side to move, edge range, visits,
+    result) and edges (move, mover, child node, visits, summed value), grown by doubling.
+    Each simulation descends by UCB1 over edge statistics, adds one node, finishes the
+    game with the rollout policy for up to rollout_depth plies (scoring unfinished games by
+    material) and backs the result up the path. Edge values are in [0, 1] for the player who
+    made the move.
+
+    rollout_policy is "random", "q" (the Q-table's best move where it has a row, else random)
+    or a callable (agent, moves, player) -> move. With q_prior_visits > 0 new edges start
+    with that many virtual visits valued from the Q-table row of their position.
+
+    The tree is kept between moves: the next search starts from the node of the position
+    actually reached if it is within a few plies of the last root.
+    """
+
+    def __init__(self, env, player, board_size=6, difficulty='easy', think_time=0.1, max_simulations=None,
+                 exploration=1.4, rollout_policy="random", rollout_depth=40, q_prior_visits=0, max_nodes=200000):
+        super().__init__(env, player, board_size, difficulty)
+        if not callable(rollout_policy) and rollout_policy not in ROLLOUT_POLICIES:
+            raise ValueError(f"Invalid rollout policy. Choose one of {ROLLOUT_POLICIES} or pass a callable.")
+        self.think_time = think_time
+        self.max_simulations = max_simulations
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self.rollout_depth = rollout_depth
+        self.q_prior_visits = q_prior_visits
+        self.max_nodes = max_nodes
+        self.simulations = 0
+        self.reset_tree()
+
+    # --- tree storage ----------------------------------------------------------------
+
+    def reset_tree(self, node_capacity=1024, edge_capacity=8192):
+        self.node_key = np.zeros(node_capacity, dtype=np.uint64)
+        self.node_player = np.zeros(node_capacity, dtype=np.int8)
+        self.node_edge_start = np.zeros(node_capacity, dtype=np.int32)
+        self.node_edge_count = np.zeros(node_capacity, dtype=np.int32)
+        self.node_visits = np.zeros(node_capacity, dtype=np.int32)
+        self.node_winner = np.full(node_capacity, -1, dtype=np.int8)  # -1 while the game goes on
+        self.edge_move = np.zeros((edge_capacity, 4), dtype=np.int8)
+        self.edge_player = np.zeros(edge_capacity, dtype=np.int8)
+        self.edge_child = np.full(edge_capacity, -1, dtype=np.int32)
+        self.edge_visits = np.zeros(edge_capacity, dtype=np.float64)
+        self.edge_value = np.zeros(edge_capacity, dtype=np.float64)
+        self.num_nodes = 0
+        self.num_edges = 0
+        self.root = -1
+
+    def ponder_copy(self):
+        agent = super().ponder_copy()
+        agent.reset_tree()  # the tree arrays are updated in place
+        return agent
+
+    @staticmethod
+    def _grown(array, size, fill=0):
+        if size <= len(array):
+            return array
+        grown = np.full((max(size, 2 * len(array)),) + array.shape[1:], fill, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _position_key(self):
+        env = self.env
+        return env.zobrist_key ^ MUST_JUMP_KEY if env.must_jump else env.zobrist_key
+
+    def _add_node(self, player, winner):
+        """Node for the env's position with player to move; edges for its legal moves unless the game is over"""
+        env = self.env
+        moves = env.valid_moves(player) if winner < 0 else []
+        if winner < 0 and not moves:
+            winner = 3 - player
+            moves = []
+        node, start = self.num_nodes, self.num_edges
+        self.num_nodes += 1
+        self.num_edges += len(moves)
+        for name in ("node_key", "node_player", "node_edge_start", "node_edge_count", "node_visits"):
+            setattr(self, name, self._grown(getattr(self, name), self.num_nodes))
+        self.node_winner = self._grown(self.node_winner, self.num_nodes, -1)
+        for name in ("edge_move", "edge_player", "edge_visits", "edge_value"):
+            setattr(self, name, self._grown(getattr(self, name), self.num_edges))
+        self.edge_child = self._grown(self.edge_child, self.num_edges, -1)
+
+        self.node_key[node] = self._position_key()
+        self.node_player[node] = player
+        self.node_edge_start[node] = start
+        self.node_edge_count[node] = len(moves)
+        self.node_winner[node] = winner
+        end = start + len(moves)
+        if moves:
+            self.edge_move[start:end] = moves
+            self.edge_player[start:end] = player
+            if self.q_prior_visits:
+                q_values = self.q_table.get(env.canonical_key)
+                if q_values is not None:
+                    prior = 0.5 + 0.5 * np.tanh(q_values[env.legal_actions(player)])
+                    self.edge_visits[start:end] = self.q_prior_visits
+                    self.edge_value[start:end] = self.q_prior_visits * prior
+        return node
+
+    def _find_root(self, max_plies=4):
+        """Node of the env's position among the last root's descendants, or -1"""
+        key = self._position_key()
+        frontier = [self.root] if self.root >= 0 else []
+        for _ in range(max_plies + 1):
+            next_frontier = []
+            for node in frontier:
+                if self.node_key[node] == key and self.node_player[node] == self.env.player:
+                    return node
+                start = self.node_edge_start[node]
+                children = self.edge_child[start:start + self.node_edge_count[node]]
+                next_frontier.extend(children[children >= 0].tolist())
+            frontier = next_frontier
+        return -1
+
+    # --- simulation ------------------------------------------------------------------
+
+    def _play(self, move, player):
+        """Make move like env.step minus rewards: returns (undo, player to move, whether the turn passed)"""
+        env = self.env
+        undo = env.make_move(move, player)
+        if abs(move[2] - move[0]) == 2:
+            passed = not env.must_jump
+        else:
+            passed = not undo[5]  # a plain move made while a jump was required keeps the turn
+        next_player = 3 - player if passed else player
+        env.player = next_player
+        return undo, next_player, passed
+
+    def _select_edge(self, node):
+        start = self.node_edge_start[node]
+        end = start + self.node_edge_count[node]
+        visits = self.edge_visits[start:end]
+        unvisited = np.flatnonzero(visits == 0)
+        if unvisited.size:
+            return start + int(unvisited[random.randrange(unvisited.size)])
+        scores = ucb(self.edge_value[start:end] / visits, visits, self.node_visits[node] + 1, self.exploration)
+        return start + int(np.argmax(scores))
+
+    def _rollout_move(self, moves, player):
+        if callable(self.rollout_policy):
+            return self.rollout_policy(self, moves, player)
+        if self.rollout_policy == "q":
+            q_values = self.q_table.get(self.env.canonical_key)
+            if q_values is not None:
+                return moves[int(np.argmax(q_values[self.env.legal_actions(player)]))]
+        return random.choice(moves)
+
+    def _rollout(self, player):
+        """Value in [0, 1] for player 1 of finishing the game from the env's position"""
+        env = self.env
+        undos = []
+        winner = None
+        for _ in range(self.rollout_depth):
+            moves = env.valid_moves(player)
+            if not moves:
+                winner = 3 - player
+                break
+            undo, player, passed = self._play(self._rollout_move(moves, player), player)
+            undos.append(undo)
+            if passed:
+                winner = env.game_winner()
+                if winner is not None:
+                    break
+        if winner is None:
+            counts = env.piece_counts
+            material = (counts[1] - counts[2]) + 1.5 * (counts[3] - counts[4])
+            value = 0.5 + 0.5 * np.tanh(material / 3)
+        else:
+            value = 0.5 if winner == 0 else float(winner == 1)
+        for undo in reversed(undos):
+            env.unmake_move(undo)
+        return value
+
+    def _simulate(self):
+        env = self.env
+        node = self.root
+        path_nodes, path_edges, undos = [], [], []
+        while True:
+            winner = self.node_winner[node]
+            if winner >= 0:
+                value = 0.5 if winner == 0 else float(winner == 1)
+                break
+            edge = self._select_edge(node)
+            path_nodes.append(node)
+            path_edges.append(edge)
+            undo, player, passed = self._play(self.edge_move[edge].tolist(), int(self.node_player[node]))
+            undos.append(undo)
+            child = self.edge_child[edge]
+            if child < 0:
+                winner = env.game_winner() if passed else None
+                child = self._add_node(player, -1 if winner is None else winner)
+                self.edge_child[edge] = child
+                winner = self.node_winner[child]
+                value = (0.5 if winner == 0 else float(winner == 1)) if winner >= 0 else self._rollout(player)
+                break
+            node = child
+        for undo in reversed(undos):
+            env.unmake_move(undo)
+
+        self.node_visits[path_nodes] += 1
+        edges = np.array(path_edges, dtype=np.int64)
+        self.edge_visits[edges] += 1
+        self.edge_value[edges] += np.where(self.edge_player[edges] == 1, value, 1 - value)
+
+    def choose_action(self, state, use_ucb=False):
+        """Most visited root move after think_time seconds (or max_simulations) of search"""
+        env = self.env
+        valid_moves = env.valid_moves(self.player)
+        if not valid_moves:
+            return None
+        if len(valid_moves) == 1:
+            return valid_moves[0]
+
+        saved_player, saved_has_moved = env.player, env.has_moved
+        env.player = self.player
+        try:
+            root = self._find_root()
+            if root < 0 or self.num_nodes > self.max_nodes:
+                self.reset_tree()
+                root = self._add_node(self.player, -1)
+            self.root = root
+
+            deadline = time.perf_counter() + self.think_time
+            self.simulations = 0
+            while time.perf_counter() < deadline and (
+                    self.max_simulations is None or self.simulations < self.max_simulations):
+                self._simulate()
+                self.simulations += 1
+        finally:
+            env.player = saved_player
+            env.has_moved = saved_has_moved
+
+        start = self.node_edge_start[self.root]
+        visits = self.edge_visits[start:start + self.node_edge_count[self.root]]
+        best = self.edge_move[start + int(np.argmax(visits))].tolist()
+        return next(move for move in valid_moves if move == best)
@@ -0,0 +1,178 @@
+import os
+import random
+import struct
+import sys
+import numpy as np
+from AlphaBetaSearch import MUST_JUMP_KEY
+from ActionSpace import action_space
+from checkers_env import flip_move, make_env
+
+BOOK_MAGIC = b"OBK1"
+BOOK_HEADER = struct.Struct("<4sIII")  # magic, version, board_size, count
+BOOK_VERSION = 2  # version 1 stored moves as base-board_size digits instead of actions
+
+
+def book_path(board_size):
+    return f"opening_book_{board_size}x{board_size}.obk"
+
+
+def position_key(env):
+    """Book key of the env's position: canonical key, salted while a jump must continue"""
+    key = env.canonical_key
+    return key ^ MUST_JUMP_KEY if env.must_jump else key
+
+
+class OpeningBookBuilder:
+    """Move statistics of self-play games over their first max_ply plies.
+
+    Positions are keyed as seen by the side to move (see position_key) and moves are
+    stored in that same canonical frame, so both colours share one entry per position.
+    Each (position, move) keeps how often it was played, the summed result for the mover
+    (1 win, 0.5 draw, 0 loss) and the earliest ply it was seen at.
+    """
+
+    def __init__(self, board_size=6, max_ply=12):
+        self.board_size = board_size
+        self.max_ply = max_ply
+        self.action_space = action_space(board_size)
+        self.stats = {}  # (key, canonical action) -> [count, score, ply]
+        self.games = 0
+
+    def record_game(self, plies, winner):
+        """plies is [(key, canonical move, mover)] from the start of a game; winner as env.game_winner()"""
+        self.games += 1
+        for ply, (key, move, mover) in enumerate(plies[:self.max_ply]):
+            score = 0.5 if winner in (0, None) else float(winner == mover)
+            entry = self.stats.setdefault((key, self.action_space.encode(move)), [0, 0.0, ply])
+            entry[0] += 1
+            entry[1] += score
+            entry[2] = min(entry[2], ply)
+
+    def play_games(self, num_games, engine="bitboard", policy=None, max_game_plies=300, seed=0):
+        """Self-play num_games games; policy(env, moves, player) -> move, random by default"""
+        rng = random.Random(seed)
+        policy = policy or (lambda env, moves, player: rng.choice(moves))
+        env = make_env(board_size=self.board_size, engine=engine)
+        for game in range(num_games):
+            env.reset()
+            env.must_jump = False  # reset keeps it, but every game starts like a fresh env
+            plies = []
+            winner = None
+            for _ in range(max_game_plies):
+                player = env.player
+                moves = env.valid_moves(player)
+                if not moves:
+                    break
+                move = policy(env, moves, player)
+                if len(plies) < self.max_ply:
+                    canonical = flip_move(move, self.board_size) if player == 2 else list(move)
+                    plies.append((position_key(env), canonical, player))
+                _, _, done = env.step(move, player)
+                if done:
+                    winner = env.game_winner()
+                    break
+            self.record_game(plies, winner)
+            if (game + 1) % 5000 == 0:
+                print(f"📈 Opening book: {game + 1}/{num_games} games, {len(self.stats)} entries")
+
+    def save(self, path, min_count=5, max_ply=None):
+        """Write the entries seen at least min_count times within max_ply plies, sorted by key"""
+        max_ply = self.max_ply if max_ply is None else max_ply
+        kept = [(key, move, count, score) for (key, move), (count, score, ply) in self.stats.items()
+                if count >= min_count and ply < max_ply]
+        kept.sort()
+        keys = np.array([entry[0] for entry in kept], dtype=np.uint64)
+        moves = np.array([entry[1] for entry in kept], dtype=np.uint16)
+        counts = np.array([entry[2] for entry in kept], dtype=np.uint32)
+        scores = np.array([entry[3] for entry in kept], dtype=np.float32)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, self.board_size, len(kept)))
+            for column in (keys, counts, scores, moves):
+                column.tofile(f)
+        os.replace(temp_path, path)
+        return len(kept)
+
+
+class OpeningBook:
+    """Memory-mapped opening book written by OpeningBookBuilder.save.
+
+    The file holds a header and four columns over the same sorted entries: keys (uint64),
+    counts (uint32), summed scores (float32) and canonical actions (uint16). A position's moves
+    are the run of equal keys found by binary search.
+    """
+
+    def __init__(self, path, min_count=1):
+        self.path = path
+        self.min_count = min_count
+        with open(path, "rb") as f:
+            magic, version, board_size, count = BOOK_HEADER.unpack(f.read(BOOK_HEADER.size))
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError(f"{path} is not a version {BOOK_VERSION} opening book file.")
+        self.board_size = board_size
+        self.action_space = action_space(board_size)
+        offset = BOOK_HEADER.size
+        columns = []
+        for dtype in (np.uint64, np.uint32, np.float32, np.uint16):
+            columns.append(np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)).view(np.ndarray)
+                           if count else np.zeros(0, dtype=dtype))
+            offset += count * np.dtype(dtype).itemsize
+        self.keys, self.counts, self.scores, self.moves = columns
+
+    def __reduce__(self):
+        return OpeningBook, (self.path, self.min_count)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def probe(self, env, player=None):
+        """[(move, count, mean score for the mover)] for the env's position, most played first"""
+        player = env.player if player is None else player
+        if env.board_size != self.board_size or player != env.player:
+            return []
+        key = np.uint64(position_key(env))
+        start = int(np.searchsorted(self.keys, key, side="left"))
+        end = int(np.searchsorted(self.keys, key, side="right"))
+        entries = []
+        for index in range(start, end):
+            count = int(self.counts[index])
+            entries.append((self.action_space.decode(int(self.moves[index]), player == 2),
+                            count, float(self.scores[index]) / count))
+        entries.sort(key=lambda entry: -entry[1])
+        return entries
+
+    def best_move(self, env, player):
+        """Book move with the best smoothed result among legal moves, or None when out of book"""
+        valid_moves = env.valid_moves(player)
+        best, best_value = None, -1.0
+        for move, count, mean in self.probe(env, player):
+            if count < self.min_count or move not in valid_moves:
+                continue
+            value = (mean * count + 1) / (count + 2)  # pulls rarely played moves towards 0.5
+            if value > best_value:
+                best, best_value = move, value
+        return best
+
+
+def load_opening_book(board_size, min_count=1):
+    """Opening book for the board size from the working directory, or None if it was not built"""
+    path = book_path(board_size)
+    return OpeningBook(path, min_count) if os.path.exists(path) else None
+
+
+def build_opening_book(board_size=6, num_games=20000, max_ply=12, min_count=5, path=None, engine="bitboard",
+                       policy=None, seed=0):
+    """Self-play num_games games and save the pruned book; returns the path"""
+    builder = OpeningBookBuilder(board_size, max_ply)
+    builder.play_games(num_games, engine, policy, seed=seed)
+    path = path or book_path(board_size)
+    kept = builder.save(path, min_count)
+    print(f"✅ Opening book with {kept} of {len(builder.stats)} entries written to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    games = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    build_opening_book(size, games)
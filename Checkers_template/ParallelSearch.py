@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor, wait
+from AlphaBetaSearch import WIN, AlphaBetaSearch
+from checkers_env import make_env
+
+_worker = {}  # per-process state: shared bounds and one searcher per (engine, board_size)
+WARM_TIMEOUT = 60  # seconds the constructor waits for the workers to start
+
+
+class SharedAlpha:
+    """Best root score found so far at each iteration depth, shared by all workers"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, depth):
+        return self.values[depth]
+
+    def offer(self, depth, value):
+        with self.values.get_lock():
+            if value > self.values[depth]:
+                self.values[depth] = value
+
+
+def _init_worker(values, tablebase, ready):
+    _worker["alpha"] = SharedAlpha(values)
+    _worker["tablebase"] = tablebase
+    _worker["ready"] = ready
+
+
+def _searcher(engine, board_size):
+    searcher = _worker.get((engine, board_size))
+    if searcher is None:
+        env = make_env(board_size=board_size, engine=engine)
+        searcher = _worker[(engine, board_size)] = AlphaBetaSearch(env, tablebase=_worker["tablebase"])
+    return searcher
+
+
+def _warm_worker(engine, board_size):
+    """Build this process's searcher ahead of the first move, then wait for the others, so
+    that every process of the pool takes exactly one warm-up job"""
+    _searcher(engine, board_size)
+    _worker["ready"].wait(WARM_TIMEOUT)
+
+
+def _search_worker(engine, board_size, board, player, must_jump, has_moved, moves, deadline, max_depth):
+    """Search a share of the root moves until the wall-clock deadline; returns the completed
+    (depth, score, move) iterations, the node count and the seconds spent"""
+    start = time.time()
+    searcher = _searcher(engine, board_size)
+    env = searcher.env
+    env.board = board
+    env.player = player
+    env.must_jump = must_jump
+    env.has_moved = has_moved
+    searcher.search(player, max(deadline - time.time(), 0.0), max_depth, moves, _worker["alpha"])
+    return searcher.completed, searcher.nodes, time.time() - start
+
+
+class ParallelSearch:
+    """Root-parallel AlphaBetaSearch over a process pool.
+
+    The legal root moves are dealt out to the workers, each of which deepens over its share
+    with its own transposition table until a common wall-clock deadline. Root bounds are
+    shared per depth through a multiprocessing array, so a worker starts each root move with
+    the best score any worker has found at that depth and cuts off against it. The answer
+    is the best move of the deepest iteration every worker completed. Per-worker speed of
+    the last search is kept in worker_stats as (nodes, seconds, nodes per second). A
+    Tablebase is handed to the workers, which map the same file.
+    """
+
+    def __init__(self, env, num_workers=None, time_limit=0.1, max_depth=64, tablebase=None):
+        self.env = env
+        self.num_workers = num_workers or os.cpu_count()
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.depth = 0
+        self.score = 0
+        self.nodes = 0
+        self.worker_stats = []
+        # spawn, not fork: the GUI process has Tk state that must not be copied into workers
+        context = multiprocessing.get_context("spawn")
+        self._alpha = context.Array("d", max_depth + 2)
+        ready = context.Barrier(self.num_workers)
+        self._pool = ProcessPoolExecutor(max_workers=self.num_workers, mp_context=context,
+                                         initializer=_init_worker, initargs=(self._alpha, tablebase, ready))
+        self._finalizer = weakref.finalize(self, self._pool.shutdown, wait=False, cancel_futures=True)
+        # start every worker and build its searcher now, so the first move is not spent on it
+        wait([self._pool.submit(_warm_worker, env.engine, env.board_size) for _ in range(self.num_workers)],
+             WARM_TIMEOUT)
+
+    def close(self):
+        self._finalizer()
+
+    def search(self, player, time_limit=None, max_depth=None):
+        """Best move for player in the env's position, or None if player cannot move"""
+        env = self.env
+        moves = env.valid_moves(player)
+        if not moves:
+            return None
+        if len(moves) == 1:
+            self.depth, self.nodes, self.worker_stats = 0, 0, []
+            return moves[0]
+        time_limit = self.time_limit if time_limit is None else time_limit
+        max_depth = min(max_depth or self.max_depth, self.max_depth)
+        deadline = time.time() + time_limit
+        self._alpha[:] = [-WIN - 1.0] * len(self._alpha)
+
+        shares = [moves[worker::self.num_workers] for worker in range(min(self.num_workers, len(moves)))]
+        futures = [self._pool.submit(_search_worker, env.engine, env.board_size, env.board.copy(), player,
+                                     env.must_jump, env.has_moved, share, deadline, max_depth)
+                   for share in shares]
+        results = [future.result() for future in futures]
+
+        self.worker_stats = [(nodes, seconds, nodes / seconds if seconds > 0 else 0.0)
+                             for _, nodes, seconds in results]
+        self.nodes = sum(nodes for _, nodes, _ in results)
+        # deepest iteration finished by every worker; all of them report on that depth
+        self.depth = min(len(completed) for completed, _, _ in results)
+        best_move, self.score = moves[0], 0
+        entries = [completed[self.depth - 1] for completed, _, _ in results if self.depth]
+        reported = [(score, move) for _, score, move in entries if move is not None]
+        if reported:
+            self.score, best_move = max(reported, key=lambda entry: entry[0])
+        return best_move
+
+    def report(self):
+        """One line per worker with the speed of the last search"""
+        return "\n".join(f"worker {index}: {nodes} nodes in {seconds:.3f}s ({rate:,.0f} nodes/s)"
+                         for index, (nodes, seconds, rate) in enumerate(self.worker_stats))
@@ -0,0 +1,799 @@
+import json
+import os
+import struct
+import numpy as np
+from ActionSpace import masked_argmax
+
+_MIX = 0x9E3779B97F4A7C15  # Fibonacci hashing multiplier
+_MASK64 = (1 << 64) - 1
+
+# .qtb file: header, then keys uint64[count] (sorted), offsets uint64[count + 1], and
+#   version 1 (QTable):       values float32[total]
+#   version 2 (ActionQTable): fills float32[count], values float32[total], actions uint16[total]
+QTB_MAGIC = b"QTB1"
+QTB_HEADER = struct.Struct("<4sIQQI4x")  # magic, version, count, total values, row width (0 for ragged rows)
+QTB_VERSION = 1
+QTB_ACTION_VERSION = 2
+
+
+def _ranges(offsets, lengths):
+    """Indices of the concatenated ranges [offset, offset + length) of every row"""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    starts = np.asarray(offsets, dtype=np.int64) - (np.cumsum(lengths) - lengths)
+    return np.repeat(starts, lengths) + np.arange(lengths.sum())
+
+
+def _map(path, dtype, offset, count):
+    if count == 0:  # np.memmap refuses empty mappings
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)).view(np.ndarray)
+
+
+class QTableFile:
+    """Read-only .qtb Q-table mapped with np.memmap; rows are found by binary search over the keys"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, count, total, row_width = QTB_HEADER.unpack(f.read(QTB_HEADER.size))
+        if magic != QTB_MAGIC or version not in (QTB_VERSION, QTB_ACTION_VERSION):
+            raise ValueError(f"{path} is not a Q-table file.")
+        self.version = version
+        self.row_width = row_width or None
+        offset = QTB_HEADER.size
+        self.keys = _map(path, np.uint64, offset, count)
+        offset += 8 * count
+        self.offsets = _map(path, np.uint64, offset, count + 1)
+        offset += 8 * (count + 1)
+        self.fills = self.actions = None  # only ActionQTable files store them
+        if version == QTB_ACTION_VERSION:
+            self.fills = _map(path, np.float32, offset, count)
+            offset += 4 * count
+        self.values = _map(path, np.float32, offset, total)
+        offset += 4 * total
+        if version == QTB_ACTION_VERSION:
+            self.actions = _map(path, np.uint16, offset, total)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __reduce__(self):  # workers reopen the mapping instead of receiving a copy
+        return QTableFile, (self.path,)
+
+    def find(self, key):
+        """Position of key in the file, or -1"""
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index < len(self.keys) and self.keys.item(index) == key:
+            return index
+        return -1
+
+    def get(self, key):
+        index = self.find(key)
+        if index < 0:
+            return None
+        return self.values[self.offsets.item(index):self.offsets.item(index + 1)]
+
+    def row(self, index):
+        """(actions, values, fill) of the row at a position of an ActionQTable file"""
+        start, end = self.offsets.item(index), self.offsets.item(index + 1)
+        return self.actions[start:end], self.values[start:end], self.fills.item(index)
+
+
+class QTable:
+    """Q-values keyed by 64-bit state keys, stored without per-state Python objects.
+
+    An open-addressing (linear probing) index maps a key to a row id; rows of any length
+    live back to back in one pooled value array, described by ``row_offsets`` and
+    ``row_lengths``. A state costs roughly 24 bytes of index plus 12 bytes of row
+    bookkeeping plus 4 bytes per action, instead of a dict entry and a small ndarray.
+
+    Arrays returned by ``get``/``__getitem__`` are views into the pool and stop tracking
+    the table once it grows, so read or write values through the key-based methods
+    (``value``, ``update_value``, ``argmax``, ``max``) when inserting in between.
+
+    A table opened with ``QTable.load`` reads through to a memory-mapped ``QTableFile``
+    (``base``) and copies a row into the in-memory pool only when it is written, so
+    loading costs the same for any file size.
+    """
+
+    def __init__(self, capacity=1024, dtype=np.float32, base=None):
+        self.dtype = np.dtype(dtype)
+        self.base = base
+        self._shadowed = 0  # in-memory rows that replace a row of base
+        self._size = 0
+        self._init_index(max(8, 1 << (int(capacity) - 1).bit_length()))
+        self.row_offsets = np.zeros(capacity, dtype=np.int64)
+        self.row_lengths = np.zeros(capacity, dtype=np.int32)
+        self.values = np.zeros(capacity * 8, dtype=self.dtype)
+        self._used = 0  # length of the occupied prefix of values
+
+    def _init_index(self, slots):
+        self._slots = slots
+        self._shift = 64 - (slots.bit_length() - 1)
+        self._keys = np.zeros(slots, dtype=np.uint64)
+        self._rows = np.full(slots, -1, dtype=np.int32)
+
+    # --- index -----------------------------------------------------------------------
+
+    def _find(self, key):
+        """Return (slot, row) for key; row is -1 and slot the free slot to use when absent"""
+        slot = ((key * _MIX) & _MASK64) >> self._shift
+        key_at, row_at, mask = self._keys.item, self._rows.item, self._slots - 1
+        while True:
+            row = row_at(slot)
+            if row < 0 or key_at(slot) == key:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def _grow_index(self):
+        occupied = self._rows >= 0
+        keys, rows = self._keys[occupied], self._rows[occupied]
+        self._init_index(self._slots * 2)
+        slots = (keys * np.uint64(_MIX)) >> np.uint64(self._shift)
+        mask = np.uint64(self._slots - 1)
+        # place every key at its home slot, bumping colliding keys one slot further each round
+        pending = np.arange(len(keys))
+        while pending.size:
+            free = self._rows[slots[pending].astype(np.int64)] < 0
+            candidates = pending[free]
+            targets, first = np.unique(slots[candidates], return_index=True)
+            placed = candidates[first]
+            self._keys[targets.astype(np.int64)] = keys[placed]
+            self._rows[targets.astype(np.int64)] = rows[placed]
+            is_placed = np.zeros(len(keys), dtype=bool)
+            is_placed[placed] = True
+            pending = pending[~is_placed[pending]]
+            blocked = pending[~(self._rows[slots[pending].astype(np.int64)] < 0)]
+            slots[blocked] = (slots[blocked] + np.uint64(1)) & mask
+
+    def _row(self, key):
+        return self._find(key & _MASK64)[1]
+
+    def _own_row(self, key):
+        """In-memory row of key, copying it out of base first when needed; -1 if missing"""
+        key &= _MASK64
+        slot, row = self._find(key)
+        if row < 0 and self.base is not None:
+            values = self.base.get(key)
+            if values is not None:
+                self._shadowed += 1
+                row = self._place(slot, key, values)
+        return row
+
+    def _lookup(self, key):
+        """Values of key's row, in memory or in base, or None"""
+        row = self._row(key)
+        if row >= 0:
+            return self._view(row)
+        if self.base is not None:
+            return self.base.get(key & _MASK64)
+        return None
+
+    # --- rows ------------------------------------------------------------------------
+
+    def _reserve(self, length):
+        """Offset of length fresh entries at the end of the value pool"""
+        while self._used + length > len(self.values):
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+        offset = self._used
+        self._used += length
+        return offset
+
+    def _append_row(self, values):
+        row = self._size
+        if row == len(self.row_offsets):
+            self.row_offsets = np.concatenate([self.row_offsets, np.zeros_like(self.row_offsets)])
+            self.row_lengths = np.concatenate([self.row_lengths, np.zeros_like(self.row_lengths)])
+        self.row_offsets[row] = offset = self._reserve(len(values))
+        self.row_lengths[row] = len(values)
+        self.values[offset:offset + len(values)] = values
+        self._size += 1
+        return row
+
+    def _view(self, row):
+        offset = self.row_offsets.item(row)
+        return self.values[offset:offset + self.row_lengths.item(row)]
+
+    def get_or_create(self, key, length, fill=0.0):
+        """Row for key, creating it with length entries set to fill when missing"""
+        row = self._own_row(key)
+        if row < 0:
+            row = self._insert(key, np.full(length, fill, dtype=self.dtype))
+        return self._view(row)
+
+    def _insert(self, key, values):
+        key &= _MASK64
+        slot, row = self._find(key)
+        if row >= 0:
+            if len(values) != self.row_lengths[row]:  # a resized row moves to the end of the pool
+                self.row_offsets[row] = self._reserve(len(values))
+                self.row_lengths[row] = len(values)
+            self._view(row)[:] = values
+            return row
+        if self.base is not None and self.base.find(key) >= 0:
+            self._shadowed += 1
+        return self._place(slot, key, values)
+
+    def _place(self, slot, key, values):
+        row = self._append_row(values)
+        self._keys[slot] = key
+        self._rows[slot] = row
+        if self._size * 2 > self._slots:
+            self._grow_index()
+        return row
+
+    # --- Q-value operations ----------------------------------------------------------
+
+    def get(self, key, default=None):
+        values = self._lookup(key)
+        return default if values is None else values
+
+    def _position(self, key, index):
+        row = self._own_row(key)
+        if row < 0:
+            raise KeyError(key)
+        if not 0 <= index < self.row_lengths.item(row):
+            raise IndexError(f"action index {index} out of range for a row of {self.row_lengths[row]}")
+        return self.row_offsets.item(row) + index
+
+    def value(self, key, index):
+        values = self._lookup(key)
+        if values is None:
+            raise KeyError(key)
+        return float(values[index])
+
+    def update_value(self, key, index, value):
+        self.values[self._position(key, index)] = value
+
+    def argmax(self, key):
+        """Index of the best action of key's row (0 for a missing or empty row)"""
+        values = self._lookup(key)
+        if values is None or len(values) == 0:
+            return 0
+        return int(np.argmax(values))
+
+    def max(self, key, default=0.0):
+        values = self._lookup(key)
+        if values is None or len(values) == 0:
+            return default
+        return float(values.max())
+
+    # --- batched operations ----------------------------------------------------------
+
+    def _find_rows(self, keys):
+        """Row of each key held in memory, -1 where absent: _find for an array of keys"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        slots = ((keys * np.uint64(_MIX)) >> np.uint64(self._shift)).astype(np.int64)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        mask = self._slots - 1
+        while pending.size:  # one probe step for every unresolved key per round
+            at = slots[pending]
+            row_at = self._rows[at]
+            hit = (row_at >= 0) & (self._keys[at] == keys[pending])
+            rows[pending[hit]] = row_at[hit]
+            pending = pending[(row_at >= 0) & ~hit]
+            slots[pending] = (slots[pending] + 1) & mask
+        return rows
+
+    def get_or_create_rows(self, keys, lengths, fill=0.0):
+        """Row ids for an array of keys, creating missing rows like get_or_create"""
+        rows = self._find_rows(keys)
+        for i in np.flatnonzero(rows < 0).tolist():
+            key = int(keys[i])
+            row = self._own_row(key)
+            if row < 0:
+                row = self._insert(key, np.full(int(lengths[i]), fill, dtype=self.dtype))
+            rows[i] = row
+        return rows
+
+    def values_at(self, rows, indices):
+        """Q-values of (row id, action index) pairs"""
+        return self.values[self.row_offsets[rows] + indices]
+
+    def add_at(self, rows, indices, deltas):
+        """Add deltas to the Q-values of (row id, action index) pairs; repeated pairs accumulate"""
+        np.add.at(self.values, self.row_offsets[rows] + indices, np.asarray(deltas, dtype=self.dtype))
+
+    def max_many(self, keys, default=0.0):
+        """max() for an array of keys"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        rows = self._find_rows(keys)
+        result = np.full(len(keys), default, dtype=np.float64)
+        found = np.flatnonzero(rows >= 0)
+        lengths = self.row_lengths[rows[found]].astype(np.int64)
+        filled = found[lengths > 0]
+        lengths = lengths[lengths > 0]
+        if filled.size:
+            values = self.values[_ranges(self.row_offsets[rows[filled]], lengths)]
+            result[filled] = np.maximum.reduceat(values, np.cumsum(lengths) - lengths)
+        if self.base is not None:
+            for i in np.flatnonzero(rows < 0).tolist():
+                result[i] = self.max(int(keys[i]), default)
+        return result
+
+    # --- mapping interface -----------------------------------------------------------
+
+    def __len__(self):
+        return self._size + (len(self.base) - self._shadowed if self.base is not None else 0)
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def __getitem__(self, key):
+        values = self._lookup(key)
+        if values is None:
+            raise KeyError(key)
+        return values
+
+    def __setitem__(self, key, values):
+        self._insert(key, np.asarray(values, dtype=self.dtype))
+
+    def _base_rows(self):
+        """Positions in base of the rows not replaced in memory"""
+        if self.base is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(~np.isin(self.base.keys, self._keys[self._rows >= 0]))
+
+    def keys(self):
+        keys = self._keys[self._rows >= 0].tolist()
+        if self.base is not None:
+            keys += self.base.keys[self._base_rows()].tolist()
+        return keys
+
+    def items(self, include_base=True):
+        """(key, values) pairs; include_base=False lists only the rows held in memory"""
+        occupied = np.flatnonzero(self._rows >= 0)
+        for key, row in zip(self._keys[occupied].tolist(), self._rows[occupied].tolist()):
+            yield key, self._view(row)
+        if include_base and self.base is not None:
+            for index in self._base_rows().tolist():
+                yield self.base.keys.item(index), self.base.values[self.base.offsets.item(index):
+                                                                   self.base.offsets.item(index + 1)]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def update(self, mapping):
+        for key, values in mapping.items():
+            self[key] = values
+
+    def clear(self):
+        self.__init__(dtype=self.dtype)
+
+    def copy(self):
+        table = type(self).__new__(type(self))
+        table.__dict__ = {name: value.copy() if isinstance(value, np.ndarray) else value
+                          for name, value in self.__dict__.items()}
+        return table
+
+    def to_dict(self):
+        """Plain {key: ndarray} copy of the table"""
+        return {key: values.copy() for key, values in self.items()}
+
+    def nbytes(self):
+        """Heap bytes used by the in-memory part of the table"""
+        return (self._keys.nbytes + self._rows.nbytes + self.row_offsets.nbytes
+                + self.row_lengths.nbytes + self.values.nbytes)
+
+    # --- files -----------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path):
+        """Open a .qtb file; rows stay on disk until they are written"""
+        base = QTableFile(path)
+        if base.version != QTB_VERSION:
+            raise ValueError(f"{path} holds ActionQTable rows; open it with ActionQTable.load.")
+        return cls(base=base)
+
+    def save(self, path):
+        """Write the whole table as a .qtb file, atomically replacing path"""
+        occupied = self._rows >= 0
+        keys = self._keys[occupied]
+        rows = self._rows[occupied]
+        lengths = self.row_lengths[rows].astype(np.int64)
+        values = self.values[_ranges(self.row_offsets[rows], lengths)]
+        if self.base is not None:
+            kept = self._base_rows()
+            base_lengths = np.diff(self.base.offsets.astype(np.int64))[kept]
+            keys = np.concatenate([keys, self.base.keys[kept]])
+            values = np.concatenate([values, self.base.values[_ranges(self.base.offsets[kept], base_lengths)]])
+            lengths = np.concatenate([lengths, base_lengths])
+
+        order = np.argsort(keys, kind="stable")
+        starts = np.cumsum(lengths) - lengths
+        values = values[_ranges(starts[order], lengths[order])].astype(np.float32)
+        offsets = np.concatenate([[0], np.cumsum(lengths[order])]).astype(np.uint64)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(QTB_HEADER.pack(QTB_MAGIC, QTB_VERSION, len(keys), len(values), 0))
+            keys[order].astype(np.uint64).tofile(f)
+            offsets.tofile(f)
+            values.tofile(f)
+        os.replace(temp_path, path)  # readers mapping the old file keep their copy
+
+
+class ActionQTable(QTable):
+    """QTable whose rows are indexed by ActionSpace action and keep only the written actions.
+
+    Logically every row holds row_width values, one per action, like a dense fixed-width
+    row. Physically a row stores its fill value plus the (action, value) pairs written
+    since it was created, sorted by action, so a state costs about 60 bytes of index and
+    bookkeeping plus 6 bytes per action actually written, whatever row_width is. Reads
+    that need a whole row (get, values_many, items) build it densely; max and max_many
+    take the legal-action mask of the state so actions that are not legal there never
+    count, and argmax picks with ActionSpace.masked_argmax.
+
+    Rows grow inside a capacity reserved in the pool and move to its end when full; the
+    pool is compacted once half of it is left behind by moved rows.
+    """
+
+    def __init__(self, row_width, capacity=1024, dtype=np.float32, base=None):
+        super().__init__(capacity, dtype, base)
+        self.row_width = row_width
+        self.row_capacities = np.zeros(capacity, dtype=np.int32)
+        self.row_fills = np.zeros(capacity, dtype=self.dtype)
+        self.actions = np.zeros(len(self.values), dtype=np.uint16)
+        self._moved = 0  # pool entries left behind by rows that moved
+
+    # --- rows ------------------------------------------------------------------------
+
+    def _reserve(self, length):
+        if self._used + length > len(self.values) and self._moved * 2 >= self._used:
+            self._compact()
+        while self._used + length > len(self.values):
+            self.values = np.concatenate([self.values, np.zeros_like(self.values)])
+            self.actions = np.concatenate([self.actions, np.zeros_like(self.actions)])
+        offset = self._used
+        self._used += length
+        return offset
+
+    def _compact(self):
+        """Pack every row's written entries back to back, dropping the space rows moved out of"""
+        rows = np.arange(self._size)
+        capacities = np.maximum(self.row_lengths[:self._size], 1).astype(np.int64)
+        old = _ranges(self.row_offsets[rows], self.row_lengths[rows])
+        offsets = np.cumsum(capacities) - capacities
+        new = _ranges(offsets, self.row_lengths[rows])
+        self.values[new] = self.values[old]  # fancy indexing copies the source first, so overlaps are safe
+        self.actions[new] = self.actions[old]
+        self.row_offsets[rows] = offsets
+        self.row_capacities[rows] = capacities
+        self._used = int(capacities.sum())
+        self._moved = 0
+
+    def _new_row(self, slot, key, actions, values, fill):
+        row = self._size
+        if row == len(self.row_offsets):
+            for name in ("row_offsets", "row_lengths", "row_capacities", "row_fills"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        capacity = max(len(actions), 1)
+        self.row_offsets[row] = offset = self._reserve(capacity)
+        self.row_lengths[row] = len(actions)
+        self.row_capacities[row] = capacity
+        self.row_fills[row] = fill
+        self.actions[offset:offset + len(actions)] = actions
+        self.values[offset:offset + len(actions)] = values
+        self._size += 1
+        self._keys[slot] = key
+        self._rows[slot] = row
+        if self._size * 2 > self._slots:
+            self._grow_index()
+        return row
+
+    def _own_row(self, key):
+        key &= _MASK64
+        slot, row = self._find(key)
+        if row < 0 and self.base is not None:
+            index = self.base.find(key)
+            if index >= 0:
+                self._shadowed += 1
+                row = self._new_row(slot, key, *self.base.row(index))
+        return row
+
+    def create(self, key, fill=0.0):
+        """Row id of key, creating an unwritten row (every action at fill) when missing"""
+        row = self._own_row(key)
+        if row < 0:
+            key &= _MASK64
+            row = self._new_row(self._find(key)[0], key, (), (), fill)
+        return row
+
+    def _entries(self, row):
+        start = self.row_offsets.item(row)
+        end = start + self.row_lengths.item(row)
+        return self.actions[start:end], self.values[start:end], self.row_fills.item(row)
+
+    def _stored(self, key):
+        """(actions, values, fill) of key's row, in memory or in base, or None"""
+        row = self._row(key)
+        if row >= 0:
+            return self._entries(row)
+        if self.base is not None:
+            index = self.base.find(key & _MASK64)
+            if index >= 0:
+                return self.base.row(index)
+        return None
+
+    def _dense(self, stored):
+        actions, values, fill = stored
+        row = np.full(self.row_width, fill, dtype=self.dtype)
+        row[actions] = values
+        return row
+
+    def _slot(self, row, action, insert):
+        """Pool position of action in row; with insert, a missing action is added at the row's fill"""
+        start = self.row_offsets.item(row)
+        length = self.row_lengths.item(row)
+        i = int(np.searchsorted(self.actions[start:start + length], action))
+        if i < length and self.actions.item(start + i) == action:
+            return start + i
+        if not insert:
+            return -1
+        if length == self.row_capacities.item(row):  # full: move the row to the end of the pool
+            capacity = 2 * length
+            offset = self._reserve(capacity)
+            start = self.row_offsets.item(row)  # a compaction may have moved it
+            self.values[offset:offset + length] = self.values[start:start + length]
+            self.actions[offset:offset + length] = self.actions[start:start + length]
+            self._moved += self.row_capacities.item(row)
+            self.row_offsets[row] = start = offset
+            self.row_capacities[row] = capacity
+        position = start + i
+        self.values[position + 1:start + length + 1] = self.values[position:start + length]
+        self.actions[position + 1:start + length + 1] = self.actions[position:start + length]
+        self.values[position] = self.row_fills[row]
+        self.actions[position] = action
+        self.row_lengths[row] = length + 1
+        return position
+
+    # --- Q-value operations ----------------------------------------------------------
+
+    def get_or_create(self, key, length=None, fill=0.0):
+        """Dense copy of key's row, creating the row at fill when missing"""
+        return self._dense(self._entries(self.create(key, fill)))
+
+    def get(self, key, default=None):
+        """Dense copy of key's row; write through update_value"""
+        stored = self._stored(key)
+        return default if stored is None else self._dense(stored)
+
+    def value(self, key, action):
+        stored = self._stored(key)
+        if stored is None:
+            raise KeyError(key)
+        actions, values, fill = stored
+        i = int(np.searchsorted(actions, action))
+        return float(values[i]) if i < len(actions) and actions[i] == action else float(fill)
+
+    def update_value(self, key, action, value):
+        row = self._own_row(key)
+        if row < 0:
+            raise KeyError(key)
+        if not 0 <= action < self.row_width:
+            raise IndexError(f"action {action} out of range for rows of {self.row_width}")
+        position = self._slot(row, action, True)  # may move the pool
+        self.values[position] = value
+
+    def argmax(self, key, mask=None):
+        """Best legal action of key's row by masked_argmax; -1 when no action is legal"""
+        mask = np.ones(self.row_width, dtype=bool) if mask is None else mask
+        return int(masked_argmax(self.get(key, np.zeros(self.row_width, dtype=self.dtype)), mask))
+
+    def max(self, key, default=0.0, mask=None):
+        """Best value among the actions set in mask (all actions when None); default for a
+        missing row or when no action is legal"""
+        stored = self._stored(key)
+        if stored is None:
+            return default
+        actions, values, fill = stored
+        legal_count = self.row_width if mask is None else int(np.count_nonzero(mask))
+        if legal_count == 0:
+            return default
+        if mask is not None:
+            values = values[mask[actions]]
+        best = float(values.max()) if len(values) else -np.inf
+        return best if len(values) == legal_count else max(best, float(fill))  # unwritten legal actions sit at fill
+
+    # --- batched operations ----------------------------------------------------------
+
+    def get_or_create_rows(self, keys, lengths=None, fill=0.0):
+        """Row ids for an array of keys, creating missing rows at fill"""
+        rows = self._find_rows(keys)
+        for i in np.flatnonzero(rows < 0).tolist():
+            rows[i] = self.create(int(keys[i]), fill)
+        return rows
+
+    def _positions(self, rows, actions):
+        """Pool positions of (row id, action) pairs, -1 where the action was never written"""
+        start = self.row_offsets[rows]
+        end = start + self.row_lengths[rows]
+        low, high = start.copy(), end.copy()
+        active = low < high
+        while active.any():  # binary search inside every row at once
+            middle = (low + high) // 2
+            smaller = self.actions[np.where(active, middle, 0)] < actions
+            low = np.where(active & smaller, middle + 1, low)
+            high = np.where(active & ~smaller, middle, high)
+            active = low < high
+        found = low < end
+        found[found] = self.actions[low[found]] == actions[found]
+        return np.where(found, low, -1)
+
+    def values_at(self, rows, actions):
+        """Q-values of (row id, action) pairs"""
+        positions = self._positions(rows, actions)
+        return np.where(positions >= 0, self.values[np.maximum(positions, 0)], self.row_fills[rows])
+
+    def add_at(self, rows, actions, deltas):
+        """Add deltas to the Q-values of (row id, action) pairs; repeated pairs accumulate"""
+        positions = self._positions(rows, actions)
+        for i in np.flatnonzero(positions < 0).tolist():
+            self._slot(int(rows[i]), int(actions[i]), True)
+        if (positions < 0).any():  # inserting shifts entries, so look everything up again
+            positions = self._positions(rows, actions)
+        np.add.at(self.values, positions, np.asarray(deltas, dtype=self.dtype))
+
+    def max_many(self, keys, default=0.0, masks=None):
+        """max() for an array of keys, with one legal-action mask per key (or None)"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        rows = self._find_rows(keys)
+        result = np.full(len(keys), default, dtype=np.float64)
+        found = np.flatnonzero(rows >= 0)
+        if found.size:
+            found_rows = rows[found]
+            lengths = self.row_lengths[found_rows].astype(np.int64)
+            entries = _ranges(self.row_offsets[found_rows], lengths)
+            owners = np.repeat(np.arange(found.size), lengths)
+            if masks is None:
+                legal = np.ones(len(entries), dtype=bool)
+                legal_counts = np.full(found.size, self.row_width)
+            else:
+                legal = masks[found[owners], self.actions[entries]]
+                legal_counts = masks[found].sum(axis=1)
+            best = np.full(found.size, -np.inf)
+            np.maximum.at(best, owners[legal], self.values[entries[legal]])
+            written = np.bincount(owners[legal], minlength=found.size)
+            best = np.where(written < legal_counts, np.maximum(best, self.row_fills[found_rows]), best)
+            result[found] = np.where(legal_counts > 0, best, default)
+        if self.base is not None:
+            for i in np.flatnonzero(rows < 0).tolist():
+                result[i] = self.max(int(keys[i]), default, None if masks is None else masks[i])
+        return result
+
+    def values_many(self, keys, default=0.0):
+        """(len(keys), row_width) matrix of the rows of many states, default for missing keys"""
+        keys = np.asarray(keys, dtype=np.uint64)
+        rows = self._find_rows(keys)
+        result = np.full((len(keys), self.row_width), default, dtype=self.dtype)
+        found = np.flatnonzero(rows >= 0)
+        if found.size:
+            lengths = self.row_lengths[rows[found]].astype(np.int64)
+            entries = _ranges(self.row_offsets[rows[found]], lengths)
+            result[found] = self.row_fills[rows[found]][:, None]
+            result[np.repeat(found, lengths), self.actions[entries]] = self.values[entries]
+        if self.base is not None:
+            for i in np.flatnonzero(rows < 0).tolist():
+                stored = self._stored(int(keys[i]))
+                if stored is not None:
+                    result[i] = self._dense(stored)
+        return result
+
+    # --- mapping interface -----------------------------------------------------------
+
+    def __contains__(self, key):
+        return self._stored(key) is not None
+
+    def __getitem__(self, key):
+        stored = self._stored(key)
+        if stored is None:
+            raise KeyError(key)
+        return self._dense(stored)
+
+    def __setitem__(self, key, values):
+        """Store a dense row; its most common value becomes the fill and only the rest is kept"""
+        values = np.asarray(values, dtype=self.dtype)
+        if len(values) != self.row_width:
+            raise ValueError(f"Q-table rows hold {self.row_width} values, got {len(values)}.")
+        distinct, counts = np.unique(values, return_counts=True)
+        fill = distinct[np.argmax(counts)]
+        actions = np.flatnonzero(values != fill)
+        key &= _MASK64
+        slot, row = self._find(key)
+        if row >= 0:  # replace the row's entries, reusing its space when they fit
+            if len(actions) > self.row_capacities.item(row):
+                offset = self._reserve(len(actions))
+                self._moved += self.row_capacities.item(row)
+                self.row_offsets[row] = offset
+                self.row_capacities[row] = len(actions)
+            start = self.row_offsets.item(row)
+            self.actions[start:start + len(actions)] = actions
+            self.values[start:start + len(actions)] = values[actions]
+            self.row_lengths[row] = len(actions)
+            self.row_fills[row] = fill
+            return
+        if self.base is not None and self.base.find(key) >= 0:
+            self._shadowed += 1
+        self._new_row(slot, key, actions, values[actions], fill)
+
+    def items(self, include_base=True):
+        """(key, dense row) pairs; include_base=False lists only the rows held in memory"""
+        occupied = np.flatnonzero(self._rows >= 0)
+        for key, row in zip(self._keys[occupied].tolist(), self._rows[occupied].tolist()):
+            yield key, self._dense(self._entries(row))
+        if include_base and self.base is not None:
+            for index in self._base_rows().tolist():
+                yield self.base.keys.item(index), self._dense(self.base.row(index))
+
+    def clear(self):
+        self.__init__(self.row_width, dtype=self.dtype)
+
+    def nbytes(self):
+        return (super().nbytes() + self.row_capacities.nbytes + self.row_fills.nbytes + self.actions.nbytes)
+
+    # --- files -----------------------------------------------------------------------
+
+    @classmethod
+    def load(cls, path, row_width):
+        """Open a .qtb file of rows row_width actions wide; rows stay on disk until written.
+
+        A version 1 file of fixed-width rows (from before ActionQTable) is read into memory
+        row by row instead.
+        """
+        base = QTableFile(path)
+        if base.row_width != row_width:
+            raise ValueError(f"{path} holds rows of {base.row_width or 'varying'} values, expected {row_width}.")
+        if base.version == QTB_ACTION_VERSION:
+            return cls(row_width, base=base)
+        table = cls(row_width, capacity=max(len(base), 1))
+        for index in range(len(base)):
+            table[base.keys.item(index)] = base.values[base.offsets.item(index):base.offsets.item(index + 1)]
+        return table
+
+    def save(self, path):
+        occupied = self._rows >= 0
+        keys = self._keys[occupied]
+        rows = self._rows[occupied]
+        lengths = self.row_lengths[rows].astype(np.int64)
+        entries = _ranges(self.row_offsets[rows], lengths)
+        fills, values, actions = self.row_fills[rows], self.values[entries], self.actions[entries]
+        if self.base is not None:
+            kept = self._base_rows()
+            base_lengths = np.diff(self.base.offsets.astype(np.int64))[kept]
+            base_entries = _ranges(self.base.offsets[kept], base_lengths)
+            keys = np.concatenate([keys, self.base.keys[kept]])
+            fills = np.concatenate([fills, self.base.fills[kept]])
+            values = np.concatenate([values, self.base.values[base_entries]])
+            actions = np.concatenate([actions, self.base.actions[base_entries]])
+            lengths = np.concatenate([lengths, base_lengths])
+
+        order = np.argsort(keys, kind="stable")
+        starts = np.cumsum(lengths) - lengths
+        entries = _ranges(starts[order], lengths[order])
+        offsets = np.concatenate([[0], np.cumsum(lengths[order])]).astype(np.uint64)
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(QTB_HEADER.pack(QTB_MAGIC, QTB_ACTION_VERSION, len(keys), len(entries), self.row_width))
+            keys[order].astype(np.uint64).tofile(f)
+            offsets.tofile(f)
+            fills[order].astype(np.float32).tofile(f)
+            values[entries].astype(np.float32).tofile(f)
+            actions[entries].astype(np.uint16).tofile(f)
+        os.replace(temp_path, path)
+
+
+def load_json(path, row_width=None):
+    """QTable from the JSON written by QLearningAgent.save_q_table ({str(state): [q_values]}).
+
+    Rows are read into an ActionQTable of row_width actions when row_width is given.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        loaded_q_table = json.load(f)
+    capacity = max(len(loaded_q_table), 1)
+    table = ActionQTable(row_width, capacity) if row_width else QTable(capacity)
+    for state, q_values in loaded_q_table.items():
+        table[int(state)] = q_values
+    return table
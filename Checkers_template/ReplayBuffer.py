@@ -0,0 +1,99 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    """Ring buffer of Q-learning transitions in preallocated NumPy arrays.
+
+    A transition is (state key, action index, number of actions in the state, reward,
+    next state key, done) plus, optionally, the legal-action mask of the next state, kept
+    bit-packed so the bootstrap max ignores actions that are not legal there. Keys are
+    the canonical keys used by the Q-table and actions are canonical ActionSpace actions,
+    so the batch learner can address Q-rows directly.
+    Sampling is uniform or proportional to priority ** alpha, where new transitions get
+    the highest priority seen so far and update_priorities sets |TD error| + epsilon.
+    """
+
+    def __init__(self, capacity=100000, alpha=0.6, epsilon=1e-3, seed=None):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.states = np.zeros(capacity, dtype=np.uint64)
+        self.actions = np.zeros(capacity, dtype=np.int32)
+        self.num_actions = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.uint64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float64)
+        self.next_masks = None  # packed (capacity, bytes) masks once a transition comes with one
+        self.max_priority = 1.0
+        self.position = 0  # next slot to write
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, num_actions, reward, next_state, done, next_mask=None):
+        i = self.position
+        if next_mask is not None:
+            packed = np.packbits(next_mask)
+            if self.next_masks is None:
+                self.next_masks = np.full((self.capacity, len(packed)), 0xFF, dtype=np.uint8)
+            self.next_masks[i] = packed
+        elif self.next_masks is not None:
+            self.next_masks[i] = 0xFF  # every action counts
+        self.states[i] = state
+        self.actions[i] = action
+        self.num_actions[i] = num_actions
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.priorities[i] = self.max_priority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size, prioritized=False, beta=0.4):
+        """(indices, importance weights) of a batch; weights are all 1 for uniform sampling"""
+        if prioritized:
+            scaled = self.priorities[:self.size] ** self.alpha
+            cumulative = np.cumsum(scaled)
+            indices = np.searchsorted(cumulative, self.rng.random(batch_size) * cumulative[-1], side="right")
+            indices = np.minimum(indices, self.size - 1)
+            probabilities = scaled[indices] / cumulative[-1]
+            weights = (self.size * probabilities) ** -beta
+            return indices, weights / weights.max()
+        return self.rng.integers(0, self.size, size=batch_size), np.ones(batch_size)
+
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.priorities[indices] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+
+def td_update(q_table, buffer, indices, learning_rate, discount_factor, weights=None, fill=-1.0):
+    """One vectorized Q-learning step over the buffered transitions at indices; returns the TD errors.
+
+    q_table is an ActionQTable. Missing state rows are created with fill (as
+    QLearningAgent.learn does), the target is reward + discount_factor * the best Q-value
+    among the next state's legal actions unless the transition ended the game, and a
+    (state, action) pair sampled several times in a batch gets the mean of its updates.
+    """
+    states = buffer.states[indices]
+    actions = buffer.actions[indices].astype(np.int64)
+    rows = q_table.get_or_create_rows(states, fill=fill)
+    masks = None
+    if buffer.next_masks is not None:
+        masks = np.unpackbits(buffer.next_masks[indices], axis=1, count=q_table.row_width).astype(bool)
+    next_values = q_table.max_many(buffer.next_states[indices], masks=masks)
+    targets = buffer.rewards[indices] + discount_factor * np.where(buffer.dones[indices], 0.0, next_values)
+    valid = actions < q_table.row_width
+    td_errors = np.zeros(len(indices))
+    td_errors[valid] = targets[valid] - q_table.values_at(rows[valid], actions[valid])
+    steps = learning_rate * td_errors[valid]
+    if weights is not None:
+        steps = steps * weights[valid]
+    pairs, first, inverse, counts = np.unique(rows[valid] * q_table.row_width + actions[valid], return_index=True,
+                                              return_inverse=True, return_counts=True)
+    mean_steps = np.bincount(inverse, weights=steps, minlength=len(pairs)) / counts
+    q_table.add_at(rows[valid][first], actions[valid][first], mean_steps)
+    return td_errors
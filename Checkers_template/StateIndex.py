@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class StateIndex:
+    """Approximate nearest-board search over stored boards of one size, used by TaskSimilarity.
+
+    Boards are kept as rows of int8 square values and hashed into ``num_tables`` tables,
+    each keyed by the contents of its own fixed random sample of ``sample_size`` dark
+    squares. Two boards land in the same bucket of a table when they agree on all of its
+    sampled squares, so a board differing from the query in ``d`` squares is found with
+    probability ``1 - (1 - C(s - d, k) / C(s, k)) ** num_tables`` for ``s`` dark squares
+    and ``k = sample_size``. Only the candidates from the query's buckets are scored, and
+    the best of them is returned. Buckets keep only their ``bucket_size`` most recent boards,
+    which bounds the work per lookup no matter how many boards are stored.
+
+    ``num_tables`` is the recall knob (more tables, more recall, slower lookups);
+    ``num_tables=0`` scores every stored board exactly.
+    """
+
+    def __init__(self, num_squares, num_tables=16, sample_size=10, bucket_size=64, capacity=1024, seed=0):
+        self.num_squares = num_squares
+        size = int(round(np.sqrt(num_squares)))
+        dark = np.array([square for square in range(num_squares) if sum(divmod(square, size)) % 2 == 0])
+        rng = np.random.default_rng(seed)
+        sample_size = min(sample_size, len(dark))
+        self.samples = [np.sort(rng.choice(dark, sample_size, replace=False)) for _ in range(num_tables)]
+        self.tables = [{} for _ in self.samples]
+        self.bucket_size = bucket_size
+        self.states = np.zeros((capacity, num_squares), dtype=np.int8)
+        self.hashes = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, state_hash, squares):
+        """Store a board (flat int8 squares) under its hash"""
+        row = len(self.hashes)
+        if row == len(self.states):
+            self.states = np.concatenate([self.states, np.zeros_like(self.states)])
+        self.states[row] = squares
+        self.hashes.append(state_hash)
+        for sample, table in zip(self.samples, self.tables):
+            bucket = table.setdefault(squares[sample].tobytes(), [])
+            bucket.append(row)
+            if len(bucket) >= 2 * self.bucket_size:
+                del bucket[:-self.bucket_size]
+
+    def candidates(self, squares):
+        if not self.tables:
+            return np.arange(len(self.hashes))
+        rows = []
+        for sample, table in zip(self.samples, self.tables):
+            rows.extend(table.get(squares[sample].tobytes(), ())[-self.bucket_size:])
+        return np.array(rows, dtype=np.int64)
+
+    def nearest(self, squares, threshold):
+        """Return (state_hash, similarity) of the most similar candidate above threshold, or None.
+
+        Similarity matches TaskSimilarity.compute_state_similarity: the weighted share of
+        squares equal to the query, kings weighing 1.5, men 1.2 and empty squares 1.0.
+        """
+        rows = self.candidates(squares)
+        if rows.size == 0:
+            return None
+        weights = np.where(squares == 0, 1.0, np.where((squares == 3) | (squares == 4), 1.5, 1.2))
+        similarity = (self.states[rows] == squares) @ weights / weights.sum()
+        best = similarity.max()
+        if best <= threshold:
+            return None
+        return self.hashes[rows[similarity == best].min()], float(best)  # ties go to the oldest board
@@ -0,0 +1,237 @@
+import itertools
+import os
+import struct
+import sys
+import numpy as np
+from math import comb
+from checkers_env import make_env
+
+TB_WIN = 32000  # a win in d plies is stored as TB_WIN - d, a loss as -(TB_WIN - d), a draw as 0
+TB_MAGIC = b"CTB1"
+TB_HEADER = struct.Struct("<4sIII")  # magic, version, board_size, max_pieces
+TB_VERSION = 1
+
+
+def tablebase_path(board_size, max_pieces=3):
+    return f"tablebase_{board_size}x{board_size}_{max_pieces}.ctb"
+
+
+class TablebaseIndex:
+    """Dense numbering of positions with up to max_pieces pieces on the dark squares.
+
+    A position is (board, side to move, must_jump). Its board number is an offset for the
+    piece count k, plus the combinatorial rank of the occupied dark squares times 4**k,
+    plus the piece values in square order as a base-4 number.
+    """
+
+    def __init__(self, board_size, max_pieces):
+        self.board_size = board_size
+        self.max_pieces = max_pieces
+        self.num_dark = board_size * board_size // 2  # dark square of (row, col) is (row * size + col) // 2
+        self.offsets = [0]
+        for pieces in range(max_pieces + 1):
+            self.offsets.append(self.offsets[-1] + comb(self.num_dark, pieces) * 4 ** pieces)
+        self.num_boards = self.offsets[-1]
+        self.num_positions = self.num_boards * 4
+
+    def board_index(self, board):
+        """Number of a board with at most max_pieces pieces, or -1"""
+        flat = board.reshape(-1)
+        squares = np.flatnonzero(flat)
+        pieces = len(squares)
+        if pieces > self.max_pieces:
+            return -1
+        rank = 0
+        code = 0
+        for i, square in enumerate(squares.tolist()):
+            rank += comb(square // 2, i + 1)
+            code += (int(flat[square]) - 1) << (2 * i)
+        return self.offsets[pieces] + (rank << (2 * pieces)) + code
+
+    def position_index(self, board, player, must_jump):
+        board_index = self.board_index(board)
+        if board_index < 0:
+            return -1
+        return board_index * 4 + (player - 1) * 2 + int(bool(must_jump))
+
+    def boards(self):
+        """Yield every board in the index"""
+        size = self.board_size
+        for pieces in range(self.max_pieces + 1):
+            for dark in itertools.combinations(range(self.num_dark), pieces):
+                squares = [2 * square + (square // (size // 2)) % 2 for square in dark]
+                for values in itertools.product((1, 2, 3, 4), repeat=pieces):
+                    board = np.zeros(size * size, dtype=int)
+                    board[squares] = values
+                    yield board.reshape(size, size)
+
+
+def _play(env, move, player):
+    """make_move plus the turn rule of env.step: returns (undo, whether the turn passed)"""
+    undo = env.make_move(move, player)
+    if abs(move[2] - move[0]) == 2:
+        return undo, not env.must_jump
+    return undo, not undo[5]  # a plain move made while a jump was required keeps the turn
+
+
+def _outcome(winner, mover):
+    """Score for mover of a decided game, one ply after the move"""
+    if winner == 0:
+        return 0
+    return TB_WIN - 1 if winner == mover else 1 - TB_WIN
+
+
+def _after_ply(scores):
+    """Scores seen one ply earlier: wins and losses are one ply further away"""
+    return scores - np.sign(scores)
+
+
+def generate_tablebase(board_size=6, max_pieces=3, path=None, engine="bitboard", verbose=True):
+    """Solve every position with up to max_pieces pieces under the env's rules and write the table.
+
+    Each position is scored for its side to move, before the winner check env.step makes when
+    the turn passes (that check belongs to the move leading into the position). Moves are
+    scored by retrograde value iteration over the move graph: a win takes the shortest
+    winning line, a loss the longest, and positions that never resolve are draws.
+    """
+    path = path or tablebase_path(board_size, max_pieces)
+    index = TablebaseIndex(board_size, max_pieces)
+    env = make_env(board_size=board_size, engine=engine)
+    sources, targets, kinds = [], [], []  # kind: 0 same mover, 1 turn passed, 2 decided (target holds the score)
+    no_moves = []
+
+    for count, board in enumerate(index.boards(), 1):
+        env.board = board
+        board_index = index.board_index(board)
+        for player in (1, 2):
+            moves = list(env.valid_moves(player))
+            for must_jump in (False, True):
+                node = board_index * 4 + (player - 1) * 2 + int(must_jump)
+                if not moves:
+                    no_moves.append(node)
+                    continue
+                for move in moves:
+                    env.must_jump = must_jump
+                    env.player = player
+                    undo, passed = _play(env, move, player)
+                    winner = env.game_winner() if passed else None
+                    sources.append(node)
+                    if winner is not None:
+                        targets.append(_outcome(winner, player))
+                        kinds.append(2)
+                    else:
+                        targets.append(index.position_index(env.board, 3 - player if passed else player,
+                                                            env.must_jump))
+                        kinds.append(1 if passed else 0)
+                    env.unmake_move(undo)
+        env.must_jump = False
+        if verbose and count % 20000 == 0:
+            print(f"📊 Move graph: {count}/{index.num_boards} boards")
+
+    sources = np.array(sources, dtype=np.int64)
+    targets = np.array(targets, dtype=np.int64)
+    kinds = np.array(kinds, dtype=np.int8)
+    decided = kinds == 2
+    links = np.where(decided, 0, targets)
+    starts = np.flatnonzero(np.r_[True, sources[1:] != sources[:-1]])  # edges are grouped by source
+    nodes = sources[starts]
+
+    scores = np.zeros(index.num_positions, dtype=np.int32)
+    scores[no_moves] = -TB_WIN
+    iterations = 0
+    while True:
+        edge_scores = np.where(decided, targets, _after_ply(np.where(kinds == 1, -scores[links], scores[links])))
+        updated = scores.copy()
+        updated[nodes] = np.maximum.reduceat(edge_scores, starts)
+        iterations += 1
+        if np.array_equal(updated, scores):
+            break
+        scores = updated
+    if verbose:
+        print(f"✅ Solved {index.num_positions} positions in {iterations} iterations: "
+              f"{np.sum(scores > 0)} wins, {np.sum(scores < 0)} losses, {np.sum(scores == 0)} draws")
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(TB_HEADER.pack(TB_MAGIC, TB_VERSION, board_size, max_pieces))
+        scores.astype(np.int16).tofile(f)
+    os.replace(temp_path, path)
+    return path
+
+
+class Tablebase:
+    """Memory-mapped endgame table written by generate_tablebase.
+
+    probe() looks a position up in O(1); best_move() picks the move with the best outcome.
+    Scores are for the side to move: TB_WIN - d wins in d plies, -(TB_WIN - d) loses in d
+    plies, 0 is a draw.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, board_size, max_pieces = TB_HEADER.unpack(f.read(TB_HEADER.size))
+        if magic != TB_MAGIC or version != TB_VERSION:
+            raise ValueError(f"{path} is not a version {TB_VERSION} tablebase file.")
+        self.index = TablebaseIndex(board_size, max_pieces)
+        self.board_size = board_size
+        self.max_pieces = max_pieces
+        self.scores = np.memmap(path, dtype=np.int16, mode="r", offset=TB_HEADER.size,
+                                shape=(self.index.num_positions,)).view(np.ndarray)
+
+    def __reduce__(self):
+        return Tablebase, (self.path,)
+
+    def covers(self, env):
+        counts = env.piece_counts
+        return env.board_size == self.board_size and counts[0] >= env.board.size - self.max_pieces
+
+    def probe(self, env, player=None):
+        """Score of the env's position for player (default env.player) to move, or None if not covered"""
+        if not self.covers(env):
+            return None
+        player = env.player if player is None else player
+        return int(self.scores[self.index.position_index(env.board, player, env.must_jump)])
+
+    def move_scores(self, env, player):
+        """Score for player of each of its valid moves in a covered position"""
+        scores = []
+        for move in env.valid_moves(player):
+            undo, passed = _play(env, move, player)
+            winner = env.game_winner() if passed else None
+            if winner is not None:
+                scores.append(_outcome(winner, player))
+            else:
+                score = int(self.scores[self.index.position_index(env.board, 3 - player if passed else player,
+                                                                  env.must_jump)])
+                scores.append(int(_after_ply(np.int32(-score if passed else score))))
+            env.unmake_move(undo)
+        return scores
+
+    def best_move(self, env, player):
+        """Move with the best table outcome for player, or None if the position is not covered"""
+        if not self.covers(env):
+            return None
+        moves = env.valid_moves(player)
+        if not moves:
+            return None
+        saved_player, saved_has_moved = env.player, env.has_moved
+        env.player = player
+        try:
+            scores = self.move_scores(env, player)
+        finally:
+            env.player = saved_player
+            env.has_moved = saved_has_moved
+        return moves[int(np.argmax(scores))]
+
+
+def load_tablebase(board_size, max_pieces=3):
+    """Tablebase for the board size from the working directory, or None if it was not generated"""
+    path = tablebase_path(board_size, max_pieces)
+    return Tablebase(path) if os.path.exists(path) else None
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    pieces = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"✅ Tablebase written to {generate_tablebase(size, pieces)}")
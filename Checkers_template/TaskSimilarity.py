@@ -1,26 +1,27 @@
 import numpy as np
 from collections import defaultdict
+from Instrumentation import metrics
+from StateIndex import StateIndex
+from checkers_env import flip_board, flip_move, hash_board
 
 class TaskSimilarity:
-    def __init__(self):
+    def __init__(self, num_tables=16):
         self.state_memory = {}
         self.similarity_threshold = 0.85  # Dynamically adjustable similarity threshold
-        self.zobrist_table = np.random.randint(1, 2**32, size=(8, 8, 5), dtype=np.uint32)  # Zobrist hash table
+        self.num_tables = num_tables  # Recall knob of the similarity index, 0 for an exact scan
+        self.indexes = {}  # StateIndex per board size
 
     def zobrist_hash(self, state):
-        """ Compute Zobrist hash value """
-        hash_value = 0
-        for i in range(state.shape[0]):
-            for j in range(state.shape[1]):
-                piece = state[i, j]
-                if piece != 0:  # Only compute hash for non-empty squares
-                    hash_value ^= self.zobrist_table[i, j, piece]
-        return hash_value
-
-    def store_state(self, state, action):
-        """ Store the board state and its best action """
-        state_hash = self.zobrist_hash(state)
-        state_bytes = state.tobytes()
+        """ Compute Zobrist hash value (callers with an env should pass env.canonical_key instead) """
+        return hash_board(state)
+
+    def store_state(self, state, action, state_hash=None, flipped=False):
+        """ Store the board state and its best action (flipped: store them seen from the other side) """
+        if flipped:
+            state, action = flip_board(state), flip_move(action, len(state))
+        if state_hash is None:
+            state_hash = self.zobrist_hash(state)
+        state_bytes = state.astype(np.int8).tobytes()  # One byte per square
 
         if state_hash not in self.state_memory:
             self.state_memory[state_hash] = {
@@ -28,23 +29,77 @@ class TaskSimilarity:
                 'count': 1,
                 'state': state_bytes
             }
+            self.index_state(state_hash, state_bytes)
         else:
             self.state_memory[state_hash]['count'] += 1
         self.state_memory[state_hash]['actions'][tuple(action)] += 1
 
-    def find_similar_state(self, state):
-        """ Find if there is a similar board state """
-        state_bytes = state.tobytes()
-        state_hash = self.zobrist_hash(state)
+    @metrics.timed("similarity.lookup")
+    def find_similar_state(self, state, state_hash=None, flipped=False):
+        """ Find if there is a similar board state (flipped: compare state seen from the other side) """
+        if state_hash is None:
+            state_hash = self.zobrist_hash(flip_board(state) if flipped else state)
 
         if state_hash in self.state_memory:
+            metrics.count("similarity.exact_hits")
             return state_hash
+        if flipped:  # only the scan needs the flipped board
+            state = flip_board(state)
 
-        for stored_hash, stored_data in self.state_memory.items():
-            similarity = self.compute_state_similarity(state_bytes, stored_data['state'])
-            if similarity > self.similarity_threshold:
-                return stored_hash
-        return None
+        index = self.indexes.get(state.size)
+        if index is None:
+            return None
+        match = index.nearest(state.reshape(-1).astype(np.int8), self.similarity_threshold)
+        metrics.count("similarity.near_hits" if match is not None else "similarity.misses")
+        return match[0] if match is not None else None
+
+    def index_state(self, state_hash, state_bytes):
+        """ Add a stored board to the nearest-neighbour index for its size """
+        squares = np.frombuffer(state_bytes, dtype=np.int8)
+        index = self.indexes.get(squares.size)
+        if index is None:
+            index = self.indexes[squares.size] = StateIndex(squares.size, self.num_tables)
+        index.add(state_hash, squares)
+
+    def load_state_memory(self, state_memory):
+        """ Replace state_memory and rebuild the index over it """
+        self.state_memory = state_memory
+        self.indexes = {}
+        for state_hash, data in state_memory.items():
+            self.index_state(state_hash, data['state'])
+
+    def state_memory_delta(self, baseline):
+        """Counts added to state_memory since a snapshot taken with snapshot_state_memory"""
+        delta = {}
+        for state_hash, data in self.state_memory.items():
+            base = baseline.get(state_hash)
+            if base is None:
+                delta[state_hash] = data
+                continue
+            if data['count'] == base['count']:
+                continue
+            actions = defaultdict(int)
+            for action, count in data['actions'].items():
+                if count > base['actions'].get(action, 0):
+                    actions[action] = count - base['actions'].get(action, 0)
+            delta[state_hash] = {'actions': actions, 'count': data['count'] - base['count'], 'state': data['state']}
+        return delta
+
+    def snapshot_state_memory(self):
+        """Copy of state_memory that later updates do not touch"""
+        return {state_hash: {'actions': defaultdict(int, data['actions']), 'count': data['count'], 'state': data['state']}
+                for state_hash, data in self.state_memory.items()}
+
+    def merge_state_memory(self, delta):
+        """Add the counts of a state_memory delta (from state_memory_delta) to this memory"""
+        for state_hash, data in delta.items():
+            if state_hash not in self.state_memory:
+                self.state_memory[state_hash] = {'actions': defaultdict(int), 'count': 0, 'state': data['state']}
+                self.index_state(state_hash, data['state'])
+            entry = self.state_memory[state_hash]
+            entry['count'] += data['count']
+            for action, count in data['actions'].items():
+                entry['actions'][action] += count
 
     def compute_state_similarity(self, state_bytes, stored_bytes):
         """ Compute state similarity, giving higher weight to king pieces """
@@ -60,13 +115,15 @@ class TaskSimilarity:
 
         return similarity
 
-    def get_best_action(self, state_hash, valid_moves):
+    def get_best_action(self, state_hash, valid_moves, flipped=False):
         """ Select the most frequently chosen best action from similar states """
         if state_hash in self.state_memory:
             action_counts = self.state_memory[state_hash]['actions']
-            best_action = max(action_counts, key=action_counts.get)  # Choose the most frequently selected action
-            if list(best_action) in valid_moves:
-                return list(best_action)
+            best_action = list(max(action_counts, key=action_counts.get))  # Choose the most frequently selected action
+            if flipped:
+                best_action = flip_move(best_action, int(np.sqrt(len(self.state_memory[state_hash]['state']))))
+            if best_action in valid_moves:
+                return best_action
         return None
 
     def adjust_similarity_threshold(self, win_rate):
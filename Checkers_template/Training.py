@@ -4,17 +4,161 @@ matplotlib.use('TkAgg')  # Use the TkAgg backend to prevent segmentation fault
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+from collections import deque
 import json
 import os
 
+FIELDS = ("episode", "win_rate", "reward", "exploration_rate")  # columns of the plot series
+STATS_VERSION = 1
+
+
+class DownsampledSeries:
+    """Bounded series for plotting: every point is the mean of stride consecutive entries.
+
+    When max_points points are stored, neighbouring points are averaged pairwise and the
+    stride doubles, so adding an entry is O(1) amortised and memory stays fixed however
+    long the run is.
+    """
+
+    def __init__(self, width, max_points=2000):
+        self.points = np.zeros((max_points + max_points % 2, width))
+        self.size = 0
+        self.stride = 1
+        self._sum = np.zeros(width)
+        self._pending = 0  # entries in _sum
+
+    def add(self, values):
+        self._sum += values
+        self._pending += 1
+        if self._pending == self.stride:
+            self.points[self.size] = self._sum / self.stride
+            self.size += 1
+            self._sum[:] = 0
+            self._pending = 0
+            if self.size == len(self.points):
+                half = self.size // 2
+                self.points[:half] = (self.points[0:self.size:2] + self.points[1:self.size:2]) / 2
+                self.size = half
+                self.stride *= 2
+
+    def array(self):
+        """(points, width) array of the series, including the partly filled last point"""
+        if self._pending:
+            return np.vstack([self.points[:self.size], self._sum / self._pending])
+        return self.points[:self.size].copy()
+
+    def state(self):
+        return {"stride": self.stride, "points": self.points[:self.size].tolist(), "sum": self._sum.tolist(),
+                "pending": self._pending}
+
+    def load_state(self, state):
+        points = np.asarray(state["points"], dtype=float).reshape(-1, self.points.shape[1])
+        self.size = len(points)
+        self.points[:self.size] = points
+        self.stride = state["stride"]
+        self._sum[:] = state["sum"]
+        self._pending = state["pending"]
+
 
 class ModelTracker:
-    def __init__(self, log_file="training_log.json"):
+    """Training log written as JSON lines, with running aggregates kept next to it.
+
+    log_training appends to a buffered file and updates the episode count, reward sum,
+    latest entry, a recent window (the last window entries) and DownsampledSeries for the
+    plots, all in O(1). The log rotates to log_file.1 .. log_file.<backups> once it
+    reaches max_bytes. The aggregates are saved to log_file.stats on flush, close,
+    save_summary and every sync_every entries; at start-up they are read back and only
+    log lines written after the last save are parsed, so opening a long run costs the same
+    as opening a short one. An old log without a stats file is scanned once, and a line
+    torn by an interrupted append is cut off the end of the log.
+    """
+
+    def __init__(self, log_file="training_log.json", max_bytes=64 << 20, backups=5, window=1000,
+                 plot_points=2000, sync_every=1000, buffer_size=1 << 16):
         self.log_file = log_file
-        self.logs = []
-        if os.path.exists(self.log_file):
-            with open(self.log_file, "r") as f:
-                self.logs = [json.loads(line) for line in f]
+        self.stats_file = f"{log_file}.stats"
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sync_every = sync_every
+        self.buffer_size = buffer_size
+        self.window = window
+        self.plot_points = plot_points
+        self._reset_aggregates()
+        self._load_stats()
+        self._file = open(self.log_file, "ab", buffering=buffer_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # --- aggregates ------------------------------------------------------------------
+
+    def _reset_aggregates(self):
+        self.total_episodes = 0
+        self.reward_sum = 0.0
+        self.last = None
+        self.recent = deque(maxlen=self.window)
+        self.series = DownsampledSeries(len(FIELDS), self.plot_points)
+        self._unsynced = 0
+
+    def _add(self, entry):
+        self.total_episodes += 1
+        self.reward_sum += entry["reward"]
+        self.last = entry
+        self.recent.append(entry)
+        self.series.add([entry[field] for field in FIELDS])
+
+    def _load_stats(self):
+        """Restore the aggregates, then parse whatever the log gained since they were saved"""
+        log_size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        self._log_bytes = log_size  # size of the log including buffered writes
+        offset = 0
+        stats = None
+        if os.path.exists(self.stats_file):
+            try:
+                with open(self.stats_file, "r") as f:
+                    stats = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                stats = None
+        if stats is not None and stats.get("version") == STATS_VERSION and stats["log_bytes"] <= log_size:
+            self.total_episodes = stats["total_episodes"]
+            self.reward_sum = stats["reward_sum"]
+            self.last = stats["last"]
+            self.recent.extend(stats["recent"])
+            self.series.load_state(stats["series"])
+            offset = stats["log_bytes"]
+        elif log_size:
+            print(f"⚠️ No usable {self.stats_file}, rebuilding it from {self.log_file}.")
+        if offset < log_size:
+            end = offset
+            with open(self.log_file, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # the tail of an append that was interrupted
+                    if line.strip():
+                        self._add(json.loads(line))
+                    end += len(line)
+            if end < log_size:
+                print(f"⚠️ {self.log_file} ends in a partly written line, truncating it.")
+                os.truncate(self.log_file, end)
+                self._log_bytes = end
+            self._unsynced = 1  # save the caught-up aggregates on the next flush
+
+    def _save_stats(self):
+        stats = {"version": STATS_VERSION, "log_bytes": self._log_bytes, "total_episodes": self.total_episodes,
+                 "reward_sum": self.reward_sum, "last": self.last, "recent": list(self.recent),
+                 "series": self.series.state()}
+        temp_path = f"{self.stats_file}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(stats, f)
+        os.replace(temp_path, self.stats_file)
+        self._unsynced = 0
+
+    # --- logging ---------------------------------------------------------------------
 
     def log_training(self, episode, reward, win_rate, exploration_rate):
         log_entry = {
@@ -23,51 +167,88 @@ class ModelTracker:
             "win_rate": win_rate,
             "exploration_rate": exploration_rate,
         }
-        self.logs.append(log_entry)
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        line = (json.dumps(log_entry) + "\n").encode("utf-8")
+        self._file.write(line)
+        self._log_bytes += len(line)
+        self._add(log_entry)
+        self._unsynced += 1
+        if self._log_bytes >= self.max_bytes:
+            self._rotate()
+        elif self._unsynced >= self.sync_every:
+            self.flush()
 
-    def plot_win_rate(self):
-        episodes = [log["episode"] for log in self.logs]
-        win_rates = [log["win_rate"] for log in self.logs]
-        plt.plot(episodes, win_rates, label="Win Rate")
+    def _rotate(self):
+        """Move the log to log_file.1, shifting older backups up and dropping the oldest"""
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.log_file}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.log_file}.{index + 1}")
+        if self.backups:
+            os.replace(self.log_file, f"{self.log_file}.1")
+        else:
+            os.remove(self.log_file)
+        self._file = open(self.log_file, "ab", buffering=self.buffer_size)
+        self._log_bytes = 0
+        self._save_stats()
+
+    def flush(self):
+        self._file.flush()
+        if self._unsynced:
+            self._save_stats()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def iter_logs(self):
+        """Stream every entry still on disk, oldest rotated file first"""
+        if not self._file.closed:
+            self._file.flush()
+        paths = [f"{self.log_file}.{index}" for index in range(self.backups, 0, -1)] + [self.log_file]
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    for line in f:
+                        if line.endswith("\n") and line.strip():  # a torn last line is skipped
+                            yield json.loads(line)
+
+    # --- reporting -------------------------------------------------------------------
+
+    def _plot_series(self, field, label, ylabel, title, color=None):
+        points = self.series.array()
+        plt.plot(points[:, 0], points[:, FIELDS.index(field)], label=label, color=color)
         plt.xlabel("Episodes")
-        plt.ylabel("Win Rate")
-        plt.title("Win Rate Over Time")
+        plt.ylabel(ylabel)
+        plt.title(title)
         plt.legend()
         plt.show()
 
+    def plot_win_rate(self):
+        self._plot_series("win_rate", "Win Rate", "Win Rate", "Win Rate Over Time")
+
     def plot_average_reward(self):
-        episodes = [log["episode"] for log in self.logs]
-        rewards = [log["reward"] for log in self.logs]
-        plt.plot(episodes, rewards, label="Average Reward", color="orange")
-        plt.xlabel("Episodes")
-        plt.ylabel("Average Reward")
-        plt.title("Average Reward Over Time")
-        plt.legend()
-        plt.show()
+        self._plot_series("reward", "Average Reward", "Average Reward", "Average Reward Over Time", "orange")
 
     def plot_exploration_rate(self):
-        episodes = [log["episode"] for log in self.logs]
-        exploration_rates = [log["exploration_rate"] for log in self.logs]
-        plt.plot(episodes, exploration_rates, label="Exploration Rate", color="green")
-        plt.xlabel("Episodes")
-        plt.ylabel("Exploration Rate")
-        plt.title("Exploration Rate Over Time")
-        plt.legend()
-        plt.show()
+        self._plot_series("exploration_rate", "Exploration Rate", "Exploration Rate", "Exploration Rate Over Time",
+                          "green")
 
-    def display_logs(self):
+    def display_logs(self, last=None):
+        """Print the last entries from the recent window, or every entry on disk when last is None"""
         print("Training Logs:")
-        for log in self.logs:
+        logs = self.iter_logs() if last is None else list(self.recent)[-last:]
+        for log in logs:
             print(log)
 
     def save_summary(self, summary_file="training_summary.json"):
+        self.flush()
         summary = {
-            "total_episodes": len(self.logs),
-            "final_win_rate": self.logs[-1]["win_rate"] if self.logs else 0,
-            "final_average_reward": np.mean([log["reward"] for log in self.logs]) if self.logs else 0,
-            "final_exploration_rate": self.logs[-1]["exploration_rate"] if self.logs else 0,
+            "total_episodes": self.total_episodes,
+            "final_win_rate": self.last["win_rate"] if self.last else 0,
+            "final_average_reward": self.reward_sum / self.total_episodes if self.total_episodes else 0,
+            "final_exploration_rate": self.last["exploration_rate"] if self.last else 0,
         }
         with open(summary_file, "w") as f:
             json.dump(summary, f, indent=4)
@@ -0,0 +1,229 @@
+import os
+import random
+import numpy as np
+from Instrumentation import metrics
+from LearningAgent import QLearningAgent
+from checkers_env import COLOUR_SWAP
+from vec_checkers_env import VecCheckersEnv
+
+MOBILITY_SCALE = 10.0  # move counts are divided by this to keep them near the other features
+
+
+class BoardFeatures:
+    """Feature vectors of a batch of boards, as seen by the side to evaluate for.
+
+    Boards are flipped for player 2 (see checkers_env.flip_board) so "own" pieces are
+    always values 1 and 3. A vector holds one plane per piece type (own men, own kings,
+    opponent men, opponent kings) over the dark squares, then the four piece counts,
+    both sides' move counts, how many own and opponent pieces can be captured right now,
+    and a constant 1. Mobility and threats come from VecCheckersEnv's batched move planes.
+    """
+
+    def __init__(self, board_size):
+        n = board_size
+        self.board_size = n
+        self.vec = VecCheckersEnv(1, n, auto_reset=False)
+        rows, cols = np.nonzero(np.add.outer(np.arange(n), np.arange(n)) % 2 == 0)
+        self.dark_squares = rows * n + cols
+        self.pieces_per_side = (n // 2 - 1) * (n // 2)
+        self.size = 4 * len(self.dark_squares) + 9
+
+    def __call__(self, boards, player=1):
+        boards = np.asarray(boards)
+        if player == 2:
+            boards = COLOUR_SWAP[boards[:, ::-1, ::-1]]
+        num = len(boards)
+        squares = boards.reshape(num, -1)[:, self.dark_squares]
+        planes = [squares == value for value in (1, 3, 2, 4)]
+        own = np.ones(num, dtype=np.int8)
+        opponent = np.full(num, 2, dtype=np.int8)
+        scalars = np.stack([plane.sum(axis=1) / self.pieces_per_side for plane in planes]
+                           + [self.vec.legal_mask(own, boards).sum(axis=1) / MOBILITY_SCALE,
+                              self.vec.legal_mask(opponent, boards).sum(axis=1) / MOBILITY_SCALE,
+                              self.vec.capturable(own, boards).sum(axis=(1, 2)) / self.pieces_per_side,
+                              self.vec.capturable(opponent, boards).sum(axis=(1, 2)) / self.pieces_per_side,
+                              np.ones(num)], axis=1)
+        return np.concatenate(planes + [scalars], axis=1).astype(np.float32)
+
+
+class ValueNetwork:
+    """V(features): linear when hidden is 0, else one tanh hidden layer of that width.
+
+    Parameters are a dict of float32 arrays; train takes one semi-gradient step on the
+    mean squared error of a batch.
+    """
+
+    def __init__(self, num_features, hidden=0, seed=None):
+        rng = np.random.default_rng(seed)
+        self.hidden = hidden
+        if hidden:
+            self.params = {"w1": (rng.standard_normal((num_features, hidden)) / np.sqrt(num_features)).astype(np.float32),
+                           "b1": np.zeros(hidden, dtype=np.float32),
+                           "w2": np.zeros(hidden, dtype=np.float32),
+                           "b2": np.zeros(1, dtype=np.float32)}
+        else:
+            self.params = {"w": np.zeros(num_features, dtype=np.float32)}
+
+    def predict(self, features):
+        params = self.params
+        if not self.hidden:
+            return features @ params["w"]
+        return np.tanh(features @ params["w1"] + params["b1"]) @ params["w2"] + params["b2"][0]
+
+    def train(self, features, targets, learning_rate):
+        """Move the values of features towards targets; returns the errors before the step"""
+        params = self.params
+        scale = learning_rate / len(features)
+        if not self.hidden:
+            errors = targets - features @ params["w"]
+            params["w"] += scale * (errors @ features)
+            return errors
+        hidden = np.tanh(features @ params["w1"] + params["b1"])
+        errors = targets - (hidden @ params["w2"] + params["b2"][0])
+        hidden_errors = np.outer(errors, params["w2"]) * (1 - hidden ** 2)
+        params["w2"] += scale * (errors @ hidden)
+        params["b2"] += scale * errors.sum()
+        params["w1"] += scale * (features.T @ hidden_errors)
+        params["b1"] += scale * hidden_errors.sum(axis=0)
+        return errors
+
+    def save(self, path):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            np.savez(f, hidden=np.array(self.hidden), **self.params)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        network = cls.__new__(cls)
+        with np.load(path) as data:
+            network.hidden = int(data["hidden"])
+            network.params = {name: data[name] for name in data.files if name != "hidden"}
+        return network
+
+
+class ValueAgent(QLearningAgent):
+    """QLearningAgent that plays from a learned afterstate value instead of the Q-table.
+
+    All candidate moves are stepped together in a VecCheckersEnv and scored with one
+    forward pass as reward + discount_factor * V(afterstate), where V sees the afterstate
+    from this agent's side and finished games count their reward only. learn() queues
+    the TD(0) transition from the agent's previous afterstate to the new one; every
+    batch_size transitions, and at the end of each episode, the network takes one
+    batched semi-gradient step. Memory use is the fixed parameter set, however many
+    positions are seen.
+    """
+
+    def __init__(self, env, player, board_size=8, difficulty='easy', hidden=0, value_learning_rate=0.01,
+                 batch_size=256, seed=None):
+        self.features = BoardFeatures(env.board_size)
+        self.network = ValueNetwork(self.features.size, hidden, seed)
+        self.value_learning_rate = value_learning_rate
+        self.batch_size = batch_size
+        self.lookahead = VecCheckersEnv(1, env.board_size, auto_reset=False)
+        self._inputs = np.zeros((batch_size, self.features.size), dtype=np.float32)
+        self._next_inputs = np.zeros((batch_size, self.features.size), dtype=np.float32)
+        self._rewards = np.zeros(batch_size)
+        self._dones = np.zeros(batch_size, dtype=bool)
+        self._pending = 0
+        self._previous = None  # features of this agent's last afterstate in the episode
+        self._chosen = None  # (move, afterstate features, done) of the last choose_action
+        super().__init__(env, player, board_size, difficulty)
+
+    def set_difficulty(self, difficulty):
+        super().set_difficulty(difficulty)
+        self.model_file = f"value_model_{difficulty.lower()}_{self.env.board_size}x{self.env.board_size}.npz"
+        if os.path.exists(self.model_file):
+            self.load_model(self.model_file)
+
+    def ponder_copy(self):
+        agent = super().ponder_copy()
+        agent.lookahead = VecCheckersEnv(1, self.env.board_size, auto_reset=False)
+        return agent
+
+    def evaluate(self, moves):
+        """(scores, afterstate features, dones) of moves from the env's position, in one batch"""
+        env = self.env
+        self.lookahead.set_positions(np.repeat(env.board[None], len(moves), axis=0), self.player, env.must_jump)
+        boards, rewards, dones = self.lookahead.step(env.action_space.encode_many(moves))
+        features = self.features(boards, self.player)
+        scores = rewards + np.where(dones, 0.0, self.discount_factor * self.network.predict(features))
+        return scores, features, dones
+
+    @metrics.timed("agent.choose_action")
+    def choose_action(self, state, use_ucb=False):
+        valid_moves = self.env.valid_moves(self.player)
+        if not valid_moves:
+            return None
+        scores, features, dones = self.evaluate(valid_moves)
+        if random.random() < self.exploration_rate:
+            metrics.count("agent.random_moves")
+            index = random.randrange(len(valid_moves))
+        else:
+            metrics.count("agent.value_moves")
+            index = int(np.argmax(scores))
+        self._chosen = (valid_moves[index], features[index], bool(dones[index]))
+        return valid_moves[index]
+
+    @metrics.timed("agent.learn")
+    def learn(self, state, action, reward, next_state, state_hash=None, next_state_hash=None):
+        """Queue the transition into the afterstate next_state reached by this agent's action"""
+        if self._chosen is not None and self._chosen[0] == action:
+            _, features, done = self._chosen
+        else:
+            next_state = np.asarray(next_state)[None]
+            features = self.features(next_state, self.player)[0]
+            done = bool(self.lookahead.winner(next_state)[0] >= 0)
+        self._chosen = None
+        if self._previous is not None:
+            self._queue(features, reward, done)
+        self._previous = None if done else features
+
+    def _queue(self, features, reward, done):
+        """Queue the transition from _previous to the afterstate features"""
+        i = self._pending
+        self._inputs[i] = self._previous
+        self._next_inputs[i] = features
+        self._rewards[i] = reward
+        self._dones[i] = done
+        self._pending += 1
+        if self._pending == self.batch_size:
+            self.train_pending()
+
+    def train_pending(self):
+        """One batched TD(0) step over the queued transitions; returns their TD errors"""
+        count = self._pending
+        if count == 0:
+            return None
+        next_values = self.network.predict(self._next_inputs[:count])
+        targets = self._rewards[:count] + self.discount_factor * np.where(self._dones[:count], 0.0, next_values)
+        errors = self.network.train(self._inputs[:count], targets, self.value_learning_rate)
+        self._pending = 0
+        metrics.count("agent.value_updates", count)
+        return errors
+
+    def end_episode(self, reward=None):
+        """Train on the queued transitions; reward is this agent's final reward when the
+        opponent's move ended the game, which closes _previous with a terminal transition"""
+        if reward is not None and self._previous is not None:
+            self._queue(self.features(self.env.board[None], self.player)[0], reward, True)
+        self.train_pending()
+        self._previous = None
+        self._chosen = None
+
+    def save_model(self, path=None):
+        path = path or self.model_file
+        self.network.save(path)
+        print(f"✅ Value model saved to {path}")
+
+    def load_model(self, path):
+        try:
+            network = ValueNetwork.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Error: could not load {path}: {e}")
+            return
+        if len(next(iter(network.params.values()))) != self.features.size:
+            print(f"❌ Error: {path} does not match the {self.env.board_size}x{self.env.board_size} feature layout.")
+            return
+        self.network = network
+        print(f"✅ Value model loaded from {path}")
@@ -0,0 +1,289 @@
+"""Headless benchmarks of the training, agent, similarity, Q-table, search and rendering hot paths.
+
+    python benchmark.py                              # run, write benchmark_results.json
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.25
+    python benchmark.py --save-baseline              # run and store the results as the baseline
+
+Every workload is synthetic and seeded, and runs in a scratch directory so no Q-table or
+book files are read or written. With --baseline, results worse than the baseline by more
+than the threshold are reported and the exit status is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+from AlphaBetaSearch import AlphaBetaSearch
+from ParallelSearch import ParallelSearch
+from checkers_env import make_env
+from LearningAgent import QLearningAgent
+from QTable import ActionQTable, load_json
+from TaskSimilarity import TaskSimilarity
+
+SCALES = {
+    "small": {"episodes": 3, "positions": 50, "memory_sizes": (1000, 5000), "table_sizes": (1000, 10000),
+              "renders": 10, "search_positions": 5, "search_times": (0.05,)},
+    "full": {"episodes": 20, "positions": 300, "memory_sizes": (1000, 10000, 50000),
+             "table_sizes": (1000, 10000, 100000), "renders": 100, "search_positions": 20,
+             "search_times": (0.05, 0.2)},
+}
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+SEED = 2024
+ENGINE = "bitboard"
+
+
+def _seed(offset=0):
+    random.seed(SEED + offset)
+    np.random.seed(SEED + offset)
+
+
+def _percentiles(name, samples, results, scale=1000.0, unit="ms"):
+    samples = np.asarray(samples) * scale
+    for percentile in (50, 90, 99):
+        results[f"{name}.p{percentile}_{unit}"] = {"value": float(np.percentile(samples, percentile)),
+                                                   "unit": unit, "better": "lower"}
+
+
+def _best_of(function, repeats=5):
+    """Fastest of several timed calls, which keeps sub-millisecond timings stable"""
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def random_positions(board_size, count, seed):
+    """(board, player, must_jump) snapshots from seeded random games"""
+    rng = random.Random(seed)
+    env = make_env(board_size=board_size, engine=ENGINE)
+    positions = []
+    while len(positions) < count:
+        env.reset()
+        env.must_jump = False
+        for _ in range(rng.randrange(1, 60)):
+            moves = env.valid_moves(env.player)
+            if not moves:
+                break
+            _, _, done = env.step(rng.choice(moves), env.player)
+            if done:
+                break
+        if env.game_winner() is None and env.valid_moves(env.player):
+            positions.append((env.board.copy(), env.player, env.must_jump))
+    return positions
+
+
+def bench_train_agent(config, results):
+    from main import train_agent
+    for board_size in (6, 8):
+        _seed(board_size)
+        env = make_env(board_size=board_size, engine=ENGINE)
+        agents = [QLearningAgent(env, player=player, board_size=board_size) for player in (1, 2)]
+        start = time.perf_counter()
+        train_agent(env, agents[0], agents[1], config["episodes"])
+        seconds = time.perf_counter() - start
+        results[f"train_agent[board={board_size}].episodes_per_s"] = {
+            "value": config["episodes"] / seconds, "unit": "episodes/s", "better": "higher"}
+
+
+def bench_choose_action(config, results):
+    for board_size, difficulty, search_time in ((6, "easy", None), (8, "medium", 0.01)):
+        _seed(board_size)
+        env = make_env(board_size=board_size, engine=ENGINE)
+        agents = {player: QLearningAgent(env, player=player, board_size=board_size, difficulty=difficulty,
+                                         search_time=search_time) for player in (1, 2)}
+        samples = []
+        for board, player, must_jump in random_positions(board_size, config["positions"], SEED):
+            env.board = board
+            env.player = player
+            env.must_jump = must_jump
+            start = time.perf_counter()
+            agents[player].choose_action(env.board)
+            samples.append(time.perf_counter() - start)
+        _percentiles(f"choose_action[board={board_size},difficulty={difficulty}]", samples, results)
+
+
+def bench_find_similar_state(config, results):
+    queries = random_positions(8, 200, SEED + 1)
+    for size in config["memory_sizes"]:
+        _seed(size)
+        similarity = TaskSimilarity()
+        env = make_env(board_size=8, engine=ENGINE)
+        for board, player, _ in random_positions(8, size, SEED + size):
+            env.board = board
+            similarity.store_state(board, random.choice(env.valid_moves(player)), flipped=player == 2)
+        samples = []
+        for board, player, _ in queries:
+            start = time.perf_counter()
+            similarity.find_similar_state(board, flipped=player == 2)
+            samples.append(time.perf_counter() - start)
+        _percentiles(f"find_similar_state[states={size}]", samples, results, 1e6, "us")
+
+
+def bench_q_table_io(config, results):
+    agent = QLearningAgent(make_env(board_size=8, engine=ENGINE), player=1)
+    width = agent.action_space.num_actions
+    for size in config["table_sizes"]:
+        _seed(size)
+        table = agent._new_q_table()  # the agent's own table type, row width and dtype
+        rng = np.random.default_rng(SEED + size)
+        keys = rng.integers(1, 2 ** 63, size=size, dtype=np.uint64)
+        written = rng.integers(1, 12, size=size)  # actions learned per state
+        rows = np.repeat(table.get_or_create_rows(keys, fill=-1.0), written)
+        table.add_at(rows, rng.integers(0, width, size=len(rows)), rng.standard_normal(len(rows)))
+        agent.q_table = table
+        probe = int(keys[size // 2])
+        for extension in (".qtb", ".json"):
+            if extension == ".json" and size > 1000:
+                continue  # full 280-value JSON rows are too slow to be worth timing at this size
+            path = f"bench_{size}{extension}"
+            saved = _best_of(lambda: agent.save_q_table(path))
+            load = load_json if extension == ".json" else ActionQTable.load
+            # a mapped table only pays for the rows it reads
+            load_seconds = _best_of(lambda: load(path, width).get(probe))
+            name = f"q_table[rows={size},format={extension[1:]}]"
+            results[f"{name}.save_s"] = {"value": saved, "unit": "s", "better": "lower"}
+            results[f"{name}.load_s"] = {"value": load_seconds, "unit": "s", "better": "lower"}
+            os.remove(path)
+
+
+def bench_search_depth(config, results):
+    """Depth reached per search time by AlphaBetaSearch and by ParallelSearch over every CPU"""
+    workers = os.cpu_count() or 1
+    env = make_env(board_size=8, engine=ENGINE)
+    searchers = {1: AlphaBetaSearch(env)}
+    if workers > 1:
+        searchers[workers] = ParallelSearch(env, workers)
+    try:
+        for search_time in config["search_times"]:
+            for count, searcher in searchers.items():
+                depths, nodes = [], []
+                for board, player, must_jump in random_positions(8, config["search_positions"], SEED):
+                    env.board = board
+                    env.player = player
+                    env.must_jump = must_jump
+                    searcher.search(player, search_time)
+                    depths.append(searcher.depth)
+                    nodes.append(searcher.nodes / search_time)
+                name = f"search[board=8,time={search_time},workers={count}]"
+                results[f"{name}.depth"] = {"value": float(np.mean(depths)), "unit": "plies", "better": "higher"}
+                results[f"{name}.nodes_per_s"] = {"value": float(np.mean(nodes)), "unit": "nodes/s",
+                                                  "better": "higher"}
+            if workers == 1:
+                results[f"search[board=8,time={search_time},workers=parallel]"] = {"skipped": "one CPU"}
+    finally:
+        for searcher in searchers.values():
+            if isinstance(searcher, ParallelSearch):
+                searcher.close()
+
+
+def bench_render_board(config, results):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        results["render_board[board=6]"] = {"skipped": f"no display ({e})"}
+        return
+    from CheckerGUI import CheckerGUI
+    try:
+        root.withdraw()
+        gui = CheckerGUI(root, difficulty="easy", engine=ENGINE)
+        for name, board in (("start", None), ("midgame", random_positions(6, 1, SEED)[0][0])):
+            if board is not None:
+                gui.env.board = board
+            samples = []
+            for _ in range(config["renders"]):
+                start = time.perf_counter()
+                gui.render_board()
+                root.update_idletasks()
+                samples.append(time.perf_counter() - start)
+            _percentiles(f"render_board[board=6,position={name}]", samples, results)
+    finally:
+        root.destroy()
+
+
+BENCHMARKS = {
+    "train_agent": bench_train_agent,
+    "choose_action": bench_choose_action,
+    "find_similar_state": bench_find_similar_state,
+    "q_table_io": bench_q_table_io,
+    "search_depth": bench_search_depth,
+    "render_board": bench_render_board,
+}
+
+
+def run(scale="small", only=None):
+    config = SCALES[scale]
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            for name, bench in BENCHMARKS.items():
+                if only and name not in only:
+                    continue
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    bench(config, results)
+                print(f"✅ {name} ({time.perf_counter() - start:.1f}s)")
+        finally:
+            os.chdir(cwd)
+    meta = {"scale": scale, "seed": SEED, "engine": ENGINE, "python": platform.python_version(),
+            "numpy": np.__version__, "machine": platform.machine(), "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+    return {"meta": meta, "results": results}
+
+
+def compare(results, baseline, threshold):
+    """Names of results worse than the baseline by more than threshold (a fraction)"""
+    regressions = []
+    for name, result in sorted(results["results"].items()):
+        base = baseline["results"].get(name)
+        if base is None or "value" not in result or "value" not in base or base["value"] <= 0:
+            continue
+        change = result["value"] / base["value"] - 1
+        worse = change > threshold if result["better"] == "lower" else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{'❌' if worse else '  '} {name:<60} {base['value']:>12.4g} -> {result['value']:>12.4g} "
+              f"{result['unit']:<10} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks of the checkers hot paths.")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="run only these benchmarks")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help=f"also write the results to {BASELINE_FILE}")
+    args = parser.parse_args(argv)
+
+    results = run(args.scale, args.only)
+    for path in [args.output] + ([BASELINE_FILE] if args.save_baseline else []):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("scale") != args.scale:
+            print(f"⚠️ Baseline was run at scale {baseline['meta'].get('scale')}, not {args.scale}.")
+        regressions = compare(results, baseline, args.threshold)
+        print(f"{'❌' if regressions else '✅'} {len(regressions)} regressions beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
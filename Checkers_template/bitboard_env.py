@@ -0,0 +1,192 @@
+import numpy as np
+from checkers_env import CheckersEnv
+
+KING_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+FORWARD_DIRECTIONS = {1: [(-1, -1), (-1, 1)], 2: [(1, -1), (1, 1)]}
+
+
+class BitboardCheckersEnv(CheckersEnv):
+    """CheckersEnv whose move generation runs on integer bitboards.
+
+    Square (row, col) is bit ``row * board_size + col``. Pieces only ever stand on the
+    dark squares, but laying the bits out over the full grid keeps every diagonal step a
+    single shift. ``pieces[v]`` holds the mask of squares containing piece value ``v``
+    (1/2 men, 3/4 kings); ``board`` is kept in sync so the GUI and agents can still read it.
+    """
+
+    engine = "bitboard"
+
+    def __init__(self, board_size=8, player=1):
+        self.board_size = board_size
+        self.pieces = [0, 0, 0, 0, 0]
+        self._precompute_masks()
+        super().__init__(board_size=board_size, player=player)
+
+    def _precompute_masks(self):
+        n = self.board_size
+        self.full_mask = (1 << (n * n)) - 1
+        self.square_rc = [divmod(idx, n) for idx in range(n * n)]
+        self.row_masks = [((1 << n) - 1) << (row * n) for row in range(n)]
+        # inside[(dr, dc)][k]: squares from which k steps along (dr, dc) stay on the board
+        self.inside = {}
+        self.shifts = {}
+        for dr, dc in KING_DIRECTIONS:
+            self.shifts[(dr, dc)] = dr * n + dc
+            masks = [0]
+            for k in range(1, n):
+                mask = 0
+                for row in range(n):
+                    for col in range(n):
+                        if 0 <= row + k * dr < n and 0 <= col + k * dc < n:
+                            mask |= 1 << (row * n + col)
+                masks.append(mask)
+            self.inside[(dr, dc)] = masks
+
+    # --- board synchronisation -------------------------------------------------------
+
+    def _sync_board(self):
+        """Replacing the whole board (reset, GUI undo) rebuilds the masks from the array"""
+        super()._sync_board()
+        flat = self._board.reshape(-1)
+        pieces = [0, 0, 0, 0, 0]
+        for value in range(1, 5):
+            mask = 0
+            for idx in np.flatnonzero(flat == value):
+                mask |= 1 << int(idx)
+            pieces[value] = mask
+        self.pieces = pieces
+
+    def _set_piece(self, row, col, piece):
+        bit = 1 << (row * self.board_size + col)
+        old = int(self._board[row, col])
+        if old:
+            self.pieces[old] &= ~bit
+        if piece:
+            self.pieces[int(piece)] |= bit
+        super()._set_piece(row, col, piece)
+
+    # --- move generation -------------------------------------------------------------
+
+    def _back(self, mask, delta):
+        """Shift ``mask`` so that bit ``sq + delta`` lands on bit ``sq``"""
+        return mask >> delta if delta > 0 else (mask << -delta) & self.full_mask
+
+    def _lowest_row(self, mask):
+        return ((mask & -mask).bit_length() - 1) // self.board_size
+
+    def _scan(self, player):
+        """Return (jump_moves, normal source masks per direction, man/king masks)"""
+        pieces = self.pieces
+        men, kings = pieces[player], pieces[player + 2]
+        opponent = pieces[3 - player] | pieces[5 - player]
+        empty = self.full_mask & ~(pieces[1] | pieces[2] | pieces[3] | pieces[4])
+        forward = FORWARD_DIRECTIONS[player]
+
+        step_sources = {}
+        jump_sources = {}
+        for direction in KING_DIRECTIONS:
+            movers = kings | men if direction in forward else kings
+            if not movers:
+                continue
+            delta = self.shifts[direction]
+            inside = self.inside[direction]
+            step_sources[direction] = movers & inside[1] & self._back(empty, delta)
+            if len(inside) > 2:
+                jump_sources[direction] = (movers & inside[2] & self._back(opponent, delta)
+                                           & self._back(empty, 2 * delta))
+
+        # kings whose flying scan may yield extra (or duplicate) jumps
+        flyers = 0
+        for direction in KING_DIRECTIONS:
+            flyers |= kings & self.inside[direction][1] & self._back(opponent, self.shifts[direction])
+
+        jump_moves = []
+        candidates = flyers
+        for mask in jump_sources.values():
+            candidates |= mask
+        n = self.board_size
+        while candidates:
+            low = candidates & -candidates
+            candidates ^= low
+            idx = low.bit_length() - 1
+            row, col = self.square_rc[idx]
+            is_king = bool(kings & low)
+            for direction in (KING_DIRECTIONS if is_king else forward):
+                if jump_sources.get(direction, 0) & low:
+                    dr, dc = direction
+                    jump_moves.append([row, col, row + 2 * dr, col + 2 * dc])
+            if is_king and flyers & low:
+                for dr, dc in KING_DIRECTIONS:
+                    temp_row, temp_col = row + dr, col + dc
+                    captured = False
+                    while 0 <= temp_row < n and 0 <= temp_col < n:
+                        bit = 1 << (temp_row * n + temp_col)
+                        if opponent & bit:
+                            captured = True
+                        elif empty & bit and captured:
+                            jump_moves.append([row, col, temp_row, temp_col])
+                        else:
+                            break
+                        temp_row += dr
+                        temp_col += dc
+        return jump_moves, step_sources, men, kings
+
+    def _generate_moves(self, player):
+        jump_moves, step_sources, men, kings = self._scan(player)
+
+        step_mask = 0
+        for mask in step_sources.values():
+            step_mask |= mask
+        # CheckersEnv flags has_moved once a row closes with plain moves seen and no jumps yet
+        if step_mask and (not jump_moves or self._lowest_row(step_mask) < jump_moves[0][0]):
+            self.has_moved = True
+
+        if jump_moves:
+            return jump_moves  # **强制吃子规则**
+
+        moves = []
+        forward = FORWARD_DIRECTIONS[player]
+        while step_mask:
+            low = step_mask & -step_mask
+            step_mask ^= low
+            row, col = self.square_rc[low.bit_length() - 1]
+            for direction in (KING_DIRECTIONS if kings & low else forward):
+                if step_sources.get(direction, 0) & low:
+                    dr, dc = direction
+                    moves.append([row, col, row + dr, col + dc])
+        return moves
+
+    def get_additional_jumps(self, row, col, player):
+        pieces = self.pieces
+        opponent = pieces[3 - player] | pieces[5 - player]
+        occupied = pieces[1] | pieces[2] | pieces[3] | pieces[4]
+        n = self.board_size
+        idx = row * n + col
+        low = 1 << idx
+
+        additional_moves = []
+        for direction in KING_DIRECTIONS:
+            inside = self.inside[direction]
+            if len(inside) <= 2 or not inside[2] & low:
+                continue
+            delta = self.shifts[direction]
+            if (opponent >> (idx + delta)) & 1 and not (occupied >> (idx + 2 * delta)) & 1:
+                dr, dc = direction
+                additional_moves.append([row, col, row + 2 * dr, col + 2 * dc])
+        return additional_moves
+
+    def _promote_pieces(self):
+        n = self.board_size
+        promoted = []
+        for mask, king in ((self.pieces[1] & self.row_masks[0], 3), (self.pieces[2] & self.row_masks[n - 1], 4)):
+            while mask:
+                low = mask & -mask
+                mask ^= low
+                row, col = self.square_rc[low.bit_length() - 1]
+                self._set_piece(row, col, king)
+                promoted.append((row, col))
+        return tuple(promoted)
+
+    def has_valid_moves(self, player):
+        # a full bitboard scan is cheap, and caching it saves the side to move a second pass
+        return bool(self.valid_moves(player))
@@ -1,13 +1,118 @@
 import numpy as np
+from ActionSpace import action_space
+from Instrumentation import metrics
+
+ENGINES = ("array", "bitboard")
+ZOBRIST_SEED = 0x5EED_C4EC  # fixed so keys agree across processes and runs
+_zobrist_tables = {}
+
+
+def zobrist_keys(board_size):
+    """Return (table, side) for a board size: 64-bit keys per (square, piece value) and for player 2 to move.
+
+    table is a (board_size**2, 5) uint64 array whose empty-square column is zero.
+    """
+    if board_size not in _zobrist_tables:
+        rng = np.random.default_rng(ZOBRIST_SEED + board_size)
+        table = rng.integers(1, 2 ** 64, size=(board_size * board_size, 5), dtype=np.uint64)
+        table[:, 0] = 0
+        side = int(rng.integers(1, 2 ** 64, dtype=np.uint64))
+        _zobrist_tables[board_size] = table, side
+    return _zobrist_tables[board_size]
+
+
+def hash_board(board, player=None):
+    """Zobrist key of a board array computed from scratch; includes the side to move if player is given"""
+    table, side = zobrist_keys(board.shape[0])
+    key = int(np.bitwise_xor.reduce(table[np.arange(board.size), board.reshape(-1)]))
+    return key ^ side if player == 2 else key
+
+
+# Colour swap: the value each piece takes when the board is seen from the other side
+COLOUR_SWAP = np.array([0, 2, 1, 4, 3])
+
+
+def flip_board(board, player=None):
+    """The position seen from the other side: rotated 180° with the colours swapped.
+
+    The rules are invariant under this map (player 1 moving up becomes player 2 moving
+    down), so a position and its flip with the other side to move are the same game.
+    """
+    return COLOUR_SWAP[board[::-1, ::-1]]
+
+
+def flip_move(move, board_size):
+    last = board_size - 1
+    return [last - move[0], last - move[1], last - move[2], last - move[3]]
+
+
+def canonical_hash(board, player):
+    """Zobrist key of the position as seen by the side to move (always keyed as player 1 to move)"""
+    return hash_board(flip_board(board) if player == 2 else board)
+
+
+def make_env(board_size=8, player=1, engine="array"):
+    """Create an environment backed by the requested move generator"""
+    if engine == "array":
+        return CheckersEnv(board_size=board_size, player=player)
+    if engine == "bitboard":
+        from bitboard_env import BitboardCheckersEnv
+        return BitboardCheckersEnv(board_size=board_size, player=player)
+    raise ValueError(f"Invalid engine. Choose one of {ENGINES}.")
+
 
 class CheckersEnv:
+    engine = "array"
+
     def __init__(self, board_size=8, player=1):
         self.has_moved = False
         self.must_jump = False
         self.board_size = board_size
+        self.action_space = action_space(board_size)
+        table, self._zobrist_side = zobrist_keys(board_size)
+        self._zobrist_squares = table.tolist()
+        # key of each (square, value) in the flipped position: square n*n-1-i, colours swapped
+        self._zobrist_flipped = table[::-1][:, COLOUR_SWAP].tolist()
+        self._player = 1
         self.board = self.initialize_board()
         self.player = player
         self.last_move_was_jump = False
+        self.last_undo = None
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        """Replacing the whole board (reset, GUI undo) resynchronises the cached counts and key"""
+        self._board = board
+        self._sync_board()
+
+    @property
+    def player(self):
+        return self._player
+
+    @player.setter
+    def player(self, player):
+        if (player == 2) != (self._player == 2):
+            self.zobrist_key ^= self._zobrist_side
+            self.flipped_key ^= self._zobrist_side
+        self._player = player
+
+    @property
+    def canonical_key(self):
+        """Key of the position as seen by the side to move; equals canonical_hash(board, player)"""
+        return self.flipped_key if self._player == 2 else self.zobrist_key
+
+    def _sync_board(self):
+        # piece_counts[v] is the number of squares holding value v (index 0 counts empties)
+        self.piece_counts = np.bincount(self._board.reshape(-1), minlength=5).tolist()
+        self._move_cache = {}
+        # 64-bit Zobrist key of the board and side to move, updated by XOR in _set_piece
+        self.zobrist_key = hash_board(self._board, self._player)
+        # key of flip_board(board) with the other side to move, updated alongside zobrist_key
+        self.flipped_key = hash_board(flip_board(self._board), 3 - self._player)
 
     def initialize_board(self):
         """初始化棋盘"""
@@ -29,14 +134,63 @@ class CheckersEnv:
         self.player = 1
 
     def valid_moves(self, player):
+        """Legal moves for player; the list is cached until the board changes, so don't mutate it"""
+        moves = self._move_cache.get(player)
+        if moves is None:
+            if metrics.enabled:
+                with metrics.timer("env.generate_moves"):
+                    moves = self._move_cache[player] = self._generate_moves(player)
+            else:
+                moves = self._move_cache[player] = self._generate_moves(player)
+        return moves
+
+    def legal_actions(self, player):
+        """ActionSpace actions of valid_moves(player) in the same order, in player's canonical frame"""
+        key = ("actions", player)
+        actions = self._move_cache.get(key)
+        if actions is None:
+            actions = self._move_cache[key] = self.action_space.encode_many(self.valid_moves(player), player == 2)
+        return actions
+
+    def jumps_forced(self, player):
+        """Whether valid_moves(player) is the mandatory jump list, flying-king jumps included"""
+        moves = self.valid_moves(player)
+        return bool(moves) and abs(moves[0][2] - moves[0][0]) > 1  # plain moves are always one step
+
+    def has_valid_moves(self, player):
+        """Whether player can move, stopping at the first board row that has a move"""
+        moves = self._move_cache.get(player)
+        if moves is not None:
+            return bool(moves)
+        for row_moves, row_jumps in self._scan_rows(player):
+            if row_moves or row_jumps:
+                if not row_jumps:
+                    self.has_moved = True
+                return True
+        return False
+
+    def _generate_moves(self, player):
         moves = []
         jump_moves = []
+        for row_moves, row_jumps in self._scan_rows(player):
+            moves += row_moves
+            jump_moves += row_jumps
+            if moves and not jump_moves:
+                self.has_moved = True
+
+        return jump_moves if jump_moves else moves  # **强制吃子规则**
+
+    def _scan_rows(self, player):
+        """Yield (moves, jump_moves) found on each board row, top to bottom"""
+        board = self._board
         forward_directions = [(-1, -1), (-1, 1)] if player == 1 else [(1, -1), (1, 1)]
         king_directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
 
         for row in range(self.board_size):
+            moves = []
+            jump_moves = []
             for col in range(self.board_size):
-                piece = self.board[row, col]
+                piece = board[row, col]
 
                 if piece == player or piece == player + 2:
                     piece_directions = king_directions if piece in [3, 4] else forward_directions
@@ -44,7 +198,7 @@ class CheckersEnv:
                     for dr, dc in piece_directions:
                         new_row, new_col = row + dr, col + dc
                         if 0 <= new_row < self.board_size and 0 <= new_col < self.board_size:
-                            if self.board[new_row, new_col] == 0:
+                            if board[new_row, new_col] == 0:
                                 moves.append([row, col, new_row, new_col])
 
 
@@ -55,8 +209,8 @@ class CheckersEnv:
                         if (
                                 0 <= cap_row < self.board_size and 0 <= cap_col < self.board_size and
                                 0 <= end_row < self.board_size and 0 <= end_col < self.board_size and
-                                self.board[cap_row, cap_col] in [3 - player, (3 - player) + 2] and  # **确保中间有对方棋子**
-                                self.board[end_row, end_col] == 0 and  # **落点必须为空**
+                                board[cap_row, cap_col] in [3 - player, (3 - player) + 2] and  # **确保中间有对方棋子**
+                                board[end_row, end_col] == 0 and  # **落点必须为空**
                                 (end_row - row, end_col - col) in [(2, 2), (2, -2), (-2, 2), (-2, -2)]  # **普通棋子严格限制跳跃**
                         ):
                             jump_moves.append([row, col, end_row, end_col])
@@ -67,60 +221,112 @@ class CheckersEnv:
                             temp_row, temp_col = row + dr, col + dc
                             captured = False
                             while 0 <= temp_row < self.board_size and 0 <= temp_col < self.board_size:
-                                if self.board[temp_row, temp_col] in [3 - player, (3 - player) + 2]:
+                                if board[temp_row, temp_col] in [3 - player, (3 - player) + 2]:
                                     captured = True
-                                elif self.board[temp_row, temp_col] == 0 and captured:
+                                elif board[temp_row, temp_col] == 0 and captured:
                                     jump_moves.append([row, col, temp_row, temp_col])
                                 else:
                                     break
                                 temp_row += dr
                                 temp_col += dc
-            if moves and not jump_moves:
-                self.has_moved = True
-
-        return jump_moves if jump_moves else moves  # **强制吃子规则**
+            yield moves, jump_moves
+
+    def _set_piece(self, row, col, piece):
+        """Write a single square; every board mutation goes through here to keep the caches valid"""
+        old = self._board[row, col]
+        keys = self._zobrist_squares[row * self.board_size + col]
+        self.zobrist_key ^= keys[old] ^ keys[piece]
+        keys = self._zobrist_flipped[row * self.board_size + col]
+        self.flipped_key ^= keys[old] ^ keys[piece]
+        counts = self.piece_counts
+        counts[old] -= 1
+        counts[piece] += 1
+        self._board[row, col] = piece
+        if self._move_cache:
+            self._move_cache.clear()
 
     def capture_piece(self, action, player):
+        """Remove the piece jumped by action and return it as (row, col, piece), or None"""
         start_row, start_col, end_row, end_col = action
 
         if (end_row - start_row, end_col - start_col) in [(2, 2), (2, -2), (-2, 2), (-2, -2)]:
             mid_row = (start_row + end_row) // 2
             mid_col = (start_col + end_col) // 2
 
-            if self.board[mid_row, mid_col] in [3 - player, (3 - player) + 2]:
-                self.board[mid_row, mid_col] = 0
+            piece = self.board[mid_row, mid_col]
+            if piece in [3 - player, (3 - player) + 2]:
+                self._set_piece(mid_row, mid_col, 0)
+                return mid_row, mid_col, piece
+        return None
+
+    def make_move(self, action, player):
+        """Apply action in place with the board effects of step and return an undo record.
 
-    def step(self, action, player):
-        """Execute a move and return the new state, shaped rewards, and game status"""
+        The record is (action, moved piece, overwritten piece, captured square or None,
+        promoted squares, must_jump before the move, player before the move); pass it to
+        unmake_move to restore the position exactly.
+        """
         start_row, start_col, end_row, end_col = action
-        self.board[end_row, end_col] = self.board[start_row, start_col]
-        self.board[start_row, start_col] = 0
+        piece = self.board[start_row, start_col]
+        target = self.board[end_row, end_col]
+        must_jump = self.must_jump
+        self._set_piece(end_row, end_col, piece)
+        self._set_piece(start_row, start_col, 0)
+
+        captured = None
+        promoted = ()
+        if abs(end_row - start_row) == 2:
+            captured = self.capture_piece(action, player)
+            if self.get_additional_jumps(end_row, end_col, player):
+                self.must_jump = True  # Player must continue turn
+            else:
+                self.must_jump = False
+                promoted = self._promote_pieces()
+        elif not must_jump:
+            promoted = self._promote_pieces()
+        # a plain move while must_jump is set is penalised by step and changes nothing else
 
-        is_jump = abs(end_row - start_row) == 2  # Check if it's a jump
+        return action, piece, target, captured, promoted, must_jump, self.player
+
+    def unmake_move(self, undo):
+        """Revert the move described by an undo record from make_move (or env.last_undo)"""
+        action, piece, target, captured, promoted, must_jump, player = undo
+        start_row, start_col, end_row, end_col = action
+        for row, col in promoted:
+            self._set_piece(row, col, self.board[row, col] - 2)
+        if captured is not None:
+            self._set_piece(*captured)
+        self._set_piece(end_row, end_col, target)
+        self._set_piece(start_row, start_col, piece)
+        self.must_jump = must_jump
+        self.player = player
+
+    @metrics.timed("env.step")
+    def step(self, action, player, snapshot=False):
+        """Execute a move and return the new state, shaped rewards, and game status.
+
+        The returned state is the live board unless snapshot=True asks for a copy; the undo
+        record of the move is kept in last_undo.
+        """
+        self.last_undo = undo = self.make_move(action, player)
+        promoted, must_jump = undo[4], undo[5]
+        state = self.board.copy() if snapshot else self.board
+
+        is_jump = abs(action[2] - action[0]) == 2  # Check if it's a jump
 
         reward = 0  # Initialize reward
 
         # Handle piece capture and reward for jumps
         if is_jump:
-            self.capture_piece(action, player)  # Remove the captured piece
             reward += 2  # Reward for capturing a piece
-
-            additional_jumps = self.get_additional_jumps(end_row, end_col, player)
-            if additional_jumps:
-                self.must_jump = True
-                return self.board.copy(), reward, False  # Player must continue turn
-            else:
-                self.must_jump = False
-        else:
             if self.must_jump:
-                # If a jump was possible earlier, normal moves are not allowed
-                return self.board.copy(), -1, False
-
-            self.must_jump = False
+                return state, reward, False  # Player must continue turn
+        elif must_jump:
+            # If a jump was possible earlier, normal moves are not allowed
+            return state, -1, False
 
         # Handle king promotion and reward
-        king_promotion = self.promote_to_king()
-        if king_promotion:
+        if promoted:
             reward += 5  # Reward for king promotion
 
         # Check for game end
@@ -134,19 +340,23 @@ class CheckersEnv:
         if not done:
             self.player = 1 if player == 2 else 2
 
-        return self.board.copy(), reward, done
+        return state, reward, done
 
     def promote_to_king(self):
         """Promote pieces to king and return if promotion happened"""
-        promotion_happened = False
+        return bool(self._promote_pieces())
+
+    def _promote_pieces(self):
+        """Crown men on their last row and return the promoted squares"""
+        promoted = []
         for col in range(self.board_size):
             if self.board[0, col] == 1:  # Player 1 promotion
-                self.board[0, col] = 3
-                promotion_happened = True
+                self._set_piece(0, col, 3)
+                promoted.append((0, col))
             if self.board[self.board_size - 1, col] == 2:  # Player 2 promotion
-                self.board[self.board_size - 1, col] = 4
-                promotion_happened = True
-        return promotion_happened
+                self._set_piece(self.board_size - 1, col, 4)
+                promoted.append((self.board_size - 1, col))
+        return tuple(promoted)
 
     def handle_multiple_jumps(self, row, col, player):
 
@@ -155,8 +365,8 @@ class CheckersEnv:
         # **确保所有可能的跳跃都被执行**
         for move in additional_moves:
             end_row, end_col = move[2], move[3]
-            self.board[end_row, end_col] = self.board[row, col]
-            self.board[row, col] = 0
+            self._set_piece(end_row, end_col, self.board[row, col])
+            self._set_piece(row, col, 0)
             self.capture_piece(move, player)
             self.handle_multiple_jumps(end_row, end_col, player)  # **递归处理连跳**
 
@@ -178,18 +388,21 @@ class CheckersEnv:
         return additional_moves
 
     def game_winner(self):
-
-        player1_pieces = np.sum(self.board == 1) + np.sum(self.board == 3)
-        player2_pieces = np.sum(self.board == 2) + np.sum(self.board == 4)
+        counts = self.piece_counts
+        player1_pieces = counts[1] + counts[3]
+        player2_pieces = counts[2] + counts[4]
 
         if player1_pieces == 0:
             return 2
         elif player2_pieces == 0:
             return 1
-        elif not self.valid_moves(1) and not self.valid_moves(2):
+
+        player1_can_move = self.has_valid_moves(1)
+        player2_can_move = self.has_valid_moves(2)
+        if not player1_can_move and not player2_can_move:
             return 0
-        elif not self.valid_moves(1):
+        elif not player1_can_move:
             return 2
-        elif not self.valid_moves(2):
+        elif not player2_can_move:
             return 1
         return None
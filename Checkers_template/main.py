@@ -2,14 +2,20 @@ import matplotlib
 
 matplotlib.use('TkAgg')
 
+import os
+import random
 import tkinter as tk
-from checkers_env import CheckersEnv
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from checkers_env import make_env
 from CheckerGUI import CheckerGUI
+from Instrumentation import metrics
 from LearningAgent import QLearningAgent
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 
+ENGINE = "bitboard"  # move generator used by the GUI and training: "array" or "bitboard"
 
 def smooth_rewards(rewards, alpha=0.01):
     """Apply exponential moving average to smooth rewards."""
@@ -21,8 +27,11 @@ def smooth_rewards(rewards, alpha=0.01):
     return smoothed
 
 
-def train_agent(env, agent1, agent2, num_episodes=10000):
-    """Train AI agents and debug Agent 2's issue."""
+def train_agent(env, agent1, agent2, num_episodes=10000, recorder=None):
+    """Train AI agents and debug Agent 2's issue.
+
+    With a GameRecordWriter as recorder every episode is also appended to its game file.
+    """
     total_rewards = []  # Tracks cumulative rewards
     win_history = []  # Tracks how often Agent 1 wins
 
@@ -31,22 +40,26 @@ def train_agent(env, agent1, agent2, num_episodes=10000):
         state = env.board.copy()
         done = False
         episode_reward = 0  # Tracks reward per episode
+        winner = None
+        if recorder is not None:
+            recorder.begin_game(env.must_jump)
 
         while not done:
             current_agent = agent1 if env.player == 1 else agent2
-            action = current_agent.choose_action(state)
-
-            # 🚨 Debugging: Print chosen action
-            print(f"🔹 Agent {env.player} chose action: {action}")
+            state_hash = env.canonical_key
+            action = current_agent.choose_action(env.board)
+            metrics.trace("train.move", episode=episode, player=env.player, action=action)
 
             if action is None:
-                print(f"⚠️ Agent {env.player} has no valid moves! Skipping turn.")
+                metrics.count("train.no_moves")
                 break  # Avoid infinite loops if no moves available
+            if current_agent.replay is not None:
+                action_index, num_actions = current_agent.action_index(action)
+            if recorder is not None:
+                recorder.record_move(action, env.player)
 
-            next_state, raw_reward, done = env.step(action, env.player)
-
-            # 🚨 Debugging: Ensure turn switch is working
-            print(f"🔄 Switching to Agent {3 - env.player} after move.")
+            next_state, raw_reward, done = env.step(action, env.player, snapshot=True)
+            metrics.count("train.plies")
 
             # Properly switch turns
             env.player = 3 - env.player
@@ -69,7 +82,10 @@ def train_agent(env, agent1, agent2, num_episodes=10000):
                 else:
                     reward = 0.1  # Encourage legal moves
 
-            current_agent.learn(state, action, reward, next_state)
+            if current_agent.replay is not None:
+                current_agent.remember(state_hash, action_index, num_actions, reward, env.canonical_key, done)
+            else:
+                current_agent.learn(state, action, reward, next_state, state_hash, env.canonical_key)
             state = next_state
             episode_reward += reward
 
@@ -78,12 +94,132 @@ def train_agent(env, agent1, agent2, num_episodes=10000):
             agent2.update_exploration_rate()
 
         total_rewards.append(episode_reward)
+        if recorder is not None:
+            recorder.end_game(winner, episode_reward)
+        for agent in (agent1, agent2):
+            agent.end_episode(reward if done and agent is not current_agent else None)
+        metrics.count("train.episodes")
+        metrics.maybe_emit()
 
         if (episode + 1) % 100 == 0:
             avg_reward = sum(total_rewards[-100:]) / 100
             print(f"📈 Episode {episode + 1}/{num_episodes}, Avg reward: {avg_reward}")
 
-    return total_rewards, win_history, dict(agent1.q_table)
+    return total_rewards, win_history, agent1.q_table
+
+
+_worker = None  # (env, agents) of a self-play worker process, set by _init_self_play_worker
+
+
+def _init_self_play_worker(board_size, engine, agent_states):
+    """Build the worker's own env and file-free agents once, from the master agents' state.
+
+    agent_states holds, per player, (difficulty, q_table, state_memory). Later rounds only
+    send what changed (see _self_play_worker), so the full tables cross processes once.
+    """
+    global _worker
+    env = make_env(board_size=board_size, engine=engine)
+    agents = []
+    for player, (difficulty, q_table, state_memory) in zip((1, 2), agent_states):
+        agent = QLearningAgent(env, player=player, board_size=board_size, difficulty=difficulty, persistent=False)
+        agent.q_table = q_table
+        agent.task_similarity.load_state_memory(state_memory)
+        agents.append(agent)
+    _worker = (env, agents)
+
+
+def _self_play_worker(round_updates, num_episodes, seed):
+    """Bring the worker's agents up to date, then run train_agent on them.
+
+    round_updates holds, per player, (merged Q-table rows, state_memory deltas of the other
+    workers, exploration rate) from the previous round, or None in the first round.
+    Returns the rewards, win history and, per player, the Q-table rows and visits this
+    worker changed, its state_memory delta and final exploration rate.
+    """
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    env, agents = _worker
+    for agent, (q_rows, memory_deltas, exploration_rate) in zip(agents, round_updates or ()):
+        agent.q_table.update(q_rows)
+        for memory_delta in memory_deltas:
+            agent.task_similarity.merge_state_memory(memory_delta)
+        agent.exploration_rate = exploration_rate
+    for agent in agents:
+        agent.visits.clear()
+    baselines = [(agent.q_table.copy(), agent.task_similarity.snapshot_state_memory()) for agent in agents]
+
+    total_rewards, win_history, _ = train_agent(env, agents[0], agents[1], num_episodes)
+
+    updates = [(agent.q_table_delta(q_table), dict(agent.visits),
+                agent.task_similarity.state_memory_delta(memory), agent.exploration_rate)
+               for agent, (q_table, memory) in zip(agents, baselines)]
+    return total_rewards, win_history, updates
+
+
+def train_agent_parallel(env, agent1, agent2, num_episodes=10000, num_workers=None, sync_interval=250,
+                         q_table_file=None):
+    """Train like train_agent, running episodes on worker processes.
+
+    Every worker process keeps its own copies of the env and agents for the whole run and
+    plays up to sync_interval episodes a round; their Q-table, visit and state_memory
+    updates are then merged back into agent1 and agent2 (see QLearningAgent.merge_q_tables)
+    and only the merged rows and the other workers' state_memory deltas are sent back to
+    each worker for the next round. When q_table_file is given the merged table of agent1
+    is saved there.
+    """
+    num_workers = num_workers or os.cpu_count()
+    total_rewards = []
+    win_history = []
+    agents = (agent1, agent2)
+    remaining = num_episodes
+    sync_round = 0
+    agent_states = [(agent.difficulty, agent.q_table, agent.task_similarity.state_memory) for agent in agents]
+    worker_updates = [None] * num_workers  # per worker, what it has to apply before its next round
+
+    with ExitStack() as stack:
+        # one single-process pool per worker, so every round of a worker runs on the same replica
+        pools = [stack.enter_context(ProcessPoolExecutor(max_workers=1, initializer=_init_self_play_worker,
+                                                         initargs=(env.board_size, env.engine, agent_states)))
+                 for _ in range(num_workers)]
+        while remaining > 0:
+            futures = []
+            for worker, pool in enumerate(pools):
+                episodes = min(sync_interval, remaining)
+                if episodes <= 0:
+                    break
+                remaining -= episodes
+                seed = sync_round * num_workers + worker
+                futures.append(pool.submit(_self_play_worker, worker_updates[worker], episodes, seed))
+
+            results = [future.result() for future in futures]
+            for rewards, wins, _ in results:
+                total_rewards.extend(rewards)
+                win_history.extend(wins)
+            merged = []
+            for index, agent in enumerate(agents):
+                agent_updates = [updates[index] for _, _, updates in results]
+                agent.merge_q_tables([(q_delta, visits) for q_delta, visits, _, _ in agent_updates])
+                for _, _, memory_delta, _ in agent_updates:
+                    agent.task_similarity.merge_state_memory(memory_delta)
+                agent.exploration_rate = float(np.mean([rate for _, _, _, rate in agent_updates]))
+                q_rows = agent._new_q_table()
+                for q_delta, _, _, _ in agent_updates:
+                    for state in q_delta.keys():
+                        q_rows[state] = agent.q_table[state]
+                merged.append((q_rows, [memory_delta for _, _, memory_delta, _ in agent_updates]))
+            # a worker already holds its own state_memory delta
+            worker_updates = [[(q_rows, [delta for source, delta in enumerate(memory_deltas) if source != worker],
+                                agent.exploration_rate)
+                               for agent, (q_rows, memory_deltas) in zip(agents, merged)]
+                              for worker in range(num_workers)]
+
+            sync_round += 1
+            print(f"📈 Synced round {sync_round}: {len(total_rewards)}/{num_episodes} episodes, "
+                  f"Avg reward: {np.mean(total_rewards[-100:])}")
+
+    if q_table_file:
+        agent1.save_q_table(q_table_file)
+    return total_rewards, win_history, agent1.q_table
 
 
 def plot_training_results(total_rewards, window_size=200):
@@ -117,13 +253,14 @@ def plot_win_rate(win_history, window_size=200):
 
 if __name__ == "__main__":
     root = tk.Tk()
-    gui = CheckerGUI(root, difficulty='medium')
+    gui = CheckerGUI(root, difficulty='medium', engine=ENGINE, record_games=True)
     root.mainloop()
 
-    env = CheckersEnv(board_size=8)
+    env = make_env(board_size=8, engine=ENGINE)
     agent1 = QLearningAgent(env, player=1, difficulty="easy")
     agent2 = QLearningAgent(env, player=2, difficulty="hard")
 
-    total_rewards, win_history, _ = train_agent(env, agent1, agent2, num_episodes=10000)
+    total_rewards, win_history, _ = train_agent_parallel(env, agent1, agent2, num_episodes=10000,
+                                                         q_table_file=agent1.q_table_file)
     plot_training_results(total_rewards)
     plot_win_rate(win_history)
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""Move-generator node counts (perft) for validating and timing the engines.
+
+    python perft.py                 # counts and speed for every stored position
+    python perft.py --check         # compare both engines against perft_expected.json
+    python perft.py --update        # rewrite the expected counts from the array engine
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from checkers_env import ENGINES, make_env
+
+EXPECTED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perft_expected.json")
+COUNTERS = ("nodes", "captures", "promotions", "multi_jumps")
+
+
+def board_from_rows(rows):
+    return np.array([[0 if square == "." else int(square) for square in row] for row in rows], dtype=int)
+
+
+def board_to_rows(board):
+    return ["".join("." if value == 0 else str(value) for value in row) for row in board.tolist()]
+
+
+def _perft(env, depth, player, counts):
+    for move in list(env.valid_moves(player)):
+        undo = env.make_move(move, player)
+        jump = abs(move[2] - move[0]) == 2
+        passed = not env.must_jump if jump else not undo[5]  # the turn rule of env.step
+        if depth == 1:
+            counts["nodes"] += 1
+            counts["captures"] += undo[3] is not None
+            counts["promotions"] += len(undo[4])
+            counts["multi_jumps"] += jump and env.must_jump
+        elif not (passed and env.game_winner() is not None):  # step would report the game over
+            next_player = 3 - player if passed else player
+            env.player = next_player
+            _perft(env, depth - 1, next_player, counts)
+        env.unmake_move(undo)
+
+
+def perft(env, depth, player=None):
+    """Count the leaves of the move tree depth plies deep from the env's position.
+
+    A ply is one make_move, so each jump of a multi-jump is its own ply, and the turn
+    passes as it does in env.step. Besides the leaves, the moves into them that capture,
+    promote (counted per crowned man) or leave a jump to continue are counted. Lines
+    end early where env.step would report the game over. The env is left unchanged.
+    """
+    player = env.player if player is None else player
+    counts = dict.fromkeys(COUNTERS, 0)
+    saved_player, saved_has_moved = env.player, env.has_moved
+    env.player = player
+    try:
+        if depth > 0:
+            _perft(env, depth, player, counts)
+        else:
+            counts["nodes"] = 1
+    finally:
+        env.player = saved_player
+        env.has_moved = saved_has_moved
+    return counts
+
+
+def run_position(position, engine, depth=None):
+    """(counts, seconds) of one stored position on one engine"""
+    env = make_env(board_size=position["board_size"], engine=engine)
+    env.board = board_from_rows(position["rows"])
+    env.player = position["player"]
+    env.must_jump = position["must_jump"]
+    start = time.perf_counter()
+    counts = perft(env, position["depth"] if depth is None else depth)
+    return counts, time.perf_counter() - start
+
+
+def load_positions(path=EXPECTED_FILE):
+    with open(path, "r") as f:
+        return json.load(f)["positions"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft node counts for the checkers engines.")
+    parser.add_argument("--check", action="store_true", help="fail if any engine disagrees with the expected counts")
+    parser.add_argument("--update", action="store_true", help="rewrite the expected counts")
+    parser.add_argument("--engine", choices=ENGINES, help="only run this engine")
+    parser.add_argument("--depth", type=int, help="override the stored depth (not with --check/--update)")
+    parser.add_argument("--file", default=EXPECTED_FILE)
+    args = parser.parse_args(argv)
+
+    positions = load_positions(args.file)
+    engines = [args.engine] if args.engine else list(ENGINES)
+    if args.update:
+        for position in positions:
+            position["expected"], seconds = run_position(position, "array")
+            print(f"✅ {position['name']}: {position['expected']} ({seconds:.2f}s)")
+        with open(args.file, "w") as f:
+            json.dump({"positions": positions}, f, indent=2)
+            f.write("\n")
+        return 0
+
+    failures = 0
+    for position in positions:
+        for engine in engines:
+            depth = None if args.check else args.depth
+            counts, seconds = run_position(position, engine, depth)
+            rate = counts["nodes"] / seconds if seconds > 0 else 0.0
+            line = (f"{position['name']:<22} {engine:<9} depth {depth or position['depth']:>2}  "
+                    + "  ".join(f"{name} {counts[name]}" for name in COUNTERS)
+                    + f"  {seconds:.2f}s  {rate:,.0f} nodes/s")
+            if args.check and counts != position["expected"]:
+                failures += 1
+                print(f"❌ {line}\n   expected {position['expected']}")
+            else:
+                print(f"✅ {line}" if args.check else line)
+    if args.check:
+        print(f"{'❌' if failures else '✅'} {failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import random
+import pytest
+from checkers_env import make_env
+from perft import load_positions, run_position
+
+
+@pytest.mark.parametrize("board_size", [6, 8])
+def test_engines_agree_over_random_games(board_size):
+    rng = random.Random(board_size)
+    envs = [make_env(board_size, engine=engine) for engine in ("array", "bitboard")]
+    for _ in range(20):
+        for env in envs:
+            env.reset()
+            env.must_jump = False
+        for _ in range(200):
+            player = envs[0].player
+            assert envs[1].player == player
+            for side in (1, 2):
+                assert envs[0].valid_moves(side) == envs[1].valid_moves(side)
+            moves = envs[0].valid_moves(player)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            results = [env.step(move, player, snapshot=True) for env in envs]
+            assert (results[0][0] == results[1][0]).all() and results[0][1:] == results[1][1:]
+            assert envs[0].game_winner() == envs[1].game_winner()
+            if results[0][2]:
+                break
+
+
+def test_engines_agree_on_stored_perft_positions():
+    for position in load_positions():
+        depth = min(position["depth"], 3)
+        assert run_position(position, "array", depth)[0] == run_position(position, "bitboard", depth)[0], position["name"]
@@ -0,0 +1,21 @@
+import os
+from GameRecord import GameRecordReader, GameRecordWriter
+
+
+def test_append_after_torn_record(tmp_path):
+    path = str(tmp_path / "games.cgr")
+    first = [([5, 1, 4, 0], 1), ([0, 0, 1, 1], 2)]
+    second = [([5, 3, 4, 2], 1)]
+    with GameRecordWriter(path, 6, {"session": 1}) as writer:
+        writer.write_game(first, 1, 10.0)
+        writer.write_game(second, 2, -5.0)
+    os.truncate(path, os.path.getsize(path) - 1)  # crash in the middle of the second game
+
+    with GameRecordWriter(path, 6) as writer:
+        writer.write_game(second, 0, 2.0)
+
+    games = list(GameRecordReader(path))
+    assert [game.moves(6) for game in games] == [first, second]
+    assert [game.winner for game in games] == [1, 0]
+    assert games[1].config == {"session": 1}
+    assert len(GameRecordReader(path)) == 2
@@ -0,0 +1,38 @@
+import pytest
+from LearningAgent import QLearningAgent
+from checkers_env import canonical_hash, flip_move, make_env
+
+
+def test_player_2_transition_is_stored_in_its_own_frame(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no saved tables, books or tablebases
+    env = make_env(6, 2)
+    agent = QLearningAgent(env, 2, board_size=6)
+    state = env.board.copy()
+    action = env.valid_moves(2)[0]
+    state_hash = canonical_hash(state, 2)
+    env.player = 1  # learn runs after the move, when the other side is to move
+
+    agent.learn(state, action, 1.0, state, state_hash, state_hash ^ 1)  # an unseen next state, worth 0
+
+    index, _ = agent.action_index(action)
+    assert index != env.action_space.encode(action)
+    assert agent.q_table.value(state_hash, index) == pytest.approx(-1.0 + agent.learning_rate * 2.0)
+    assert agent.q_table.value(state_hash, env.action_space.encode(action)) == -1.0
+    stored = agent.task_similarity.state_memory[state_hash]["actions"]
+    assert tuple(flip_move(action, 6)) in stored
+
+
+def test_choose_action_on_a_ponder_copy_leaves_the_agent_untouched(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    env = make_env(6, 2)
+    agent = QLearningAgent(env, 2, board_size=6, search_time=0.01)
+    env.player = 2
+    ponder = agent.ponder_copy()
+
+    ponder.choose_action(env.board)
+    ponder.search_time = None
+    ponder.choose_action(env.board, use_ucb=True)
+
+    assert not agent.visits and agent.total_visits == 0 and len(agent.action_visits) == 0
+    assert agent.searcher.nodes == 0 and not agent.searcher.tt
+    assert ponder.searcher.nodes > 0 and ponder.visits
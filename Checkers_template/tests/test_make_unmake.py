@@ -0,0 +1,54 @@
+import random
+import numpy as np
+import pytest
+from checkers_env import flip_board, hash_board, make_env
+
+
+def _state(env):
+    state = (env.board.copy(), env.player, env.must_jump, env.zobrist_key, env.flipped_key, list(env.piece_counts))
+    return state + (list(env.pieces),) if env.engine == "bitboard" else state
+
+
+def _assert_same(state, other):
+    assert np.array_equal(state[0], other[0])
+    assert state[1:] == other[1:]
+
+
+def _assert_in_sync(env):
+    """Incrementally kept keys, counts and bitboards match a rebuild from the board"""
+    assert env.zobrist_key == hash_board(env.board, env.player)
+    assert env.flipped_key == hash_board(flip_board(env.board), 3 - env.player)
+    assert env.piece_counts == np.bincount(env.board.reshape(-1), minlength=5).tolist()
+    if env.engine == "bitboard":
+        rebuilt = make_env(env.board_size, engine="bitboard")
+        rebuilt.board = env.board.copy()
+        assert env.pieces == rebuilt.pieces
+
+
+@pytest.mark.parametrize("engine", ["array", "bitboard"])
+@pytest.mark.parametrize("board_size", [6, 8])
+def test_unmake_restores_every_move_of_random_games(engine, board_size):
+    rng = random.Random(board_size)
+    env = make_env(board_size, engine=engine)
+    for _ in range(10):
+        env.reset()
+        env.must_jump = False
+        history = []
+        for _ in range(150):
+            player = env.player
+            moves = env.valid_moves(player)
+            if not moves:
+                break
+            before = _state(env)
+            for move in moves:
+                undo = env.make_move(move, player)
+                _assert_in_sync(env)
+                env.unmake_move(undo)
+                _assert_same(before, _state(env))
+            _, _, done = env.step(rng.choice(moves), player)
+            history.append((before, env.last_undo))
+            if done:
+                break
+        for before, undo in reversed(history):  # unwinding the whole game passes every position again
+            env.unmake_move(undo)
+            _assert_same(before, _state(env))
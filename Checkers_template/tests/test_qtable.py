@@ -0,0 +1,57 @@
+import numpy as np
+from QTable import ActionQTable
+from ReplayBuffer import ReplayBuffer, td_update
+
+
+def _table_with_illegal_best():
+    """Next state 2 whose largest value sits on action 5, which is not legal there"""
+    table = ActionQTable(280)
+    table.create(2, fill=0.0)
+    table.update_value(2, 5, 10.0)
+    table.update_value(2, 7, 1.0)
+    mask = np.zeros(280, dtype=bool)
+    mask[[7, 9]] = True
+    return table, mask
+
+
+def test_bootstrap_max_ignores_illegal_actions():
+    table, mask = _table_with_illegal_best()
+    assert table.max(2) == 10.0
+    assert table.max(2, mask=mask) == 1.0
+    assert table.max_many(np.array([2], dtype=np.uint64), masks=mask[None])[0] == 1.0
+    assert table.max(2, default=-3.0, mask=np.zeros(280, dtype=bool)) == -3.0  # no legal move
+    assert table.argmax(2, mask) == 7
+
+
+def test_td_target_ignores_illegal_actions():
+    table, mask = _table_with_illegal_best()
+    replay = ReplayBuffer(4)
+    replay.add(1, 3, 280, 0.0, 2, False, mask)
+    td_update(table, replay, np.array([0]), learning_rate=1.0, discount_factor=0.5)
+    assert table.value(1, 3) == 0.5  # 0.5 * Q(2, 7), not 0.5 * the illegal 10.0
+    assert table.value(1, 4) == -1.0  # unwritten actions keep the row's fill
+
+
+def test_rows_round_trip_through_qtb(tmp_path):
+    path = str(tmp_path / "table.qtb")
+    table = ActionQTable(280)
+    for key in range(1, 101):
+        table.create(key, fill=-1.0)
+        table.update_value(key, key % 280, key / 8)
+    table.save(path)
+
+    loaded = ActionQTable.load(path, 280)
+    assert len(loaded) == 100
+    assert all(np.array_equal(loaded[key], table[key]) for key in range(1, 101))
+    loaded.update_value(7, 0, 2.0)  # copies the row out of the file
+    assert loaded.value(7, 0) == 2.0 and loaded.value(7, 7) == 7 / 8 and loaded.value(7, 8) == -1.0
+
+
+def test_memory_per_state_grows_with_written_actions_only():
+    table = ActionQTable(280)
+    for key in range(1, 20001):
+        table.create(key * 7919, fill=-1.0)
+        for action in range(4):
+            table.update_value(key * 7919, action * 31, float(action))
+    per_state = table.nbytes() / len(table)
+    assert per_state < 280 * 4 / 4  # a quarter of a dense float32 row
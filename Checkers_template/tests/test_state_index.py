@@ -0,0 +1,60 @@
+import random
+import numpy as np
+from StateIndex import StateIndex
+from TaskSimilarity import TaskSimilarity
+from checkers_env import make_env
+
+
+def _boards(count, seed=0):
+    """Flat int8 boards from seeded random 8x8 games"""
+    rng = random.Random(seed)
+    env = make_env(8)
+    boards = []
+    while len(boards) < count:
+        env.reset()
+        env.must_jump = False
+        for _ in range(rng.randrange(1, 60)):
+            moves = env.valid_moves(env.player)
+            if not moves or env.step(rng.choice(moves), env.player)[2]:
+                break
+        boards.append(env.board.reshape(-1).astype(np.int8))
+    return boards
+
+
+def _brute_force(boards, query, threshold):
+    """Best (row, similarity) by TaskSimilarity's own scan"""
+    similarity = TaskSimilarity()
+    scores = [similarity.compute_state_similarity(query.tobytes(), board.tobytes()) for board in boards]
+    best = max(scores)
+    return (scores.index(best), best) if best > threshold else None
+
+
+def test_exact_index_matches_a_full_scan():
+    boards = _boards(300)
+    index = StateIndex(64, num_tables=0)
+    for row, board in enumerate(boards):
+        index.add(row, board)
+    for query in _boards(50, seed=1):
+        for threshold in (0.5, 0.85):
+            expected = _brute_force(boards, query, threshold)
+            found = index.nearest(query, threshold)
+            assert (found is None) == (expected is None)
+            if found is not None:  # equal scores may round apart, so compare scores rather than rows
+                assert np.isclose(found[1], expected[1])
+
+
+def test_lsh_index_finds_near_copies():
+    """One changed dark square leaves a board in a table's bucket with probability 22/32,
+    so 16 tables miss it with probability about 1e-8"""
+    boards = _boards(500)
+    index = StateIndex(64)
+    for row, board in enumerate(boards):
+        index.add(row, board)
+    rng = np.random.default_rng(2)
+    dark = np.flatnonzero((np.arange(64) // 8 + np.arange(64) % 8) % 2 == 0)
+    for row in rng.choice(len(boards), 100, replace=False).tolist():
+        query = boards[row].copy()
+        square = rng.choice(dark)
+        query[square] = 0 if query[square] else 1
+        found = index.nearest(query, 0.85)
+        assert found is not None and np.isclose(found[1], _brute_force(boards, query, 0.85)[1])
@@ -0,0 +1,21 @@
+import numpy as np
+from ValueAgent import ValueAgent
+from checkers_env import make_env
+
+
+def test_opponent_ending_the_game_closes_the_last_afterstate(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no saved tables or models
+    env = make_env(6, 2)
+    agent = ValueAgent(env, 1, board_size=6)
+    agent.learn(env.board.copy(), env.valid_moves(1)[0], 0.1, env.board.copy())  # no previous afterstate yet
+    previous = agent._previous.copy()
+    trained = []
+    monkeypatch.setattr(agent.network, "train",
+                        lambda inputs, targets, learning_rate: trained.append((inputs.copy(), targets.copy())))
+
+    agent.end_episode(-5.0)
+
+    inputs, targets = trained[0]
+    assert np.array_equal(inputs, previous[None])
+    assert targets.tolist() == [-5.0]  # terminal: no bootstrap
+    assert agent._previous is None
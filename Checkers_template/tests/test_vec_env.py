@@ -0,0 +1,44 @@
+import random
+import numpy as np
+import pytest
+from checkers_env import make_env
+from vec_checkers_env import VecCheckersEnv
+
+
+@pytest.mark.parametrize("board_size", [6, 8])
+def test_vec_env_matches_checkers_env(board_size):
+    rng = random.Random(board_size)
+    num_envs = 16
+    vec = VecCheckersEnv(num_envs, board_size, auto_reset=False)
+    envs = [make_env(board_size) for _ in range(num_envs)]
+    for env in envs:
+        env.must_jump = False
+    space = vec.action_space
+    playing = np.ones(num_envs, dtype=bool)
+    for _ in range(300):
+        mask = vec.legal_mask()
+        actions = np.full(num_envs, -1)
+        for i, env in enumerate(envs):
+            if not playing[i]:
+                continue
+            moves = env.valid_moves(env.player)
+            assert np.array_equal(mask[i], space.mask(space.encode_many(moves))), i
+            if not moves:
+                playing[i] = False
+                continue
+            actions[i] = space.encode(rng.choice(moves))
+        if not playing.any():
+            break
+        expected = [env.step(space.decode(action), env.player) if action >= 0 else None
+                    for env, action in zip(envs, actions.tolist())]
+        boards, rewards, dones = vec.step(actions)
+        for i, env in enumerate(envs):
+            if expected[i] is None:
+                continue
+            _, reward, done = expected[i]
+            assert np.array_equal(boards[i], env.board), i
+            assert (rewards[i], dones[i]) == (reward, done), i
+            assert (vec.player[i], vec.must_jump[i]) == (env.player, env.must_jump), i
+            if done:
+                assert vec.winners[i] == env.game_winner()
+                playing[i] = False
@@ -0,0 +1,258 @@
+import numpy as np
+from ActionSpace import DIRECTIONS, action_space
+
+
+class VecCheckersEnv:
+    """N games of CheckersEnv stepped together with whole-array NumPy operations.
+
+    Boards live in one ``(N, size, size)`` array and every game has its own side to move
+    and ``must_jump`` flag. Actions are ActionSpace actions in the board's own frame
+    (``action_space.encode(move)``); ``legal_mask`` marks exactly the moves
+    ``CheckersEnv.valid_moves`` would return, and ``step`` applies the same captures, promotions and reward shaping
+    as ``CheckersEnv.step``.
+    """
+
+    def __init__(self, num_envs, board_size=8, auto_reset=True, seed=None):
+        self.num_envs = num_envs
+        self.board_size = board_size
+        self.auto_reset = auto_reset
+        self.action_space = action_space(board_size)
+        self.num_actions = self.action_space.num_actions
+        self.rng = np.random.default_rng(seed)
+        self.initial_board = self._initial_board()
+        self.boards = np.empty((num_envs, board_size, board_size), dtype=np.int8)
+        self.player = np.empty(num_envs, dtype=np.int8)
+        self.must_jump = np.empty(num_envs, dtype=bool)
+        self.winners = np.full(num_envs, -1, dtype=np.int8)  # winner of the last finished game
+        self.reset()
+
+    def _initial_board(self):
+        n = self.board_size
+        board = np.zeros((n, n), dtype=np.int8)
+        rows = (n // 2) - 1
+        for row in range(rows):
+            board[row, row % 2::2] = 2
+        for row in range(n - rows, n):
+            board[row, row % 2::2] = 1
+        return board
+
+    def reset(self, mask=None):
+        """Reset every game, or only those selected by a boolean mask"""
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        self.boards[mask] = self.initial_board
+        self.player[mask] = 1
+        self.must_jump[mask] = False
+        return self.boards
+
+    def set_positions(self, boards, player, must_jump=False):
+        """Replace the games with copies of the given boards; num_envs becomes len(boards).
+
+        player and must_jump are per game or one value for all, e.g. to step every
+        candidate move of one position at once.
+        """
+        self.num_envs = len(boards)
+        self.boards = np.array(boards, dtype=np.int8)
+        self.player = np.full(self.num_envs, player, dtype=np.int8)
+        self.must_jump = np.full(self.num_envs, must_jump, dtype=bool)
+        self.winners = np.full(self.num_envs, -1, dtype=np.int8)
+        return self.boards
+
+    # --- move generation -------------------------------------------------------------
+
+    def _shifted(self, padded, dr, dc, k):
+        """View of a padded plane stack holding the square k steps along (dr, dc) from each square"""
+        n, pad = self.board_size, self.board_size - 1
+        row, col = pad + k * dr, pad + k * dc
+        return padded[:, row:row + n, col:col + n]
+
+    def _pad(self, planes):
+        n, pad = self.board_size, self.board_size - 1
+        padded = np.zeros((planes.shape[0], n + 2 * pad, n + 2 * pad), dtype=bool)
+        padded[:, pad:pad + n, pad:pad + n] = planes
+        return padded
+
+    def _masks(self, boards, player):
+        """Padded (opponent, empty) planes plus the men/king planes of the moving side"""
+        p = player.astype(np.int8)[:, None, None]
+        men = boards == p
+        kings = boards == p + 2
+        opponent = self._pad((boards == 3 - p) | (boards == 5 - p))
+        empty = self._pad(boards == 0)
+        return men, kings, opponent, empty
+
+    def _move_planes(self, boards, player):
+        """Return (steps, jumps) of shape (N, size, size, 4, size - 1), the dense grid of ActionSpace"""
+        n = self.board_size
+        men, kings, padded_opponent, padded_empty = self._masks(boards, player)
+        padded_open = padded_opponent | padded_empty
+
+        shape = (boards.shape[0], n, n, 4, n - 1)
+        steps = np.zeros(shape, dtype=bool)
+        jumps = np.zeros(shape, dtype=bool)
+        for d, (dr, dc) in enumerate(DIRECTIONS):
+            forward = (player == 1) if dr < 0 else (player == 2)
+            movers = kings | (men & forward[:, None, None])
+            steps[..., d, 0] = movers & self._shifted(padded_empty, dr, dc, 1)
+            if n < 3:
+                continue
+            adjacent = self._shifted(padded_opponent, dr, dc, 1)
+            jumps[..., d, 1] = movers & adjacent & self._shifted(padded_empty, dr, dc, 2)
+            # kings keep sliding over opponents and empties until their own piece or the edge
+            clear = kings & adjacent
+            for k in range(2, n):
+                if not clear.any():
+                    break
+                jumps[..., d, k - 1] |= clear & self._shifted(padded_empty, dr, dc, k)
+                clear &= self._shifted(padded_open, dr, dc, k)
+        return steps, jumps
+
+    def legal_mask(self, player=None, boards=None):
+        """Boolean (N, num_actions) mask of the moves valid_moves would return (captures are forced)"""
+        boards = self.boards if boards is None else boards
+        player = self.player if player is None else player
+        steps, jumps = self._move_planes(boards, player)
+        steps = self.action_space.from_cells(steps)
+        jumps = self.action_space.from_cells(jumps)
+        has_jump = jumps.any(axis=1)
+        steps[has_jump] = jumps[has_jump]
+        return steps
+
+    def has_moves(self, player, boards=None):
+        """Whether each game's player has any move; king slides are only traced where needed"""
+        boards = self.boards if boards is None else boards
+        men, kings, padded_opponent, padded_empty = self._masks(boards, player)
+        result = np.zeros(len(boards), dtype=bool)
+        for dr, dc in DIRECTIONS:
+            forward = (player == 1) if dr < 0 else (player == 2)
+            movers = kings | (men & forward[:, None, None])
+            found = movers & self._shifted(padded_empty, dr, dc, 1)
+            if self.board_size >= 3:
+                found |= (movers & self._shifted(padded_opponent, dr, dc, 1)
+                          & self._shifted(padded_empty, dr, dc, 2))
+            result |= found.any(axis=(1, 2))
+        stuck = np.flatnonzero(~result)
+        if stuck.size:
+            steps, jumps = self._move_planes(boards[stuck], player[stuck])
+            result[stuck] = jumps.any(axis=(1, 2, 3, 4))
+        return result
+
+    def capturable(self, player, boards=None):
+        """(N, size, size) mask of player's pieces the opponent could take with a jump right now"""
+        boards = self.boards if boards is None else boards
+        n = self.board_size
+        _, jumps = self._move_planes(boards, 3 - np.asarray(player, dtype=np.int8))
+        victims = np.zeros(boards.shape, dtype=bool)
+        if n < 3:
+            return victims
+        for d, (dr, dc) in enumerate(DIRECTIONS):
+            # only two-square jumps capture: the victim is the square next to the jumping piece
+            rows, cols = slice(max(dr, 0), n + min(dr, 0)), slice(max(dc, 0), n + min(dc, 0))
+            from_rows, from_cols = slice(max(-dr, 0), n + min(-dr, 0)), slice(max(-dc, 0), n + min(-dc, 0))
+            victims[:, rows, cols] |= jumps[:, from_rows, from_cols, d, 1]
+        return victims
+
+    def sample_actions(self, mask=None):
+        """Pick one legal action uniformly at random per game (-1 where a game has none)"""
+        mask = self.legal_mask() if mask is None else mask
+        rows, actions = np.nonzero(mask)
+        counts = np.bincount(rows, minlength=len(mask))
+        starts = np.cumsum(counts) - counts
+        picks = np.full(len(mask), -1, dtype=np.int64)
+        playable = counts > 0
+        offsets = (self.rng.random(playable.sum()) * counts[playable]).astype(np.int64)
+        picks[playable] = actions[starts[playable] + offsets]
+        return picks
+
+    # --- stepping --------------------------------------------------------------------
+
+    def winner(self, boards=None):
+        """Vectorised CheckersEnv.game_winner: 1, 2, 0 for a draw, -1 while undecided"""
+        boards = self.boards if boards is None else boards
+        num = len(boards)
+        player1_pieces = ((boards == 1) | (boards == 3)).any(axis=(1, 2))
+        player2_pieces = ((boards == 2) | (boards == 4)).any(axis=(1, 2))
+        player1_can_move = self.has_moves(np.full(num, 1, dtype=np.int8), boards)
+        player2_can_move = self.has_moves(np.full(num, 2, dtype=np.int8), boards)
+
+        winner = np.full(num, -1, dtype=np.int8)
+        winner[~player2_can_move] = 1
+        winner[~player1_can_move] = 2
+        winner[~player1_can_move & ~player2_can_move] = 0
+        winner[~player2_pieces] = 1
+        winner[~player1_pieces] = 2
+        return winner
+
+    def step(self, actions):
+        """Apply one action per game and return (boards, rewards, dones).
+
+        Actions must be legal for the side to move (see legal_mask); -1 leaves a game
+        untouched. With auto_reset, finished games are reset before returning and their
+        result is kept in ``winners``.
+        """
+        n = self.board_size
+        boards = self.boards
+        actions = np.asarray(actions)
+        games = np.flatnonzero(actions >= 0)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        if games.size == 0:
+            return boards, rewards, dones
+
+        player = self.player[games]
+        space, taken = self.action_space, actions[games]
+        start_row, start_col = space.start_rows[taken], space.start_cols[taken]
+        end_row, end_col = space.end_rows[taken], space.end_cols[taken]
+        direction, distance = space.directions[taken], space.distances[taken]
+        dr, dc = DIRECTIONS[direction, 0], DIRECTIONS[direction, 1]
+
+        boards[games, end_row, end_col] = boards[games, start_row, start_col]
+        boards[games, start_row, start_col] = 0
+
+        # captures and continuation checks only apply to two-square jumps
+        is_jump = distance == 2
+        mid_row, mid_col = start_row + dr, start_col + dc
+        mid = boards[games, mid_row, mid_col]
+        captured = is_jump & ((mid == 3 - player) | (mid == 5 - player))
+        boards[games[captured], mid_row[captured], mid_col[captured]] = 0
+
+        continues = np.zeros(games.size, dtype=bool)
+        for jr, jc in DIRECTIONS:
+            over_row, over_col = end_row + jr, end_col + jc
+            land_row, land_col = end_row + 2 * jr, end_col + 2 * jc
+            inside = (land_row >= 0) & (land_row < n) & (land_col >= 0) & (land_col < n)
+            over = boards[games, np.clip(over_row, 0, n - 1), np.clip(over_col, 0, n - 1)]
+            land = boards[games, np.clip(land_row, 0, n - 1), np.clip(land_col, 0, n - 1)]
+            continues |= inside & ((over == 3 - player) | (over == 5 - player)) & (land == 0)
+        continues &= is_jump
+
+        penalised = ~is_jump & self.must_jump[games]
+        self.must_jump[games] = np.where(is_jump, continues, self.must_jump[games])
+        completed = ~continues & ~penalised
+
+        # promotion only happens on completed moves
+        done_games = games[completed]
+        top = boards[done_games, 0, :]
+        bottom = boards[done_games, n - 1, :]
+        promoted = (top == 1).any(axis=1) | (bottom == 2).any(axis=1)
+        boards[done_games, 0, :] = np.where(top == 1, 3, top)
+        boards[done_games, n - 1, :] = np.where(bottom == 2, 4, bottom)
+
+        game_rewards = np.where(is_jump, 2.0, 0.0)
+        game_rewards[penalised] = -1.0
+        game_rewards[completed] += np.where(promoted, 5.0, 0.0)
+
+        winner = np.full(games.size, -1, dtype=np.int8)
+        winner[completed] = self.winner(boards[done_games])
+        finished = winner >= 0
+        game_rewards[finished] += np.where(winner[finished] == player[finished], 10.0, -10.0)
+
+        switch = completed & ~finished
+        self.player[games[switch]] = 3 - player[switch]
+
+        rewards[games] = game_rewards
+        dones[games] = finished
+        self.winners[games[finished]] = winner[finished]
+        if self.auto_reset and finished.any():
+            self.reset(dones)
+        return boards, rewards, dones